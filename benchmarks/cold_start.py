@@ -0,0 +1,103 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# handler の import (Lambda の初期化フェーズ) にかかる時間
+LAZY_IMPORT = "import handler"
+# 以前の handler の import 文 (末尾の run(None, None) は取得まで行うので除く)
+BASELINE_IMPORT = (
+    "from libs.forecast_collector import collect_hokkaido_forecast, collect_tokyo_forecast; "
+    "from libs.forecast_saver import AthenaSaver"
+)
+# 以前の handler があるコミット
+BASELINE_REV = "924c14d"
+
+
+def export_tree(rev: str, directory: str) -> bool:
+    # rev の libs を directory に展開する (git がない・rev がない場合は False)
+    try:
+        archive = subprocess.run(["git", "archive", rev, "libs"], cwd=ROOT, check=True, capture_output=True).stdout
+        subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+def measure_import(statement: str, repeat: int, cwd: Path = ROOT) -> float:
+    # 毎回新しいプロセスで import し、最小値を返す
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=cwd, check=True, capture_output=True, text=True
+        ).stdout
+        results.append(float(output.strip().splitlines()[-1]))
+    return min(results)
+
+
+def measure_call(func: Callable[[], object], repeat: int) -> float:
+    results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        results.append(time.perf_counter() - start)
+    return min(results)
+
+
+def _uncached_setup():
+    # 以前の run() と同じく、呼び出しごとに boto3 のクライアントと HTTP セッションを作る
+    import boto3
+
+    from libs.forecast_collector.parallel import build_session
+    from libs.forecast_saver import AthenaSaver
+
+    AthenaSaver(client=boto3.session.Session().client("athena"))
+    build_session(4).close()
+
+
+def _cached_setup():
+    from libs.forecast_collector import shared_session
+    from libs.forecast_saver import AthenaSaver
+
+    AthenaSaver()
+    shared_session(4)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="cold start import time / warm invocation setup time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline-rev", default=BASELINE_REV, help="commit of the handler to compare against")
+    args = parser.parse_args(argv)
+    os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+
+    baseline: Optional[float] = None
+    with tempfile.TemporaryDirectory() as directory:
+        if export_tree(args.baseline_rev, directory):
+            baseline = measure_import(BASELINE_IMPORT, args.repeat, cwd=Path(directory))
+    lazy = measure_import(LAZY_IMPORT, args.repeat)
+    if baseline is None:
+        print(f"{'cold import (baseline)':30s} {'n/a':>10s}    ({args.baseline_rev} is not available)")
+    else:
+        print(f"{'cold import (baseline)':30s} {baseline * 1e3:10.2f} ms    ({args.baseline_rev})")
+    print(f"{'cold import (lazy)':30s} {lazy * 1e3:10.2f} ms")
+
+    sys.path.insert(0, str(ROOT))
+    # 初回の呼び出しは両方とも import と生成が発生するので 1 回実行してから計測する
+    _uncached_setup()
+    _cached_setup()
+    uncached = measure_call(_uncached_setup, args.repeat)
+    cached = measure_call(_cached_setup, args.repeat)
+    print(f"{'warm setup (per invocation)':30s} {uncached * 1e3:10.2f} ms")
+    print(f"{'warm setup (cached clients)':30s} {cached * 1e3:10.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
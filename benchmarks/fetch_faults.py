@@ -0,0 +1,59 @@
+import argparse
+import sys
+import time
+from typing import List, Tuple
+
+from benchmarks.fixtures import load_tokyo
+from benchmarks.stubs import StubHTTPServer
+from libs.forecast_collector.base import DataDownloader
+from libs.forecast_collector.fetch import FetchPolicy, reset_circuit_breakers
+
+
+class StubDownloader(DataDownloader):
+    ENCODING = "cp932"
+
+    def __init__(self, url: str) -> None:
+        self._url = url
+
+    def run(self) -> str:
+        return self._fetch(self._url)
+
+
+# (名前, 注入する障害, 取得の設定, 呼び出し回数)
+SCENARIOS: List[Tuple[str, list, FetchPolicy, int]] = [
+    ("healthy", [], FetchPolicy(deadline=5), 1),
+    ("transient 503 x2", [("error", 503), ("error", 503)], FetchPolicy(deadline=5, backoff_base=0.1), 1),
+    ("stalled headers", [("delay", 5)], FetchPolicy(deadline=5, read_timeout=0.5, backoff_base=0.1), 1),
+    ("slow tail (no hedge)", [("delay", 1.5)], FetchPolicy(deadline=5, read_timeout=3), 1),
+    ("slow tail (hedged)", [("delay", 1.5)], FetchPolicy(deadline=5, read_timeout=3, hedge_after=0.2), 1),
+    ("trickling body", [("trickle", 0.05)] * 3, FetchPolicy(deadline=1, read_timeout=3, backoff_base=0.1), 1),
+    ("not found", [("error", 404)], FetchPolicy(deadline=5), 1),
+    ("persistent 500", [("error", 500)] * 20, FetchPolicy(deadline=5, retries=0), 5),
+]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="deadline / retry / hedge / circuit breaker against a faulty stub")
+    parser.parse_args(argv)
+    body = load_tokyo().encode("cp932")
+    print(f"{'scenario':24s} {'outcome':40s} {'elapsed':>10s} {'requests':>9s}")
+    for name, faults, policy, calls in SCENARIOS:
+        reset_circuit_breakers()
+        with StubHTTPServer(body) as server:
+            server.faults = list(faults)
+            downloader = StubDownloader(server.url).with_fetch_policy(policy)
+            for call in range(calls):
+                start = time.perf_counter()
+                try:
+                    text = downloader.run()
+                    outcome = f"ok ({len(text)} chars)"
+                except Exception as e:
+                    outcome = f"{type(e).__name__}: {e}"[:40]
+                elapsed = time.perf_counter() - start
+                label = name if calls == 1 else f"{name} #{call + 1}"
+                print(f"{label:24s} {outcome:40s} {elapsed * 1e3:8.0f} ms {server.requests:9d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+from pathlib import Path
+
+from libs.constants.area import Area
+from libs.forecast_collector.spec import load_spec
+
+TOKYO_FIXTURE = Path(__file__).resolve().parent.parent / "tests" / "csv" / "tokyo.csv"
+
+TOKYO_SPEC = load_spec(Area.tokyo)
+HOKKAIDO_SPEC = load_spec(Area.hokkaido)
+
+TOMORROW_ROWS = [
+    "3425,18:00〜19:00,10/21,17:40,24,80",
+    "2768,18:00〜19:00,10/21,17:40",
+    "3340,17:00〜18:00,10/21,17:40,81",
+    "2728,17:00〜18:00,10/21,17:40",
+    "19.0",
+]
+TOMORROW_BLOCKS = [(section.header, row) for section, row in zip(TOKYO_SPEC.tomorrow, TOMORROW_ROWS)]
+
+
+def load_tokyo() -> str:
+    with TOKYO_FIXTURE.open(encoding="cp932", newline="") as f:
+        return f.read()
+
+
+def _dates(days: int):
+    start = date(2023, 1, 1)
+    for offset in range(days):
+        yield (start + timedelta(days=offset)).strftime("%Y/%m/%d")
+
+
+def _hourly_rows(days: int, hokkaido_layout: bool) -> list[str]:
+    rows = []
+    for target_date in _dates(days):
+        for hour in range(24):
+            actual, demand, supply = 2300 + hour, 2350 + hour, 2800 + hour
+            usage = demand * 100 // supply
+            if hokkaido_layout:
+                rows.append(f"{target_date},{hour}:00,{actual},{demand},{usage},{supply}")
+            else:
+                rows.append(f"{target_date},{hour}:00,{actual},{demand},{supply},{usage}")
+    return rows
+
+
+def _five_minute_rows(days: int) -> list[str]:
+    return [
+        f"{target_date},{minute // 60}:{minute % 60:02d},{2300 + minute % 500}"
+        for target_date in _dates(days)
+        for minute in range(0, 24 * 60, 5)
+    ]
+
+
+def _document(blocks: list[list[str]], newline: str) -> str:
+    return (newline * 2).join(newline.join(block) for block in blocks) + newline
+
+
+def make_tokyo(days: int = 1) -> str:
+    # TEPCO と同じ構成 (CRLF) で当日の行数だけを days 日分に増やす
+    blocks = [["2023/01/01 18:15 UPDATE"]]
+    blocks += [[header, row] for header, row in TOMORROW_BLOCKS]
+    blocks.append([TOKYO_SPEC.today.header, *_hourly_rows(days, hokkaido_layout=False)])
+    blocks.append([TOKYO_SPEC.actual_results.header, *_five_minute_rows(days)])
+    return _document(blocks, newline="\r\n")
+
+
+def make_hokkaido(days: int = 1) -> str:
+    # HEPCO の列構成 (LF) で当日の行数だけを days 日分に増やす
+    blocks = [["2023/01/01 18:15 UPDATE"]]
+    blocks += [[header, row] for header, row in TOMORROW_BLOCKS]
+    blocks.append([HOKKAIDO_SPEC.today.header, *_hourly_rows(days, hokkaido_layout=True)])
+    return _document(blocks, newline="\n")
@@ -0,0 +1,67 @@
+import csv
+import timeit
+from datetime import date, datetime, timedelta
+from io import StringIO
+
+from libs.data.forecast import ForecastFrame, TodayForecast
+
+
+def synthetic_columns(days: int) -> dict[str, list[str]]:
+    # 1 時間ごとの行を days 日分作る
+    columns = {"DATE": [], "TIME": [], "actual": [], "demand": [], "supply": []}
+    start = date(2023, 1, 1)
+    for day in range(days):
+        target_date = (start + timedelta(days=day)).strftime("%Y/%m/%d")
+        for hour in range(24):
+            columns["DATE"].append(target_date)
+            columns["TIME"].append(f"{hour}:00")
+            columns["actual"].append(str(2000 + hour))
+            columns["demand"].append(str(2100 + hour))
+            columns["supply"].append(str(2600 + hour))
+    return columns
+
+
+def row_path(columns: dict[str, list[str]]) -> str:
+    # 変更前の処理: 行ごとに strptime と TodayForecast の検証、保存時に model_dump
+    structured_data = []
+    for d, t, actual, demand, supply in zip(*columns.values()):
+        dt = datetime.strptime(f"{d} {t}", "%Y/%m/%d %H:%M")
+        structured_data.append(
+            TodayForecast(dt=dt, actual_result=actual, forecast_demand=demand, forecast_supply=supply)
+        )
+    save_data = [tf.model_dump() for tf in structured_data]
+    f = StringIO()
+    writer = csv.DictWriter(f, fieldnames=list(save_data[0].keys()))
+    writer.writeheader()
+    writer.writerows(save_data)
+    return f.getvalue()
+
+
+def frame_path(columns: dict[str, list[str]]) -> str:
+    frame = ForecastFrame.from_strings(
+        dates=columns["DATE"],
+        times=columns["TIME"],
+        actual_result=columns["actual"],
+        forecast_demand=columns["demand"],
+        forecast_supply=columns["supply"],
+    )
+    f = StringIO()
+    writer = csv.writer(f)
+    writer.writerow(ForecastFrame.COLUMNS)
+    writer.writerows(frame.rows())
+    return f.getvalue()
+
+
+def main(days: int = 365, number: int = 5) -> None:
+    columns = synthetic_columns(days)
+    assert row_path(columns) == frame_path(columns)
+    rows = timeit.timeit(lambda: row_path(columns), number=number) / number
+    frame = timeit.timeit(lambda: frame_path(columns), number=number) / number
+    print(f"{days} days ({days * 24} rows)")
+    print(f"TodayForecast rows: {rows * 1e3:8.1f} ms/run")
+    print(f"ForecastFrame:      {frame * 1e3:8.1f} ms/run")
+    print(f"speedup:            {rows / frame:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
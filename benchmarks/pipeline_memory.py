@@ -0,0 +1,95 @@
+import argparse
+import sys
+import time
+import tracemalloc
+from typing import List
+
+from benchmarks.fixtures import make_tokyo
+from benchmarks.stubs import StubHTTPServer
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData
+from libs.forecast_collector import ForecastPipeline
+from libs.forecast_collector.base import Collector
+from libs.forecast_collector.parallel import build_session
+from libs.forecast_collector.sources import SpecDataDownloader, SpecDataTransformer
+from libs.forecast_collector.spec import compile_spec
+from libs.forecast_saver.saver import Saver
+
+
+class CountingSaver(Saver):
+    # 保存先の代わりに件数だけを数える (保存先のメモリ使用量を含めない)
+    def __init__(self, delay: float = 0.0) -> None:
+        self.saved = 0
+        self._delay = delay
+
+    def run_batch(self, forecasts):
+        forecasts = list(forecasts)
+        time.sleep(self._delay)
+        self.saved += len(forecasts)
+
+    def run(self, structured_data: ForecastData):
+        self.run_batch([structured_data])
+
+
+class StubDownloader(SpecDataDownloader):
+    def __init__(self, url: str) -> None:
+        super().__init__(compile_spec(Area.tokyo))
+        self._url = url
+
+    def run(self) -> str:
+        return self._fetch(self._url)
+
+
+def collectors(url: str, session, days: int):
+    for day in range(days):
+        yield day, Collector(StubDownloader(url).with_session(session), SpecDataTransformer(compile_spec(Area.tokyo)))
+
+
+def materialized(url: str, session, days: int, batch_size: int) -> int:
+    # 以前の Backfill と同じく、全件を取得・解析してから保存する
+    saver = CountingSaver()
+    forecasts: List[ForecastData] = [collector.run() for _, collector in collectors(url, session, days)]
+    for start in range(0, len(forecasts), batch_size):
+        saver.run_batch(forecasts[start : start + batch_size])
+    return saver.saved
+
+
+def streamed(url: str, session, days: int, batch_size: int) -> int:
+    saver = CountingSaver()
+    ForecastPipeline(saver).with_batch_size(batch_size).run(collectors(url, session, days))
+    return saver.saved
+
+
+def measure(func, *args) -> tuple:
+    # tracemalloc は遅くなるので、時間は別に計測する
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    saved = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return saved, elapsed, peak
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="peak memory of materialized vs streamed multi-day runs")
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 120, 365])
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.01, help="stub server latency per request (s)")
+    args = parser.parse_args(argv)
+    body = make_tokyo(1).encode("cp932")
+    print(f"{'mode':14s} {'days':>6s} {'saved':>6s} {'elapsed':>10s} {'peak':>10s}")
+    with StubHTTPServer(body) as server:
+        server.latency = args.latency
+        session = build_session(4)
+        for days in args.days:
+            for name, func in (("materialized", materialized), ("streamed", streamed)):
+                saved, elapsed, peak = measure(func, server.url, session, days, args.batch_size)
+                print(f"{name:14s} {days:6d} {saved:6d} {elapsed * 1e3:8.0f} ms {peak / 2**20:7.1f} MiB")
+        session.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import csv
+import timeit
+from io import StringIO
+from pathlib import Path
+
+from libs.constants.area import Area
+from libs.forecast_collector.section import SectionIndex
+from libs.forecast_collector.spec import load_spec
+
+FIXTURE = Path(__file__).resolve().parent.parent / "tests" / "csv" / "tokyo.csv"
+SPEC = load_spec(Area.tokyo)
+HEADERS = [*(section.header for section in SPEC.tomorrow), SPEC.today.header]
+
+
+def load_fixture() -> str:
+    with FIXTURE.open(encoding="shift_jis", newline="") as f:
+        return f.read()
+
+
+def find_and_slice(raw_data: str) -> int:
+    # 変更前の _extract 相当: ヘッダーごとに全文を find してスライスする
+    count = 0
+    for header in HEADERS:
+        start_idx = raw_data.find(header)
+        sliced = raw_data[start_idx:]
+        end_idx = sliced.find("\r\n\r\n")
+        for _ in csv.DictReader(StringIO(sliced[:end_idx]), delimiter=","):
+            count += 1
+    return count
+
+
+def section_index(raw_data: str) -> int:
+    sections = SectionIndex(raw_data)
+    count = 0
+    for header in HEADERS:
+        for _ in sections.section(header):
+            count += 1
+    return count
+
+
+def main(number: int = 2000) -> None:
+    raw_data = load_fixture()
+    assert find_and_slice(raw_data) == section_index(raw_data)
+    legacy = timeit.timeit(lambda: find_and_slice(raw_data), number=number) / number
+    indexed = timeit.timeit(lambda: section_index(raw_data), number=number) / number
+    print(f"find-and-slice: {legacy * 1e6:8.1f} us/run")
+    print(f"section index:  {indexed * 1e6:8.1f} us/run")
+    print(f"speedup:        {legacy / indexed:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
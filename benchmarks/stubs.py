@@ -0,0 +1,98 @@
+import itertools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class StubAthenaClient:
+    # 投入されたクエリを記録し、すぐに SUCCEEDED を返す Athena クライアントの代わり
+    # states にクエリの先頭 (DELETE / INSERT など) ごとの終了状態を指定できる
+    def __init__(self, states: Optional[Dict[str, str]] = None) -> None:
+        self._ids = itertools.count()
+        self._states = states or {}
+        self.queries: List[str] = []
+        self._executions: Dict[str, str] = {}
+
+    def start_query_execution(self, QueryString: str, WorkGroup: str):
+        execution_id = str(next(self._ids))
+        self.queries.append(QueryString)
+        self._executions[execution_id] = self._states.get(QueryString.split(None, 1)[0].upper(), "SUCCEEDED")
+        return {"QueryExecutionId": execution_id}
+
+    def batch_get_query_execution(self, QueryExecutionIds: List[str]):
+        return {
+            "QueryExecutions": [
+                {"QueryExecutionId": execution_id, "Status": {"State": self._executions[execution_id]}}
+                for execution_id in QueryExecutionIds
+            ]
+        }
+
+
+class StubHTTPServer:
+    # 取得元の代わりに本文を返すローカルの HTTP サーバー
+    # faults に積んだ順に、リクエストごとに遅延・エラーを注入する (空になったら正常に返す)
+    #   ("error", status)     : status を返す
+    #   ("delay", seconds)    : ヘッダーを返す前に待つ
+    #   ("trickle", seconds)  : 本文を seconds 秒ごとに 1 バイトずつ返す
+    def __init__(self, body: bytes) -> None:
+        stub = self
+        self.body = body
+        self.faults: List[tuple] = []
+        # 全リクエストに加える遅延 (秒)
+        self.latency = 0.0
+        self.requests = 0
+        # リクエストされたパス (到着順)
+        self.paths: List[str] = []
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    stub.paths.append(self.path)
+                    fault = stub.faults.pop(0) if stub.faults else ("ok", 0)
+                stub._respond(self, *fault)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def _respond(self, handler: BaseHTTPRequestHandler, kind: str, value: float):
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if kind == "error":
+                handler.send_error(int(value))
+                return
+            if kind == "delay":
+                time.sleep(value)
+            handler.send_response(200)
+            handler.send_header("Content-Length", str(len(self.body)))
+            handler.end_headers()
+            if kind == "trickle":
+                for idx in range(len(self.body)):
+                    handler.wfile.write(self.body[idx : idx + 1])
+                    handler.wfile.flush()
+                    time.sleep(value)
+                return
+            handler.wfile.write(self.body)
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントがタイムアウトで切断した
+            pass
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
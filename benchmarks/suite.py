@@ -0,0 +1,174 @@
+import argparse
+import json
+import sys
+import tempfile
+import timeit
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict
+
+from benchmarks.fixtures import load_tokyo, make_hokkaido, make_tokyo
+from benchmarks.stubs import StubAthenaClient
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData
+from libs.data.rollup import DailyRollup
+from libs.forecast_collector.spec import CompiledSpec, compile_spec
+from libs.forecast_saver import AthenaSaver, CsvSaver, FanOutSaver, ForecastSpool, LocalObjectStore, SqliteSaver
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+# baseline.json に個別の指定がなければ、基準値の 1.5 倍を超えたら劣化とみなす
+DEFAULT_THRESHOLD = 1.5
+SCALED_DAYS = 365
+
+
+def _today(compiled: CompiledSpec, raw_data: str) -> Callable[[], object]:
+    return lambda: compiled.today(compiled.sections(raw_data))
+
+
+def _tomorrow(compiled: CompiledSpec, raw_data: str) -> Callable[[], object]:
+    target_date = date(2023, 1, 1)
+    return lambda: compiled.tomorrow(compiled.sections(raw_data), target_date)
+
+
+def _actual_results(compiled: CompiledSpec, raw_data: str) -> Callable[[], object]:
+    return lambda: compiled.actual_results(compiled.sections(raw_data))
+
+
+def _csv_saver(structured_data: ForecastData) -> Callable[[], object]:
+    # manifest が残っていると変更のないパーティションは書き出さないので、毎回消して CSV への変換から計測する
+    store = LocalObjectStore(tempfile.mkdtemp())
+
+    def run():
+        store.delete(CsvSaver.MANIFEST_KEY)
+        CsvSaver(store).run(structured_data=structured_data)
+
+    return run
+
+
+def _sqlite_saver(structured_data: ForecastData) -> Callable[[], object]:
+    saver = SqliteSaver(str(Path(tempfile.mkdtemp()) / "forecast.sqlite3"))
+    return lambda: saver.run(structured_data=structured_data)
+
+
+def _fan_out_saver(structured_data: ForecastData) -> Callable[[], object]:
+    # spool への記録・読み出し・配送済みの削除の分だけを計測する (保存先は SQLite のメモリ上の DB)
+    spool = ForecastSpool(str(Path(tempfile.mkdtemp()) / "spool.sqlite3"))
+    saver = FanOutSaver({"sqlite": SqliteSaver()}, spool)
+    return lambda: saver.run(structured_data=structured_data)
+
+
+def _athena_saver(forecasts: list[ForecastData]) -> Callable[[], object]:
+    # SQL の組み立てとパイプラインの処理のみを計測する (クライアントはスタブ)
+    saver = AthenaSaver(client=StubAthenaClient()).with_poll_interval(0, 0)
+    return lambda: saver.run_batch(forecasts=forecasts)
+
+
+def cases() -> Dict[str, Callable[[], object]]:
+    tokyo_raw = load_tokyo()
+    tokyo_scaled = make_tokyo(days=SCALED_DAYS)
+    hokkaido_raw = make_hokkaido(days=1)
+    hokkaido_scaled = make_hokkaido(days=SCALED_DAYS)
+
+    tokyo = compile_spec(Area.tokyo)
+    hokkaido = compile_spec(Area.hokkaido)
+    target_date = date(2023, 1, 1)
+
+    tokyo_data = tokyo.parse(tokyo_raw, target_date)
+    tokyo_scaled_data = tokyo.parse(tokyo_scaled, target_date)
+    hokkaido_scaled_data = hokkaido.parse(hokkaido_scaled, target_date)
+    scaled_rows = tokyo_scaled_data.today_forecasts
+
+    return {
+        # 解析
+        "tokyo.today_transformer": _today(tokyo, tokyo_raw),
+        "tokyo.tomorrow_transformer": _tomorrow(tokyo, tokyo_raw),
+        "tokyo.actual_result_transformer": _actual_results(tokyo, tokyo_raw),
+        "tokyo.data_transformer": lambda: tokyo.parse(tokyo_raw, target_date),
+        f"tokyo.today_transformer.{SCALED_DAYS}d": _today(tokyo, tokyo_scaled),
+        f"tokyo.actual_result_transformer.{SCALED_DAYS}d": _actual_results(tokyo, tokyo_scaled),
+        "hokkaido.today_transformer": _today(hokkaido, hokkaido_raw),
+        "hokkaido.tomorrow_transformer": _tomorrow(hokkaido, hokkaido_raw),
+        f"hokkaido.today_transformer.{SCALED_DAYS}d": _today(hokkaido, hokkaido_scaled),
+        # モデルの構築
+        f"forecast_data.from_frame.{SCALED_DAYS}d": lambda: ForecastData(
+            area=tokyo_scaled_data.area,
+            today_frame=tokyo_scaled_data.today_frame,
+            tomorrow_forecast=tokyo_scaled_data.tomorrow_forecast,
+        ),
+        f"forecast_data.from_rows.{SCALED_DAYS}d": lambda: ForecastData(
+            area=tokyo_scaled_data.area,
+            today_forecasts=scaled_rows,
+            tomorrow_forecast=tokyo_scaled_data.tomorrow_forecast,
+        ),
+        f"forecast_data.to_rows.{SCALED_DAYS}d": lambda: tokyo_scaled_data.today_forecasts,
+        # 集計
+        f"daily_rollup.{SCALED_DAYS}d": lambda: DailyRollup.from_frame(
+            tokyo_scaled_data.area, tokyo_scaled_data.today_frame
+        ),
+        # 保存
+        "csv_saver.tokyo": _csv_saver(tokyo_data),
+        f"csv_saver.{SCALED_DAYS}d": _csv_saver(tokyo_scaled_data),
+        "sqlite_saver.tokyo": _sqlite_saver(tokyo_data),
+        f"sqlite_saver.{SCALED_DAYS}d": _sqlite_saver(tokyo_scaled_data),
+        "fan_out_saver.tokyo": _fan_out_saver(tokyo_data),
+        "athena_saver.sql.tokyo": _athena_saver([tokyo_data]),
+        f"athena_saver.sql.{SCALED_DAYS}d": _athena_saver([tokyo_scaled_data, hokkaido_scaled_data]),
+    }
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    # 0.2 秒程度かかる回数を 1 セットとし、repeat セットのうち最小の 1 回あたりの秒数を返す
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {"threshold": DEFAULT_THRESHOLD, "results": {}}
+    return json.loads(path.read_text())
+
+
+def compare(results: Dict[str, float], baseline: dict) -> list[str]:
+    regressions = []
+    default_threshold = baseline.get("threshold", DEFAULT_THRESHOLD)
+    for name, seconds in results.items():
+        expected = baseline["results"].get(name)
+        if expected is None:
+            continue
+        threshold = expected.get("threshold", default_threshold)
+        if seconds > expected["seconds"] * threshold:
+            regressions.append(f"{name}: {seconds * 1e6:.1f} us > {expected['seconds'] * 1e6:.1f} us x {threshold}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="parse / model build / save serialization benchmarks")
+    parser.add_argument("-k", "--filter", default="", help="run only benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, func in cases().items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(func, repeat=args.repeat)
+        if not args.json:
+            print(f"{name:45s} {results[name] * 1e6:12.1f} us")
+
+    baseline = load_baseline(args.baseline)
+    if args.update_baseline:
+        for name, seconds in results.items():
+            baseline["results"].setdefault(name, {})["seconds"] = seconds
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        return 0
+
+    regressions = compare(results, baseline)
+    if args.json:
+        print(json.dumps({"results": results, "regressions": regressions}, indent=2))
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
@@ -1,29 +1,198 @@
 import logging
+import os
+from datetime import date
+from functools import lru_cache
+from typing import Optional
 
 from libs.constants.area import Area
-from libs.forecast_collector import collect_hokkaido_forecast, collect_tokyo_forecast
-from libs.forecast_saver import AthenaSaver
+from libs.forecast_collector import (
+    CollectorRegistry,
+    CircuitOpen,
+    ConcurrentCollector,
+    FetchPolicy,
+    SourceCache,
+    UpdateSchedule,
+    compile_spec,
+    enabled_areas,
+    set_fetch_policy,
+    shared_session,
+)
+from libs.forecast_saver import (
+    AthenaSaver,
+    CsvSaver,
+    FanOutSaver,
+    ForecastSpool,
+    IncrementalSaver,
+    LocalObjectStore,
+    S3ObjectStore,
+    SnapshotStore,
+)
+from libs.instrumentation import EmbeddedMetricSink, Recorder, set_recorder
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-AREA_COLLECTOR_MAPPING = {
-    Area.hokkaido: collect_hokkaido_forecast,
-    Area.tokyo: collect_tokyo_forecast,
-}
+# 取得元の定義 (libs/forecast_collector/specs/<area>.json) のうち enabled のものだけを取得する
+# 定義の検証・解析処理の準備は実行するエリアの分だけ初回の呼び出し時に行う
+AREA_COLLECTOR_MAPPING = CollectorRegistry(
+    {area: f"libs.forecast_collector.sources:collect_{area.value}_forecast" for area in enabled_areas()}
+)
+
+# 日付ごとのファイルを取得できる (過去データを取り込める) かは backfill の実行時に定義から判定する
+AREA_BACKFILL_MAPPING = CollectorRegistry(
+    {area: f"libs.forecast_collector.sources:{area.value}_collector" for area in enabled_areas()}
+)
+
+COLLECT_MAX_WORKERS = int(os.environ.get("COLLECT_MAX_WORKERS", len(Area)))
+SOURCE_CACHE_DIR = os.environ.get("SOURCE_CACHE_DIR", "/tmp/forecast_source_cache")
+BACKFILL_CHECKPOINT_DIR = os.environ.get("BACKFILL_CHECKPOINT_DIR", "/tmp/forecast_backfill")
+# 前回保存した行。空の場合は全行を保存する
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "/tmp/forecast_snapshot.sqlite3")
+# 取得元ごとの更新日時の履歴 (次の更新まではそのエリアを取得しない)
+SCHEDULE_PATH = os.environ.get("SCHEDULE_PATH", "/tmp/forecast_schedule.json")
+# 取得元ごとの持ち時間 (秒)。リトライ・ヘッジを含め、この時間を超えたエリアは諦めて他のエリアを保存する
+FETCH_DEADLINE = float(os.environ.get("FETCH_DEADLINE", 20))
+FETCH_RETRIES = int(os.environ.get("FETCH_RETRIES", 2))
+# 指定した秒数以内に応答がなければ同じリクエストをもう 1 本送る (空の場合は送らない)
+FETCH_HEDGE_AFTER = float(os.environ["FETCH_HEDGE_AFTER"]) if os.environ.get("FETCH_HEDGE_AFTER") else None
+# Lambda の残り時間のうち、保存のために残しておく秒数
+SAVE_RESERVE = float(os.environ.get("SAVE_RESERVE", 5))
+# 保存先 (カンマ区切り): athena, csv
+SAVE_SINKS = [sink.strip() for sink in os.environ.get("SAVE_SINKS", "athena").split(",") if sink.strip()]
+# csv の出力先 (ローカルのパス、または s3://bucket/prefix)。Lambda で書き込めるローカルのパスは /tmp のみ
+CSV_OUTPUT = os.environ.get("CSV_OUTPUT", "/tmp/forecast_csv")
+# 保存先に書き込む前に記録する spool。保存に失敗したデータは次回の実行で再送する
+SPOOL_PATH = os.environ.get("SPOOL_PATH", "/tmp/forecast_spool.sqlite3")
+# 保存先ごとの書き込みを待つ秒数 (空の場合は Lambda の残り時間まで待つ)。終わらなかった保存先は次回に再送する
+SAVE_TIMEOUT = float(os.environ["SAVE_TIMEOUT"]) if os.environ.get("SAVE_TIMEOUT") else None
+# DAILY_ROLLUP=1 で daily_rollup テーブル (エリア・日ごとの集計値) も更新する
+DAILY_ROLLUP = os.environ.get("DAILY_ROLLUP") == "1"
+
+# METRICS_SINK=emf でステージごとの計測値を CloudWatch Embedded Metric Format で出力する
+if os.environ.get("METRICS_SINK") == "emf":
+    set_recorder(Recorder(sinks=[EmbeddedMetricSink()]))
+
+
+def fetch_policy(context) -> FetchPolicy:
+    deadline = FETCH_DEADLINE
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        # 取得が終わった後に保存する時間を残す
+        deadline = max(min(deadline, context.get_remaining_time_in_millis() / 1000 - SAVE_RESERVE), 1.0)
+    return FetchPolicy(deadline=deadline, retries=FETCH_RETRIES, hedge_after=FETCH_HEDGE_AFTER)
+
+
+def save_timeout(context) -> Optional[float]:
+    if SAVE_TIMEOUT is not None:
+        return SAVE_TIMEOUT
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        # スケジュールの記録などのために 1 秒残す
+        return max(context.get_remaining_time_in_millis() / 1000 - 1.0, 1.0)
+    return None
+
+
+@lru_cache(maxsize=None)
+def snapshot_store() -> SnapshotStore:
+    return SnapshotStore(SNAPSHOT_PATH)
+
+
+def build_sink(name: str):
+    if name == "athena":
+        # スナップショットは athena に書き込んだ内容を表す
+        return IncrementalSaver(AthenaSaver().with_rollups(DAILY_ROLLUP), snapshot_store())
+    if name == "csv":
+        if CSV_OUTPUT.startswith("s3://"):
+            bucket, _, prefix = CSV_OUTPUT[len("s3://") :].partition("/")
+            return CsvSaver(S3ObjectStore(bucket, prefix))
+        return CsvSaver(LocalObjectStore(CSV_OUTPUT))
+    raise ValueError(f"unknown sink: {name}")
+
+
+@lru_cache(maxsize=None)
+def fan_out_saver() -> FanOutSaver:
+    # ウォームスタート間で共有し、前回 timeout した配送が終わるまで同じ保存先に書き込まない
+    sinks = {name: build_sink(name) for name in SAVE_SINKS}
+    return FanOutSaver(sinks, ForecastSpool(SPOOL_PATH))
 
 
 def run(event, context):
-    # saver = CsvSaver().with_output_path("./")
-    saver = AthenaSaver()
-    # collect electricity forecast data
+    # boto3 のクライアントはウォームスタート間で共有される
+    saver = fan_out_saver()
+    # event: {"force": true} で更新予測によらず全エリアを取得する
+    force = bool(event and event.get("force"))
+    schedule = UpdateSchedule(SCHEDULE_PATH)
+    now = schedule.now()
+    collectors = {}
     for area in Area:
         collector = AREA_COLLECTOR_MAPPING.get(area)
         if collector is None:
             logger.warning(f"{area.name} importer is not defined.")
             continue
-        collected_data = collector()
-        saver.run(structured_data=collected_data)
+        decision = schedule.decide(area, now)
+        if not force and not decision.collect:
+            logger.info(f"{area.name} is skipped until {decision.next_due:%H:%M} ({decision.reason}).")
+            continue
+        collectors[area] = collector
 
+    # collect electricity forecast data
+    set_fetch_policy(fetch_policy(context))
+    cache = SourceCache(SOURCE_CACHE_DIR)
+    result = (
+        ConcurrentCollector(collectors=collectors)
+        .with_max_workers(COLLECT_MAX_WORKERS)
+        .with_cache(cache)
+        .with_session(shared_session(COLLECT_MAX_WORKERS))
+        .run()
+    )
+    for area, error in result.errors.items():
+        if isinstance(error, CircuitOpen):
+            logger.warning(f"{area.name} is skipped: {error}")
+            continue
+        logger.error(f"{area.name} collection failed: {error!r}")
+    for area, forecast in result.unchanged.items():
+        logger.info(f"{area.name} is not modified.")
+        schedule.record(area, forecast.updated_at if forecast else None, now)
 
-run(None, None)
+    try:
+        # spool に記録した時点で、保存先への書き込みに失敗しても次回の実行で再送される
+        # (取得したものがなくても、前回までに失敗したものを再送する)
+        saved = saver.with_timeout(save_timeout(context)).run_batch(forecasts=result.forecasts)
+    except Exception:
+        # spool に記録できなかったエリアは次回取り直す
+        for collected_data in result.forecasts:
+            cache.invalidate(collected_data.area)
+        schedule.save()
+        raise
+    for name, error in saved.errors.items():
+        logger.error(f"{name} save failed (will be retried): {error!r}")
+    for collected_data in result.forecasts:
+        schedule.record(collected_data.area, collected_data.updated_at, now)
+    schedule.save()
+
+
+def backfill(event, context):
+    # event: {"area": "hokkaido", "start": "2023-01-01", "end": "2023-12-31"}
+    # 毎時の実行では使わないので、呼ばれたときに読み込む
+    from libs.forecast_collector import Backfill
+
+    area = Area(event["area"])
+    collector = AREA_BACKFILL_MAPPING.get(area)
+    if collector is None or not compile_spec(area).spec.dated:
+        raise ValueError(f"{area.name} does not support backfill.")
+    start = date.fromisoformat(event["start"])
+    end = date.fromisoformat(event["end"])
+    checkpoint = event.get("checkpoint") or os.path.join(BACKFILL_CHECKPOINT_DIR, f"{area.value}.json")
+
+    saver = AthenaSaver()
+    result = (
+        Backfill(area=area, collector=collector)
+        .with_max_workers(int(event.get("max_workers", 4)))
+        .with_rate_limit(float(event.get("min_interval", 1.0)))
+        .with_batch_size(int(event.get("batch_size", 30)))
+        .with_checkpoint(checkpoint)
+        .run(start=start, end=end, saver=saver)
+    )
+    return {
+        "saved": len(result.saved),
+        "skipped": len(result.skipped),
+        "errors": {d.isoformat(): repr(e) for d, e in result.errors.items()},
+    }
@@ -1,7 +1,8 @@
-from datetime import date, datetime
-from typing import List, Optional
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Any, ClassVar, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, field_serializer, field_validator, model_validator
 
 from libs.constants.area import Area
 
@@ -22,6 +23,212 @@ class TodayForecast(BaseModel):
         return int(self.forecast_demand / self.forecast_supply * 100)
 
 
+class ForecastFrame(BaseModel):
+    # 本日の電力使用の見通しを列ごとに保持する
+    # 検証は列単位で行い、TodayForecast は要求されたときだけ作る
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    COLUMNS: ClassVar[Tuple[str, ...]] = ("dt", "actual_result", "forecast_demand", "forecast_supply")
+
+    dt: List[datetime]
+    actual_result: array
+    forecast_demand: array
+    forecast_supply: array
+
+    @field_validator("actual_result", "forecast_demand", "forecast_supply", mode="before")
+    @classmethod
+    def _validate_int_column(cls, values: Any) -> array:
+        # JSON などから読み込んだ list も受け付ける
+        if isinstance(values, list):
+            values = array("i", values)
+        if not isinstance(values, array) or values.typecode != "i":
+            raise ValueError("column must be array('i')")
+        return values
+
+    @field_serializer("actual_result", "forecast_demand", "forecast_supply")
+    def _serialize_int_column(self, values: array) -> List[int]:
+        return values.tolist()
+
+    @model_validator(mode="after")
+    def _validate_length(self) -> "ForecastFrame":
+        length = len(self.dt)
+        for column in self.COLUMNS[1:]:
+            if len(getattr(self, column)) != length:
+                raise ValueError(f"{column} length mismatch")
+        return self
+
+    @classmethod
+    def empty(cls) -> "ForecastFrame":
+        return cls(dt=[], actual_result=array("i"), forecast_demand=array("i"), forecast_supply=array("i"))
+
+    @staticmethod
+    def parse_datetimes(dates: Sequence[str], times: Sequence[str]) -> List[datetime]:
+        # "2023/10/21" と "0:00" の組をまとめて解析する
+        # 日付・時刻の種類は行数よりずっと少ないので、それぞれ一度だけ解析する
+        date_cache = {d: datetime.strptime(d, "%Y/%m/%d") for d in set(dates)}
+        time_cache = {}
+        for t in set(times):
+            hour, minute = t.split(":")
+            if not (0 <= int(hour) < 24 and 0 <= int(minute) < 60):
+                raise ValueError(f"invalid time: {t}")
+            time_cache[t] = timedelta(hours=int(hour), minutes=int(minute))
+        return [date_cache[d] + time_cache[t] for d, t in zip(dates, times)]
+
+    @staticmethod
+    def parse_ints(values: Iterable[str], default: Optional[int] = None) -> array:
+        if default is not None:
+            values = [v or default for v in values]
+        return array("i", map(int, values))
+
+    @classmethod
+    def from_strings(
+        cls,
+        dates: Sequence[str],
+        times: Sequence[str],
+        actual_result: Sequence[str],
+        forecast_demand: Sequence[str],
+        forecast_supply: Sequence[str],
+        actual_result_default: Optional[int] = None,
+    ) -> "ForecastFrame":
+        return cls(
+            dt=cls.parse_datetimes(dates, times),
+            actual_result=cls.parse_ints(actual_result, default=actual_result_default),
+            forecast_demand=cls.parse_ints(forecast_demand),
+            forecast_supply=cls.parse_ints(forecast_supply),
+        )
+
+    @classmethod
+    def from_today_forecasts(cls, today_forecasts: Iterable[TodayForecast]) -> "ForecastFrame":
+        today_forecasts = list(today_forecasts)
+        return cls(
+            dt=[tf.dt for tf in today_forecasts],
+            actual_result=array("i", [tf.actual_result for tf in today_forecasts]),
+            forecast_demand=array("i", [tf.forecast_demand for tf in today_forecasts]),
+            forecast_supply=array("i", [tf.forecast_supply for tf in today_forecasts]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.dt)
+
+    def columns(self) -> Dict[str, Sequence[Any]]:
+        return {column: getattr(self, column) for column in self.COLUMNS}
+
+    def rows(self) -> Iterator[Tuple[datetime, int, int, int]]:
+        return zip(self.dt, self.actual_result, self.forecast_demand, self.forecast_supply)
+
+    def day_slices(self) -> Iterator[Tuple[date, int, int]]:
+        # 日時順に並んでいる前提で、日付ごとの (日付, 開始位置, 終了位置) を返す
+        dts = self.dt
+        start = 0
+        for end in range(1, len(dts) + 1):
+            if end < len(dts) and dts[end].date() == dts[start].date():
+                continue
+            yield dts[start].date(), start, end
+            start = end
+
+    def take(self, indices: Sequence[int]) -> "ForecastFrame":
+        # 指定した行だけを持つ frame を返す
+        return ForecastFrame.model_construct(
+            dt=[self.dt[i] for i in indices],
+            actual_result=array("i", [self.actual_result[i] for i in indices]),
+            forecast_demand=array("i", [self.forecast_demand[i] for i in indices]),
+            forecast_supply=array("i", [self.forecast_supply[i] for i in indices]),
+        )
+
+    def to_today_forecasts(self) -> List[TodayForecast]:
+        # 列単位で検証済みなので行ごとの検証は省略する
+        return [
+            TodayForecast.model_construct(
+                dt=dt, actual_result=actual_result, forecast_demand=forecast_demand, forecast_supply=forecast_supply
+            )
+            for dt, actual_result, forecast_demand, forecast_supply in self.rows()
+        ]
+
+
+class ActualResultSeries(BaseModel):
+    # 使用電力の当日実績 (5分間隔値など一定間隔の時系列)
+    # 行ごとにオブジェクトを作らず、開始日時・間隔・int 配列で 1 エリア分を保持する
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    # 欠測値 (まだ実績が出ていない時刻など)
+    MISSING: ClassVar[int] = -1
+
+    # 先頭の日時
+    start: datetime
+    # 間隔
+    interval: timedelta
+    # 使用電力の実績 (万kW)
+    values: array
+
+    @field_validator("values", mode="before")
+    @classmethod
+    def _validate_values(cls, values: Any) -> array:
+        if isinstance(values, list):
+            values = array("i", values)
+        if not isinstance(values, array) or values.typecode != "i":
+            raise ValueError("values must be array('i')")
+        return values
+
+    @field_serializer("values")
+    def _serialize_values(self, values: array) -> List[int]:
+        return values.tolist()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def end(self) -> datetime:
+        return self.start + self.interval * len(self.values)
+
+    def dt_at(self, idx: int) -> datetime:
+        return self.start + self.interval * idx
+
+    def observed_count(self) -> int:
+        return len(self.values) - self.values.count(self.MISSING)
+
+    def peak(self) -> Optional[Tuple[datetime, int]]:
+        if not self.values:
+            return None
+        peak_value = max(self.values)
+        if peak_value == self.MISSING:
+            return None
+        return self.dt_at(self.values.index(peak_value)), peak_value
+
+    def resample(self, interval: timedelta) -> "ActualResultSeries":
+        # interval ごとの平均値に集約する (欠測値は除外、全て欠測なら MISSING)
+        step, remainder = divmod(interval, self.interval)
+        if step < 1 or remainder:
+            raise ValueError("interval must be a multiple of the series interval")
+        values = self.values
+        rolled = array("i")
+        for idx in range(0, len(values), step):
+            chunk = values[idx : idx + step]
+            missing = chunk.count(self.MISSING)
+            observed = len(chunk) - missing
+            # MISSING (-1) の分を足し戻して欠測を除いた合計にする
+            rolled.append((sum(chunk) + missing) // observed if observed else self.MISSING)
+        return ActualResultSeries(start=self.start, interval=interval, values=rolled)
+
+    def hourly(self) -> "ActualResultSeries":
+        return self.resample(timedelta(hours=1))
+
+    @classmethod
+    def concat(cls, series: Iterable["ActualResultSeries"]) -> "ActualResultSeries":
+        # 連続した期間の系列を 1 本にまとめる (1 年分でも数 MB 程度)
+        series = list(series)
+        if not series:
+            raise ValueError("series is empty")
+        head = series[0]
+        values = array("i")
+        for s in series:
+            if s.interval != head.interval:
+                raise ValueError("interval mismatch")
+            if s.start != head.start + head.interval * len(values):
+                raise ValueError("series are not contiguous")
+            values.extend(s.values)
+        return cls(start=head.start, interval=head.interval, values=values)
+
+
 class TomorrowForecast(BaseModel):
     # 翌日の電力使用の見通し
     date: date
@@ -41,5 +248,21 @@ class TomorrowForecast(BaseModel):
 
 class ForecastData(BaseModel):
     area: Area
-    today_forecasts: List[TodayForecast]
+    today_frame: ForecastFrame
     tomorrow_forecast: Optional[TomorrowForecast]
+    actual_results: Optional[ActualResultSeries] = None
+    # 取得元の更新日時 (UPDATE 行)
+    updated_at: Optional[datetime] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _convert_today_forecasts(cls, data: Any) -> Any:
+        # 従来どおり today_forecasts (TodayForecast のリスト) でも受け付ける
+        if isinstance(data, dict) and "today_forecasts" in data:
+            data = dict(data)
+            data["today_frame"] = ForecastFrame.from_today_forecasts(data.pop("today_forecasts"))
+        return data
+
+    @property
+    def today_forecasts(self) -> List[TodayForecast]:
+        return self.today_frame.to_today_forecasts()
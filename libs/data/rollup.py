@@ -0,0 +1,120 @@
+import operator
+from array import array
+from datetime import date, datetime
+from itertools import compress
+from typing import ClassVar, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastFrame
+
+
+class DailyRollup(BaseModel):
+    # エリア・日ごとの集計値 (ダッシュボードなどは生の行ではなくこちらを参照する)
+    COLUMNS: ClassVar[Tuple[str, ...]] = (
+        "hours",
+        "peak_demand",
+        "peak_demand_time",
+        "peak_usage_pc",
+        "peak_usage_time",
+        "min_reserve",
+        "min_reserve_time",
+        "observed_hours",
+        "peak_actual",
+        "mean_abs_error",
+        "max_abs_error",
+        "mean_abs_error_pc",
+    )
+
+    area: Area
+    date: date
+    # 集計した行数
+    hours: int
+    # 予測需要のピーク
+    peak_demand: int
+    peak_demand_time: datetime
+    # 使用率 (予測需要 / 予測供給) のピーク
+    peak_usage_pc: int
+    peak_usage_time: datetime
+    # 予備力 (予測供給 - 予測需要) の最小値
+    min_reserve: int
+    min_reserve_time: datetime
+    # 以下は実績のある時間帯のみで集計する
+    observed_hours: int
+    peak_actual: Optional[int] = None
+    # 実績と予測需要の誤差
+    mean_abs_error: Optional[float] = None
+    max_abs_error: Optional[int] = None
+    mean_abs_error_pc: Optional[float] = None
+
+    @classmethod
+    def _from_columns(
+        cls,
+        area: Area,
+        target_date: date,
+        dt: List[datetime],
+        actual_result: array,
+        demand: array,
+        supply: array,
+    ) -> "DailyRollup":
+        # 行ごとのオブジェクトは作らず、列 (array) 単位で集計する
+        reserve = list(map(operator.sub, supply, demand))
+        if 0 in supply:
+            usage = [d / s if s else 0.0 for d, s in zip(demand, supply)]
+        else:
+            usage = list(map(operator.truediv, demand, supply))
+        peak_demand = max(demand)
+        peak_usage = max(usage)
+        min_reserve = min(reserve)
+
+        # 実績が 0 の時間帯はまだ実績が出ていない
+        observed_actual = list(compress(actual_result, actual_result))
+        observed_demand = list(compress(demand, actual_result))
+        errors = {}
+        if observed_actual:
+            abs_errors = list(map(abs, map(operator.sub, observed_actual, observed_demand)))
+            errors = dict(
+                peak_actual=max(observed_actual),
+                mean_abs_error=sum(abs_errors) / len(abs_errors),
+                max_abs_error=max(abs_errors),
+                mean_abs_error_pc=sum(map(operator.truediv, abs_errors, observed_actual)) / len(abs_errors) * 100,
+            )
+        return cls(
+            area=area,
+            date=target_date,
+            hours=len(dt),
+            peak_demand=peak_demand,
+            peak_demand_time=dt[demand.index(peak_demand)],
+            peak_usage_pc=int(peak_usage * 100),
+            peak_usage_time=dt[usage.index(peak_usage)],
+            min_reserve=min_reserve,
+            min_reserve_time=dt[reserve.index(min_reserve)],
+            observed_hours=len(observed_actual),
+            **errors,
+        )
+
+    @classmethod
+    def from_frame(
+        cls, area: Area, frame: ForecastFrame, dates: Optional[Iterable[date]] = None
+    ) -> List["DailyRollup"]:
+        # dates を指定した場合はその日のみを集計する (変更のあった日だけを更新する)
+        targets = set(dates) if dates is not None else None
+        rollups = []
+        for target_date, start, end in frame.day_slices():
+            if targets is not None and target_date not in targets:
+                continue
+            rollups.append(
+                cls._from_columns(
+                    area=area,
+                    target_date=target_date,
+                    dt=frame.dt[start:end],
+                    actual_result=frame.actual_result[start:end],
+                    demand=frame.forecast_demand[start:end],
+                    supply=frame.forecast_supply[start:end],
+                )
+            )
+        return rollups
+
+    def values(self) -> tuple:
+        return tuple(getattr(self, column) for column in self.COLUMNS)
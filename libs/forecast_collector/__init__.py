@@ -1,2 +1,39 @@
-from .hokkaido import collect_hokkaido_forecast  # noqa: F401
-from .tokyo import collect_tokyo_forecast  # noqa: F401
+import importlib
+
+from libs.constants.area import Area
+
+from .cache import SourceCache, SourceNotModified  # noqa: F401
+from .fetch import (  # noqa: F401
+    CircuitBreaker,
+    CircuitOpen,
+    DeadlineExceeded,
+    FetchPolicy,
+    get_fetch_policy,
+    reset_circuit_breakers,
+    set_fetch_policy,
+)
+from .parallel import CollectResult, ConcurrentCollector, shared_session  # noqa: F401
+from .registry import CollectorRegistry  # noqa: F401
+from .schedule import ScheduleDecision, UpdateSchedule  # noqa: F401
+from .spec import CompiledSpec, SourceSpec, compile_spec, enabled_areas, load_spec, spec_areas  # noqa: F401
+
+# エリアごとの収集関数は参照されたときに作る (CollectorRegistry と同じ理由)
+# 過去データの取り込みでしか使わないモジュールも、毎時の実行の初期化で読み込まないようにする
+_LAZY_ATTRIBUTES = {
+    "Backfill": ".backfill",
+    "BackfillResult": ".backfill",
+    "HostRateLimiter": ".backfill",
+    "ForecastPipeline": ".pipeline",
+    "PipelineResult": ".pipeline",
+    "collect_source": ".sources",
+    "source_collector": ".sources",
+    **{f"collect_{area.value}_forecast": ".sources" for area in Area},
+    **{f"{area.value}_collector": ".sources" for area in Area},
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name, __name__), name)
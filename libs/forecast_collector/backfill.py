@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from libs.constants.area import Area
+from libs.forecast_collector.base import Collector
+from libs.forecast_collector.cache import SourceCache
+from libs.forecast_collector.pipeline import ForecastPipeline
+
+# (session, cache, target_date) を受け取り、その日のファイルを取得・解析する Collector を返す
+BackfillCollectorFactory = Callable[[Optional[requests.Session], Optional[SourceCache], Optional[date]], Collector]
+
+
+class HostRateLimiter:
+    # ホストごとにリクエストの間隔を min_interval 秒以上あける
+    def __init__(self, min_interval: float) -> None:
+        self._min_interval = min_interval
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str):
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(now, self._next.get(host, now))
+            self._next[host] = scheduled + self._min_interval
+        if scheduled > now:
+            time.sleep(scheduled - now)
+
+
+class RateLimitedSession(requests.Session):
+    def __init__(self, rate_limiter: HostRateLimiter) -> None:
+        super().__init__()
+        self._rate_limiter = rate_limiter
+
+    def request(self, method, url, *args, **kwargs):
+        self._rate_limiter.acquire(urlparse(url).netloc)
+        return super().request(method, url, *args, **kwargs)
+
+
+class BackfillCheckpoint:
+    # 保存まで終わった日付を記録し、中断後は続きから再開する
+    def __init__(self, path: Optional[str]) -> None:
+        self._path = Path(path) if path else None
+        self._completed: Dict[str, Set[str]] = {}
+        if self._path is not None and self._path.exists():
+            loaded = json.loads(self._path.read_text())
+            self._completed = {area: set(dates) for area, dates in loaded.items()}
+
+    def is_completed(self, area: Area, target_date: date) -> bool:
+        return target_date.isoformat() in self._completed.get(area.value, set())
+
+    def mark(self, area: Area, target_dates: List[date]):
+        self._completed.setdefault(area.value, set()).update(d.isoformat() for d in target_dates)
+        if self._path is None:
+            return
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({area: sorted(dates) for area, dates in self._completed.items()}, f)
+        os.replace(tmp_path, self._path)
+
+
+class BackfillResult:
+    def __init__(self) -> None:
+        self.saved: List[date] = []
+        self.skipped: List[date] = []
+        self.errors: Dict[date, Exception] = {}
+
+
+class Backfill:
+    # 日付ごとにファイルが分かれている取得元の過去データをまとめて取り込む
+    # 取得・解析・保存は ForecastPipeline で並行して進め、保存は batch_size 日分ずつ saver.run_stream に渡す
+    def __init__(self, area: Area, collector: BackfillCollectorFactory) -> None:
+        self._area = area
+        self._collector = collector
+        self._max_workers = 4
+        self._min_interval = 1.0
+        self._batch_size = 30
+        self._checkpoint = BackfillCheckpoint(None)
+
+    def with_max_workers(self, max_workers: int):
+        self._max_workers = max_workers
+        return self
+
+    def with_rate_limit(self, min_interval: float):
+        self._min_interval = min_interval
+        return self
+
+    def with_batch_size(self, batch_size: int):
+        self._batch_size = batch_size
+        return self
+
+    def with_checkpoint(self, path: str):
+        self._checkpoint = BackfillCheckpoint(path)
+        return self
+
+    @staticmethod
+    def _dates(start: date, end: date) -> Iterator[date]:
+        for offset in range((end - start).days + 1):
+            yield start + timedelta(days=offset)
+
+    def _completed(self, target_dates: List[date]):
+        self._checkpoint.mark(self._area, target_dates)
+
+    def run(self, start: date, end: date, saver) -> BackfillResult:
+        result = BackfillResult()
+        pending = []
+        for target_date in self._dates(start, end):
+            if self._checkpoint.is_completed(self._area, target_date):
+                result.skipped.append(target_date)
+            else:
+                pending.append(target_date)
+        if not pending:
+            return result
+
+        session = RateLimitedSession(HostRateLimiter(self._min_interval))
+        adapter = HTTPAdapter(pool_connections=self._max_workers, pool_maxsize=self._max_workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        pipeline = (
+            ForecastPipeline(saver)
+            .with_download_workers(self._max_workers)
+            .with_queue_size(self._max_workers * 2)
+            .with_batch_size(self._batch_size)
+        )
+        with session:
+            # Collector は取得する順に作る
+            collectors = ((target_date, self._collector(session, None, target_date)) for target_date in pending)
+            pipeline_result = pipeline.run(collectors, on_saved=self._completed)
+        result.saved.extend(pipeline_result.saved)
+        result.errors.update(pipeline_result.errors)
+        return result
@@ -1,18 +1,219 @@
+import codecs
+import contextvars
+import hashlib
+import time
 from abc import ABC, abstractmethod
-from typing import List
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
 
 import requests
+from requests.compat import chardet
 
+from libs.constants.area import Area
 from libs.data.forecast import ForecastData
+from libs.forecast_collector.cache import CacheEntry, SourceCache, SourceNotModified
+from libs.forecast_collector.fetch import (
+    Deadline,
+    DeadlineExceeded,
+    FetchPolicy,
+    circuit_breaker,
+    get_fetch_policy,
+    is_retryable,
+)
+from libs.instrumentation import get_recorder
+
+
+# 宣言されていない取得元について、一度判定した文字コードを覚えておく
+_DETECTED_ENCODINGS: Dict[object, str] = {}
+
+
+class _Fetched(NamedTuple):
+    status_code: int
+    headers: Mapping[str, str]
+    text: Optional[str] = None
+    body_hash: Optional[str] = None
 
 
 class DataDownloader(ABC):
+    AREA: Optional[Area] = None
+    # 取得元の文字コード (None の場合は判定する)
+    ENCODING: Optional[str] = None
+    CHUNK_SIZE = 64 * 1024
+    _session: Optional[requests.Session] = None
+    _cache: Optional[SourceCache] = None
+    _fetched: Optional[CacheEntry] = None
+    _stream: bool = True
+    _fetch_policy: Optional[FetchPolicy] = None
+    _target_date: Optional[date] = None
+
+    def with_target_date(self, target_date: Optional[date]):
+        self._target_date = target_date
+        return self
+
+    @property
+    def target_date(self) -> date:
+        # 指定がなければ実行日
+        return self._target_date or date.today()
+
+    def with_session(self, session: Optional[requests.Session]):
+        self._session = session
+        return self
+
+    def with_cache(self, cache: Optional[SourceCache]):
+        self._cache = cache
+        return self
+
+    def with_stream(self, stream: bool):
+        self._stream = stream
+        return self
+
+    def with_fetch_policy(self, policy: Optional[FetchPolicy]):
+        self._fetch_policy = policy
+        return self
+
+    @property
+    def fetch_policy(self) -> FetchPolicy:
+        # 指定がなければプロセス全体の設定 (set_fetch_policy)
+        return self._fetch_policy or get_fetch_policy()
+
+    def _encoding(self, sample: bytes) -> str:
+        if self.ENCODING is not None:
+            return self.ENCODING
+        # 同じクラスで複数のエリアを取得する場合があるので、エリアごとに覚える
+        key = self.AREA if self.AREA is not None else type(self)
+        encoding = _DETECTED_ENCODINGS.get(key)
+        if encoding is None:
+            # response.apparent_encoding と同じ判定を先頭部分だけで行う
+            encoding = chardet.detect(sample)["encoding"] or "utf-8"
+            _DETECTED_ENCODINGS[key] = encoding
+        return encoding
+
+    def _read(self, response: requests.Response) -> Tuple[str, str, int]:
+        # 本文を文字列にし、本文のハッシュ・バイト数と合わせて返す
+        hasher = hashlib.sha256()
+        if not self._stream:
+            body = response.content
+            hasher.update(body)
+            text = body.decode(self._encoding(body[: self.CHUNK_SIZE]), errors="replace")
+            return text, hasher.hexdigest(), len(body)
+
+        # チャンクごとに逐次デコードし、バイト列の本文全体は保持しない
+        decoder = None
+        parts: List[str] = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(self._encoding(chunk))(errors="replace")
+            hasher.update(chunk)
+            size += len(chunk)
+            parts.append(decoder.decode(chunk))
+        if decoder is not None:
+            parts.append(decoder.decode(b"", final=True))
+        return "".join(parts), hasher.hexdigest(), size
+
+    def _attempt(self, url: str, header: Dict[str, str], deadline: Deadline, hedged: bool = False) -> _Fetched:
+        # 1 回分のリクエスト (ヘッジした場合は並行して呼ばれるので、インスタンスの状態は変更しない)
+        deadline.check()
+        requester = self._session if self._session is not None else requests
+        with get_recorder().stage("download", area=self.AREA) as metrics:
+            if hedged:
+                metrics.tag(hedged="1")
+            with requester.get(
+                url, headers=header, stream=self._stream, timeout=self.fetch_policy.timeout(deadline)
+            ) as response:
+                metrics.tag(status=str(response.status_code))
+                if response.status_code == 304:
+                    return _Fetched(response.status_code, response.headers)
+                response.raise_for_status()
+                with deadline.guard(response):
+                    text, body_hash, size = self._read(response)
+                metrics.set(bytes=size)
+        return _Fetched(response.status_code, response.headers, text, body_hash)
+
+    def _hedged_attempt(self, url: str, header: Dict[str, str], deadline: Deadline) -> _Fetched:
+        # hedge_after 秒以内に終わらなければ同じリクエストをもう 1 本送り、先に成功した方を使う
+        # 遅い方は待たずに戻る (タイムアウトか完了で終わる)
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            # 計測値のエリアを引き継ぐため、呼び出し元のコンテキストで実行する
+            pending = {executor.submit(contextvars.copy_context().run, self._attempt, url, header, deadline)}
+            done, _ = wait(pending, timeout=min(self.fetch_policy.hedge_after, deadline.remaining()))
+            if not done and deadline.remaining() > 0:
+                pending.add(executor.submit(contextvars.copy_context().run, self._attempt, url, header, deadline, True))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+            if error is not None:
+                raise error
+            raise DeadlineExceeded("deadline exceeded")
+        finally:
+            executor.shutdown(wait=False)
+
     def _fetch(self, url: str):
         header = {"User-Agent": ""}
-        response = requests.get(url, headers=header)
-        response.encoding = response.apparent_encoding
-        response.raise_for_status()
-        return response.text
+        cached = self._cache.get(url) if self._cache is not None else None
+        if cached is not None:
+            # 条件付きリクエスト
+            if cached.etag:
+                header["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                header["If-Modified-Since"] = cached.last_modified
+        policy = self.fetch_policy
+        breaker = circuit_breaker(self.AREA.value if self.AREA is not None else type(self).__name__)
+        breaker.before_request()
+        deadline = Deadline(policy.deadline)
+        attempt = 0
+        while True:
+            try:
+                if policy.hedge_after is not None:
+                    fetched = self._hedged_attempt(url, header, deadline)
+                else:
+                    fetched = self._attempt(url, header, deadline)
+                break
+            except Exception as e:
+                if not is_retryable(e):
+                    # 404 などは取得元が応答しているので失敗として数えない
+                    breaker.record_success()
+                    raise
+                backoff = policy.backoff(attempt)
+                if attempt >= policy.retries or backoff >= deadline.remaining():
+                    breaker.record_failure()
+                    raise
+                attempt += 1
+                get_recorder().record(
+                    "download.retry", area=self.AREA, properties={"error": type(e).__name__}, attempt=attempt
+                )
+                time.sleep(backoff)
+        breaker.record_success()
+
+        if fetched.status_code == 304:
+            if cached is None:
+                raise requests.HTTPError(f"304 Not Modified without a cached response: {url}")
+            raise SourceNotModified(url=url, forecast=cached.forecast)
+        if self._cache is not None:
+            if cached is not None and cached.body_hash == fetched.body_hash:
+                raise SourceNotModified(url=url, forecast=cached.forecast)
+            self._fetched = CacheEntry(
+                url=url,
+                etag=fetched.headers.get("ETag"),
+                last_modified=fetched.headers.get("Last-Modified"),
+                body_hash=fetched.body_hash,
+            )
+        return fetched.text
+
+    def commit(self, forecast: ForecastData):
+        # 解析まで成功したものだけをキャッシュする
+        if self._cache is None or self._fetched is None:
+            return
+        self._cache.put(self._fetched.model_copy(update={"forecast": forecast}))
+        self._fetched = None
 
     @abstractmethod
     def run() -> str:
@@ -20,6 +221,17 @@ class DataDownloader(ABC):
 
 
 class DataTransformer(ABC):
+    _target_date: Optional[date] = None
+
+    def with_target_date(self, target_date: Optional[date]):
+        self._target_date = target_date
+        return self
+
+    @property
+    def target_date(self) -> date:
+        # データの対象日 (指定がなければ実行日)
+        return self._target_date or date.today()
+
     @abstractmethod
     def run(cls, raw_data: str) -> List[ForecastData]:
         pass
@@ -34,6 +246,24 @@ class Collector:
         self._download_strategy = download_strategy
         self._transformer_strategy = transformer_strategy
 
-    def run(self) -> List[ForecastData]:
-        raw_data = self._download_strategy.run()
-        return self._transformer_strategy.run(raw_data=raw_data)
+    @property
+    def area(self) -> Optional[Area]:
+        return self._download_strategy.AREA
+
+    def download(self) -> str:
+        # 取得元の内容が前回から変わっていなければ SourceNotModified を送出する
+        return self._download_strategy.run()
+
+    def transform(self, raw_data: str) -> ForecastData:
+        with get_recorder().stage("transform", area=self.area) as metrics:
+            forecast = self._transformer_strategy.run(raw_data=raw_data)
+            metrics.set(rows=len(forecast.today_frame))
+        self._download_strategy.commit(forecast=forecast)
+        return forecast
+
+    def run(self) -> ForecastData:
+        # 取得元の内容が前回から変わっていなければ SourceNotModified を送出する
+        with get_recorder().stage("collect", area=self.area) as metrics:
+            forecast = self.transform(self.download())
+            metrics.set(rows=len(forecast.today_frame))
+        return forecast
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+from pydantic import BaseModel
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData
+
+
+class SourceNotModified(Exception):
+    # 前回取得時から内容が変わっていない
+    def __init__(self, url: str, forecast: Optional[ForecastData]) -> None:
+        super().__init__(url)
+        self.url = url
+        self.forecast = forecast
+
+
+class CacheEntry(BaseModel):
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    body_hash: str
+    forecast: Optional[ForecastData] = None
+
+
+class SourceCache:
+    # 取得元 URL ごとに ETag / Last-Modified / 本文のハッシュ / 解析結果を保存する
+    # Lambda では /tmp に置き、ウォームスタート間で再利用する
+    def __init__(self, directory: str) -> None:
+        self._directory = Path(directory)
+        self._lock = Lock()
+
+    def _path(self, url: str) -> Path:
+        return self._directory / f"{hashlib.sha1(url.encode()).hexdigest()}.json"
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        path = self._path(url)
+        try:
+            return CacheEntry.model_validate_json(path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            # 壊れたキャッシュは無かったものとして扱う
+            return None
+
+    def put(self, entry: CacheEntry):
+        path = self._path(entry.url)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(entry.model_dump_json())
+        os.replace(tmp_path, path)
+
+    def invalidate(self, area: Area):
+        # 保存に失敗した場合など、次回は必ず取り直すようにする
+        with self._lock:
+            for path in self._directory.glob("*.json"):
+                try:
+                    entry = CacheEntry.model_validate_json(path.read_bytes())
+                except ValueError:
+                    entry = None
+                if entry is None or entry.forecast is None or entry.forecast.area == area:
+                    path.unlink(missing_ok=True)
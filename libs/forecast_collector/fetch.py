@@ -0,0 +1,192 @@
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
+
+class DeadlineExceeded(Exception):
+    # 取得元ごとの持ち時間を使い切った
+    pass
+
+
+class CircuitOpen(Exception):
+    # 失敗が続いている取得元なので取得しなかった
+    def __init__(self, key: str, retry_at: float) -> None:
+        super().__init__(f"{key} is failing; skipped for {max(retry_at - time.monotonic(), 0):.0f}s")
+        self.key = key
+        self.retry_at = retry_at
+
+
+class FetchPolicy:
+    # 取得元ごとの持ち時間・タイムアウト・リトライ・ヘッジの設定
+    def __init__(
+        self,
+        deadline: float = 20.0,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4.0,
+        hedge_after: Optional[float] = None,
+    ) -> None:
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # 指定した秒数以内に応答がなければ同じリクエストをもう 1 本送り、先に終わった方を使う
+        self.hedge_after = hedge_after
+
+    def backoff(self, attempt: int) -> float:
+        # full jitter (0 から上限までの一様乱数)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def timeout(self, deadline: "Deadline") -> Tuple[float, float]:
+        remaining = deadline.remaining()
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+
+class Deadline:
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._expires = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(self._expires - self._clock(), 0.0)
+
+    def check(self):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded("deadline exceeded")
+
+    @contextmanager
+    def guard(self, response: requests.Response):
+        # 本文を少しずつ返し続ける取得元は read timeout にかからないので、期限が来たら接続を切る
+        # 切断による読み込みの失敗は DeadlineExceeded として送出する
+        fired = threading.Event()
+
+        def abort():
+            fired.set()
+            _shutdown(response)
+
+        timer = threading.Timer(self.remaining(), abort)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        except Exception as e:
+            if fired.is_set():
+                raise DeadlineExceeded("deadline exceeded") from e
+            raise
+        finally:
+            timer.cancel()
+        if fired.is_set():
+            raise DeadlineExceeded("deadline exceeded")
+
+
+def _shutdown(response: requests.Response):
+    # 別スレッドで読み込み中のソケットを閉じる (urllib3 2.3 未満には HTTPResponse.shutdown がない)
+    raw = response.raw
+    try:
+        raw.shutdown()
+        return
+    except (AttributeError, NotImplementedError):
+        pass
+    sock = getattr(getattr(raw, "connection", None), "sock", None)
+    if sock is None:
+        # Connection: close の応答では、ソケットは http.client の応答側だけが持っている
+        sock = raw
+        for name in ("_fp", "fp", "raw", "_sock"):
+            sock = getattr(sock, name, None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def is_retryable(error: Exception) -> bool:
+    # 一時的な失敗 (接続できない・タイムアウト・5xx・429) のみリトライし、サーキットブレーカーの失敗として数える
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, DeadlineExceeded)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return False
+
+
+class CircuitBreaker:
+    # failure_threshold 回続けて失敗したら reset_timeout 秒のあいだ取得しない
+    # その後の 1 回 (half-open) が成功すれば元に戻り、失敗すれば再び止める
+    def __init__(
+        self,
+        key: str,
+        failure_threshold: int = 3,
+        reset_timeout: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.key = key
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            retry_at = self._opened_at + self._reset_timeout
+            if self._clock() < retry_at or self._trial:
+                raise CircuitOpen(self.key, retry_at)
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self._failure_threshold:
+                self._opened_at = self._clock()
+            self._trial = False
+
+
+# Lambda のウォームスタート間で状態を引き継ぐため、モジュールスコープで保持する
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_policy = FetchPolicy()
+
+
+def circuit_breaker(key: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(key)
+        return breaker
+
+
+def reset_circuit_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def get_fetch_policy() -> FetchPolicy:
+    return _policy
+
+
+def set_fetch_policy(policy: FetchPolicy):
+    global _policy
+    _policy = policy
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData
+from libs.forecast_collector.cache import SourceCache, SourceNotModified
+
+CollectFunction = Callable[[Optional[requests.Session], Optional[SourceCache]], ForecastData]
+
+
+def build_session(pool_size: int) -> requests.Session:
+    # 全エリアで keep-alive のコネクションプールを共有する
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@lru_cache(maxsize=None)
+def shared_session(pool_size: int) -> requests.Session:
+    # モジュールスコープで保持し、Lambda のウォームスタートでは前回のコネクションを再利用する
+    return build_session(pool_size)
+
+
+class CollectResult:
+    def __init__(self) -> None:
+        self.forecasts: List[ForecastData] = []
+        self.errors: Dict[Area, Exception] = {}
+        # 前回から変わっていないエリア (キャッシュ済みの解析結果)
+        self.unchanged: Dict[Area, Optional[ForecastData]] = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class ConcurrentCollector:
+    DEFAULT_MAX_WORKERS = 4
+
+    def __init__(self, collectors: Dict[Area, CollectFunction]) -> None:
+        self._collectors = collectors
+        self._max_workers = self.DEFAULT_MAX_WORKERS
+        self._cache: Optional[SourceCache] = None
+        self._session: Optional[requests.Session] = None
+
+    def with_max_workers(self, max_workers: int):
+        if max_workers < 1:
+            raise ValueError("max_workers must be positive")
+        self._max_workers = max_workers
+        return self
+
+    def with_cache(self, cache: Optional[SourceCache]):
+        self._cache = cache
+        return self
+
+    def with_session(self, session: requests.Session):
+        # 渡されたセッションは閉じない (呼び出し側で使い回す)
+        self._session = session
+        return self
+
+    def run(self) -> CollectResult:
+        result = CollectResult()
+        if not self._collectors:
+            return result
+
+        session = self._session or build_session(self._max_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                futures = {
+                    area: executor.submit(collector, session, self._cache)
+                    for area, collector in self._collectors.items()
+                }
+                # Area の定義順で結果を返す
+                for area, future in futures.items():
+                    try:
+                        result.forecasts.append(future.result())
+                    except SourceNotModified as e:
+                        result.unchanged[area] = e.forecast
+                    except Exception as e:
+                        result.errors[area] = e
+        finally:
+            if session is not self._session:
+                session.close()
+        return result
@@ -0,0 +1,213 @@
+import logging
+import queue
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Generic, Hashable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from libs.data.forecast import ForecastData
+from libs.forecast_collector.base import Collector
+from libs.forecast_collector.cache import SourceNotModified
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+
+# 取得・解析が終わったことを次の段に伝える
+_DONE = object()
+
+
+class PipelineResult(Generic[K]):
+    def __init__(self) -> None:
+        self.saved: List[K] = []
+        self.errors: Dict[K, Exception] = {}
+        # 前回から変わっていなかったもの (キャッシュ済みの解析結果)
+        self.unchanged: Dict[K, Optional[ForecastData]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def _error(self, key: K, error: Exception):
+        logger.error(f"{key}: {error!r}")
+        with self._lock:
+            self.errors[key] = error
+
+    def _unchanged(self, key: K, forecast: Optional[ForecastData]):
+        with self._lock:
+            self.unchanged[key] = forecast
+
+
+class _Stop(Exception):
+    pass
+
+
+class ForecastPipeline:
+    # 取得 (download_workers 本のスレッド) → 解析 (1 本) → 保存 (呼び出し元のスレッド) をキューでつなぎ、並行して進める
+    # キューは queue_size 件で上限があり、保存が遅ければ取得も待つので、
+    # 件数によらず保持するのは「取得中 + キュー 2 本 + 保存中の 1 バッチ」分だけになる
+    # collectors は (キー, Collector) の iterable で、必要になった分だけ読み進める (generator を渡せる)
+    def __init__(self, saver) -> None:
+        self._saver = saver
+        self._download_workers = 4
+        self._queue_size = 8
+        self._batch_size = 30
+
+    def with_download_workers(self, download_workers: int):
+        if download_workers < 1:
+            raise ValueError("download_workers must be positive")
+        self._download_workers = download_workers
+        return self
+
+    def with_queue_size(self, queue_size: int):
+        if queue_size < 1:
+            raise ValueError("queue_size must be positive")
+        self._queue_size = queue_size
+        return self
+
+    def with_batch_size(self, batch_size: int):
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        self._batch_size = batch_size
+        return self
+
+    @staticmethod
+    def _put(q: queue.Queue, item, stop: threading.Event):
+        # 保存が失敗して止まった場合に、空かないキューで待ち続けないようにする
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Stop()
+
+    @staticmethod
+    def _get(q: queue.Queue, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise _Stop()
+
+    def _download(
+        self,
+        collectors: Iterator[Tuple[K, Collector]],
+        collectors_lock: threading.Lock,
+        downloaded: queue.Queue,
+        stop: threading.Event,
+        result: PipelineResult[K],
+        failures: List[Exception],
+    ):
+        try:
+            while True:
+                with collectors_lock:
+                    item = next(collectors, None)
+                if item is None:
+                    break
+                key, collector = item
+                try:
+                    raw_data = collector.download()
+                except SourceNotModified as e:
+                    result._unchanged(key, e.forecast)
+                    continue
+                except Exception as e:
+                    result._error(key, e)
+                    continue
+                self._put(downloaded, (key, collector, raw_data), stop)
+            # スレッドごとに終わりを伝え、解析の段は全スレッド分を受け取ったら終わる
+            self._put(downloaded, _DONE, stop)
+        except _Stop:
+            pass
+        except Exception as e:
+            # collectors 自体が失敗した場合は呼び出し元で送出する
+            failures.append(e)
+            stop.set()
+
+    def _transform(
+        self, downloaded: queue.Queue, transformed: queue.Queue, stop: threading.Event, result: PipelineResult[K]
+    ):
+        try:
+            running = self._download_workers
+            while running:
+                item = self._get(downloaded, stop)
+                if item is _DONE:
+                    running -= 1
+                    continue
+                key, collector, raw_data = item
+                try:
+                    forecast = collector.transform(raw_data)
+                except Exception as e:
+                    result._error(key, e)
+                    continue
+                self._put(transformed, (key, forecast), stop)
+            self._put(transformed, _DONE, stop)
+        except _Stop:
+            pass
+
+    def _forecasts(self, transformed: queue.Queue, stop: threading.Event, keys: Deque[K]) -> Iterator[ForecastData]:
+        while True:
+            item = self._get(transformed, stop)
+            if item is _DONE:
+                return
+            key, forecast = item
+            keys.append(key)
+            yield forecast
+
+    def stream(
+        self, collectors: Iterable[Tuple[K, Collector]], result: Optional[PipelineResult[K]] = None
+    ) -> Iterator[List[K]]:
+        # 保存できたバッチごとに、そのキーを返す (チェックポイントの記録などに使う)
+        result = result if result is not None else PipelineResult()
+        downloaded: queue.Queue = queue.Queue(maxsize=self._queue_size)
+        transformed: queue.Queue = queue.Queue(maxsize=self._queue_size)
+        stop = threading.Event()
+        iterator = iter(collectors)
+        collectors_lock = threading.Lock()
+        failures: List[Exception] = []
+        threads = [
+            threading.Thread(
+                target=self._download,
+                args=(iterator, collectors_lock, downloaded, stop, result, failures),
+                name=f"pipeline-download-{idx}",
+                daemon=True,
+            )
+            for idx in range(self._download_workers)
+        ]
+        threads.append(
+            threading.Thread(
+                target=self._transform,
+                args=(downloaded, transformed, stop, result),
+                name="pipeline-transform",
+                daemon=True,
+            )
+        )
+        for thread in threads:
+            thread.start()
+
+        keys: Deque[K] = deque()
+        try:
+            for batch in self._saver.run_stream(self._forecasts(transformed, stop, keys), batch_size=self._batch_size):
+                saved = [keys.popleft() for _ in batch]
+                result.saved.extend(saved)
+                yield saved
+        except _Stop:
+            # collectors が失敗して止まった (下で送出する)
+            pass
+        finally:
+            # 保存が失敗した場合や、呼び出し側が途中でやめた場合も、取得・解析のスレッドを止める
+            stop.set()
+            for thread in threads:
+                thread.join()
+        if failures:
+            raise failures[0]
+
+    def run(
+        self, collectors: Iterable[Tuple[K, Collector]], on_saved: Optional[Callable[[List[K]], None]] = None
+    ) -> PipelineResult[K]:
+        result: PipelineResult[K] = PipelineResult()
+        for saved in self.stream(collectors, result):
+            if on_saved is not None:
+                on_saved(saved)
+        return result
@@ -0,0 +1,39 @@
+import importlib
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+
+from libs.constants.area import Area
+
+
+class CollectorRegistry:
+    # エリアごとの収集関数を "モジュール:関数名" で登録しておき、そのエリアを収集するときに初めて import する
+    # (コールドスタート時に使わないエリアのモジュールを読み込まない)
+    def __init__(self, entries: Dict[Area, str]) -> None:
+        self._entries = dict(entries)
+        self._loaded: Dict[Area, Callable] = {}
+        self._lock = Lock()
+
+    def register(self, area: Area, target: str):
+        with self._lock:
+            self._entries[area] = target
+            self._loaded.pop(area, None)
+        return self
+
+    def __contains__(self, area: Area) -> bool:
+        return area in self._entries
+
+    def areas(self) -> List[Area]:
+        return [area for area in Area if area in self._entries]
+
+    def get(self, area: Area) -> Optional[Callable]:
+        target = self._entries.get(area)
+        if target is None:
+            return None
+        loaded = self._loaded.get(area)
+        if loaded is not None:
+            return loaded
+        module_name, _, attr = target.partition(":")
+        with self._lock:
+            loaded = getattr(importlib.import_module(module_name), attr)
+            self._loaded[area] = loaded
+        return loaded
@@ -0,0 +1,122 @@
+import json
+import os
+import statistics
+import tempfile
+from datetime import datetime, time, timedelta, timezone
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+
+from libs.constants.area import Area
+from libs.instrumentation import get_recorder
+
+# 取得元の UPDATE 行は日本時間
+SOURCE_TIMEZONE = timezone(timedelta(hours=9))
+
+
+class ScheduleDecision:
+    def __init__(self, collect: bool, reason: str, next_due: Optional[datetime] = None) -> None:
+        self.collect = collect
+        self.reason = reason
+        # collect が False の場合、次に取得すべき日時
+        self.next_due = next_due
+
+    def __repr__(self) -> str:
+        return f"ScheduleDecision(collect={self.collect}, reason={self.reason!r}, next_due={self.next_due})"
+
+
+class UpdateSchedule:
+    # エリアごとに取得元の更新日時 (UPDATE 行) の履歴を記録し、更新間隔の中央値から次の更新を予測する
+    # 次の更新より前の呼び出しは、取得しても変わっていないのでスキップする
+    # 状態は JSON ファイルに保存する (失われた場合は必ず取得する)
+    HISTORY = 24
+    # 翌日の見通しが出る時刻
+    TOMORROW_FORECAST_TIME = time(18, 0)
+
+    def __init__(
+        self,
+        path: Optional[str],
+        early_margin: timedelta = timedelta(minutes=2),
+        max_interval: timedelta = timedelta(hours=2),
+        default_cadence: timedelta = timedelta(hours=1),
+    ) -> None:
+        self._path = Path(path) if path else None
+        self._early_margin = early_margin
+        self._max_interval = max_interval
+        self._default_cadence = default_cadence
+        self._state: Dict[str, dict] = {}
+        self._lock = Lock()
+        if self._path is not None and self._path.exists():
+            try:
+                self._state = json.loads(self._path.read_text())
+            except ValueError:
+                self._state = {}
+
+    @staticmethod
+    def now() -> datetime:
+        # UPDATE 行と比較できるよう、日本時間の naive な datetime を返す
+        return datetime.now(SOURCE_TIMEZONE).replace(tzinfo=None)
+
+    def updates(self, area: Area) -> List[datetime]:
+        return [datetime.fromisoformat(u) for u in self._state.get(area.value, {}).get("updates", [])]
+
+    def cadence(self, area: Area) -> Optional[timedelta]:
+        updates = self.updates(area)
+        if len(updates) < 2:
+            return None
+        return statistics.median(b - a for a, b in zip(updates, updates[1:]))
+
+    def next_update(self, area: Area) -> Optional[datetime]:
+        updates = self.updates(area)
+        if not updates:
+            return None
+        last = updates[-1]
+        predicted = last + (self.cadence(area) or self._default_cadence)
+        # 翌日の見通しが出る時刻をまたぐ場合はその時刻に取得する
+        tomorrow_forecast_at = datetime.combine(last.date(), self.TOMORROW_FORECAST_TIME)
+        if last < tomorrow_forecast_at < predicted:
+            return tomorrow_forecast_at
+        return predicted
+
+    def decide(self, area: Area, now: datetime) -> ScheduleDecision:
+        decision = self._decide(area, now)
+        get_recorder().record(
+            "schedule", area=area, properties={"reason": decision.reason}, collect=int(decision.collect)
+        )
+        return decision
+
+    def _decide(self, area: Area, now: datetime) -> ScheduleDecision:
+        state = self._state.get(area.value)
+        if not state or not state.get("updates"):
+            return ScheduleDecision(True, "no history")
+        checked_at = datetime.fromisoformat(state["checked_at"])
+        if now - checked_at >= self._max_interval:
+            # 予測が外れていても max_interval ごとには取得する
+            return ScheduleDecision(True, "stale")
+        next_due = self.next_update(area)
+        if now >= next_due - self._early_margin:
+            return ScheduleDecision(True, "update due")
+        return ScheduleDecision(False, "not updated yet", next_due=next_due)
+
+    def record(self, area: Area, updated_at: Optional[datetime], checked_at: datetime):
+        # 取得できた場合に呼ぶ (変わっていなかった場合は updated_at を省略してよい)
+        with self._lock:
+            state = self._state.setdefault(area.value, {"updates": []})
+            state["checked_at"] = checked_at.isoformat()
+            if updated_at is None:
+                return
+            updates = state["updates"]
+            if updates and datetime.fromisoformat(updates[-1]) >= updated_at:
+                return
+            updates.append(updated_at.isoformat())
+            del updates[: -self.HISTORY]
+
+    def save(self):
+        if self._path is None:
+            return
+        with self._lock:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self._path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._state, f)
+            os.replace(tmp_path, self._path)
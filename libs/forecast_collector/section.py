@@ -0,0 +1,122 @@
+import csv
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+UPDATE_MARKER = "UPDATE"
+
+
+class Section:
+    # 1 ブロック分の CSV (先頭行がヘッダー)
+    def __init__(self, lines: List[str]) -> None:
+        reader = csv.reader(lines, delimiter=",")
+        self.fieldnames: List[str] = next(reader, [])
+        self.rows: List[List[str]] = list(reader)
+        self._columns = {name: idx for idx, name in enumerate(self.fieldnames)}
+
+    def column(self, name: str) -> int:
+        return self._columns[name]
+
+    def columns(self, *names: str) -> Tuple[int, ...]:
+        return tuple(self._columns[name] for name in names)
+
+    def values(self, name: str) -> List[str]:
+        idx = self._columns[name]
+        return [row[idx] for row in self.rows]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class SectionIndex:
+    # 空行区切りのブロックを先頭から一度だけ走査し、ヘッダー行 -> (開始位置, 終了位置) の表を作る
+    # 走査は必要なヘッダーが見つかるところまでで止め、続きは次の参照時に再開する
+    # セクションは読み出すときに該当範囲だけを切り出す
+
+    def __init__(self, raw_data: str, newline: Optional[str] = None) -> None:
+        self._raw_data = raw_data
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        # 完全一致しなかったヘッダー -> 前方一致したブロック
+        self._prefixes: Dict[str, Optional[Tuple[int, int]]] = {}
+        if newline is None:
+            # 改行コードは "\n" / "\r\n" のどちらでもよい
+            first_newline = raw_data.find("\n")
+            newline = "\r\n" if first_newline > 0 and raw_data[first_newline - 1] == "\r" else "\n"
+        self._newline = newline
+        self._position: Optional[int] = 0
+
+    def _scan_next(self) -> None:
+        raw_data = self._raw_data
+        start = self._position
+        separator = self._newline * 2
+        end = raw_data.find(separator, start)
+        if end == -1:
+            self._add(start, len(raw_data))
+            self._position = None
+            return
+        self._add(start, end)
+        start = end + len(separator)
+        # 連続する空行を読み飛ばす
+        while raw_data.startswith(self._newline, start):
+            start += len(self._newline)
+        self._position = start
+
+    def _scan_all(self) -> None:
+        while self._position is not None:
+            self._scan_next()
+
+    def _add(self, start: int, end: int) -> None:
+        if start >= end:
+            return
+        header_end = self._raw_data.find("\n", start, end)
+        if header_end == -1:
+            header_end = end
+        header = self._raw_data[start:header_end].rstrip("\r")
+        if header.endswith(UPDATE_MARKER):
+            # 先頭の "2023/10/21 18:15 UPDATE" 行は直後のブロックと空行なしで続く場合がある
+            self._offsets.setdefault(UPDATE_MARKER, (start, header_end))
+            if header_end < end:
+                self._add(header_end + 1, end)
+            return
+        # 同じヘッダーが複数ある場合は str.find と同じく先頭のものを使う
+        self._offsets.setdefault(header, (start, end))
+
+    def headers(self) -> List[str]:
+        self._scan_all()
+        return list(self._offsets.keys())
+
+    def _lookup(self, header: str) -> Optional[Tuple[int, int]]:
+        while header not in self._offsets and self._position is not None:
+            self._scan_next()
+        offset = self._offsets.get(header)
+        if offset is not None:
+            return offset
+        # ここに来るのは全体を走査し終えた後なので、前方一致の結果 (見つからない場合も含む) を覚えておく
+        if header not in self._prefixes:
+            self._prefixes[header] = next(
+                (offset for key, offset in self._offsets.items() if key.startswith(header)), None
+            )
+        return self._prefixes[header]
+
+    def lines(self, header: str) -> List[str]:
+        # ヘッダー行を含むブロックの行を返す (見つからなければ空)
+        offset = self._lookup(header)
+        if offset is None:
+            return []
+        start, end = offset
+        return self._raw_data[start:end].splitlines()
+
+    def section(self, header: str) -> Section:
+        return Section(self.lines(header))
+
+    def updated_at(self) -> Optional[datetime]:
+        # 先頭の "2023/10/21 18:15 UPDATE" 行の日時 (取得元の更新日時)
+        lines = self.lines(UPDATE_MARKER)
+        if not lines or not lines[0].endswith(UPDATE_MARKER):
+            return None
+        try:
+            return datetime.strptime(lines[0][: -len(UPDATE_MARKER)].strip(), "%Y/%m/%d %H:%M")
+        except ValueError:
+            return None
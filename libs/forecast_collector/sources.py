@@ -0,0 +1,76 @@
+from datetime import date
+from typing import Optional
+
+import requests
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData
+from libs.forecast_collector.base import Collector, DataDownloader, DataTransformer
+from libs.forecast_collector.cache import SourceCache
+from libs.forecast_collector.spec import CompiledSpec, compile_spec
+
+
+class SpecDataDownloader(DataDownloader):
+    # SourceSpec の URL・文字コードで取得する
+    def __init__(self, compiled: CompiledSpec) -> None:
+        self.AREA = compiled.area
+        self.ENCODING = compiled.spec.encoding
+        self._spec = compiled.spec
+
+    def run(self) -> str:
+        return self._fetch(url=self._spec.url_for(self.target_date))
+
+
+class SpecDataTransformer(DataTransformer):
+    def __init__(self, compiled: CompiledSpec) -> None:
+        self._compiled = compiled
+
+    def run(self, raw_data: str) -> ForecastData:
+        return self._compiled.parse(raw_data, self.target_date)
+
+
+def source_collector(
+    area: Area,
+    session: Optional[requests.Session] = None,
+    cache: Optional[SourceCache] = None,
+    target_date: Optional[date] = None,
+) -> Collector:
+    # target_date を指定すると過去日のファイルを取得する (日付ごとにファイルが分かれている取得元のみ)
+    compiled = compile_spec(area)
+    if target_date is not None and not compiled.spec.dated:
+        raise ValueError(f"{compiled.area.name} does not publish files by date.")
+    return Collector(
+        download_strategy=SpecDataDownloader(compiled)
+        .with_session(session)
+        .with_cache(cache)
+        .with_target_date(target_date),
+        transformer_strategy=SpecDataTransformer(compiled).with_target_date(target_date),
+    )
+
+
+def collect_source(
+    area: Area,
+    session: Optional[requests.Session] = None,
+    cache: Optional[SourceCache] = None,
+    target_date: Optional[date] = None,
+) -> ForecastData:
+    return source_collector(area, session, cache, target_date).run()
+
+
+def _bind(area: Area, factory):
+    def bound(session: Optional[requests.Session] = None, cache: Optional[SourceCache] = None, target_date=None):
+        return factory(area, session, cache, target_date)
+
+    bound.__name__ = f"{factory.__name__}[{area.value}]"
+    return bound
+
+
+def __getattr__(name):
+    # CollectorRegistry の "モジュール:関数名" で参照できるよう、エリアごとの関数を名前から作る
+    # collect_<area>_forecast(session, cache, target_date) / <area>_collector(session, cache, target_date)
+    for area in Area:
+        if name == f"collect_{area.value}_forecast":
+            return _bind(area, collect_source)
+        if name == f"{area.value}_collector":
+            return _bind(area, source_collector)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
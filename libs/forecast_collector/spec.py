@@ -0,0 +1,210 @@
+import json
+import logging
+from array import array
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, field_validator
+
+from libs.constants.area import Area
+from libs.data.forecast import ActualResultSeries, ForecastData, ForecastFrame, TomorrowForecast
+from libs.forecast_collector.section import Section, SectionIndex
+from libs.instrumentation import get_recorder
+
+logger = logging.getLogger(__name__)
+
+# エリアごとの取得元の定義 (<area>.json)。"extends" で共通の定義 (_<name>.json) を引き継げる
+SPEC_DIR = Path(__file__).resolve().parent / "specs"
+
+TODAY_FIELDS = ("date", "time", "actual_result", "forecast_demand", "forecast_supply")
+ACTUAL_RESULT_FIELDS = ("date", "time", "value")
+TOMORROW_FIELDS = tuple(name for name in TomorrowForecast.model_fields if name != "date")
+
+
+class SectionSpec(BaseModel):
+    # 空行で区切られたブロックのひとつ
+    # ヘッダー行 (前方一致で探す)
+    header: str
+    # フィールド名 -> 列名
+    columns: Dict[str, str]
+    # 空欄の場合の値
+    defaults: Dict[str, int] = {}
+
+    def indices(self) -> Dict[str, int]:
+        # 前方一致で見つかるブロックは先頭の列がヘッダーと同じなので、列の位置はヘッダーから決まる
+        fieldnames = self.header.split(",")
+        missing = [column for column in self.columns.values() if column not in fieldnames]
+        if missing:
+            raise ValueError(f"columns {missing} are not in the header: {self.header}")
+        return {field: fieldnames.index(column) for field, column in self.columns.items()}
+
+
+class ActualResultSpec(SectionSpec):
+    # 一定間隔の当日実績
+    interval_minutes: int = 5
+
+
+class SourceSpec(BaseModel):
+    area: Area
+    # 定期実行で取得する。tests/csv/<area>.csv に記録した取得元のファイルで解析を確認してから有効にする
+    enabled: bool = False
+    # 取得元の URL。日付ごとのファイルは "{target_date:%Y%m%d}" のように対象日を埋め込む
+    url: str
+    # 取得元の文字コード (None の場合は判定する)
+    encoding: Optional[str] = None
+    # ブロックの区切り ("\n" / "\r\n")。None の場合は先頭の改行から判定する
+    newline: Optional[str] = None
+    today: SectionSpec
+    tomorrow: List[SectionSpec] = []
+    actual_results: Optional[ActualResultSpec] = None
+
+    @field_validator("newline")
+    @classmethod
+    def _validate_newline(cls, newline: Optional[str]) -> Optional[str]:
+        if newline not in (None, "\n", "\r\n"):
+            raise ValueError("newline must be \\n or \\r\\n")
+        return newline
+
+    @property
+    def dated(self) -> bool:
+        # 日付ごとにファイルが分かれている (過去データを取り込める)
+        return "{target_date" in self.url
+
+    def url_for(self, target_date: date) -> str:
+        return self.url.format(target_date=target_date)
+
+
+def _load(name: str) -> dict:
+    data = json.loads((SPEC_DIR / f"{name}.json").read_text(encoding="utf-8"))
+    base = data.pop("extends", None)
+    if base is None:
+        return data
+    # 継承元の定義をトップレベルのキーごとに上書きする
+    return {**_load(f"_{base}"), **data}
+
+
+def spec_areas() -> List[Area]:
+    # 定義のあるエリア (ファイル名だけを見るので、定義は読み込まない)
+    names = {path.stem for path in SPEC_DIR.glob("*.json")}
+    return [area for area in Area if area.value in names]
+
+
+def enabled_areas() -> List[Area]:
+    # 定期実行で取得するエリア (定義の検証は初回の取得時に行う)
+    return [area for area in spec_areas() if _load(area.value).get("enabled", False)]
+
+
+def load_spec(area: Area) -> SourceSpec:
+    return SourceSpec(**_load(Area(area).value), area=area)
+
+
+class CompiledSpec:
+    # SourceSpec から、ヘッダーと列の位置を解決済みの解析処理を作る
+    # 定義の誤り (ヘッダーにない列名・足りないフィールド) はここで検出する
+    def __init__(self, spec: SourceSpec) -> None:
+        self.spec = spec
+        self.area = spec.area
+        self._today = self._compile(spec.today, TODAY_FIELDS)
+        self._tomorrow = [(section.header, section.indices()) for section in spec.tomorrow]
+        if self._tomorrow:
+            missing = set(TOMORROW_FIELDS) - {field for _, indices in self._tomorrow for field in indices}
+            if missing:
+                raise ValueError(f"{spec.area.value}: tomorrow fields {sorted(missing)} are not mapped")
+        self._actual_results = (
+            self._compile(spec.actual_results, ACTUAL_RESULT_FIELDS) if spec.actual_results is not None else None
+        )
+        self._interval = timedelta(minutes=spec.actual_results.interval_minutes) if spec.actual_results else None
+
+    def _compile(self, section: SectionSpec, fields: Tuple[str, ...]) -> Tuple[str, Tuple[int, ...], Dict[str, int]]:
+        indices = section.indices()
+        missing = [field for field in fields if field not in indices]
+        if missing:
+            raise ValueError(f"{self.area.value}: fields {missing} are not mapped in {section.header}")
+        return section.header, tuple(indices[field] for field in fields), section.defaults
+
+    def sections(self, raw_data: str) -> SectionIndex:
+        return SectionIndex(raw_data, newline=self.spec.newline)
+
+    def today(self, sections: SectionIndex) -> ForecastFrame:
+        header, (date_idx, time_idx, actual_idx, demand_idx, supply_idx), defaults = self._today
+        section = sections.section(header)
+        if not section:
+            # 定義と取得元の形式が合っていない。空のデータとして保存・キャッシュしないよう失敗させる
+            raise ValueError(f"{self.area.value}: today section is not found: {header}")
+        rows = section.rows
+        return ForecastFrame.from_strings(
+            dates=[row[date_idx] for row in rows],
+            times=[row[time_idx] for row in rows],
+            actual_result=[row[actual_idx] for row in rows],
+            forecast_demand=[row[demand_idx] for row in rows],
+            forecast_supply=[row[supply_idx] for row in rows],
+            actual_result_default=defaults.get("actual_result"),
+        )
+
+    def tomorrow(self, sections: SectionIndex, target_date: date) -> Optional[TomorrowForecast]:
+        if not self._tomorrow:
+            return None
+        data = {}
+        for header, indices in self._tomorrow:
+            section: Section = sections.section(header)
+            if not section:
+                # 18時以降じゃないとデータが出てこない
+                return None
+            row = section.rows[0]
+            data.update((field, row[idx]) for field, idx in indices.items())
+        try:
+            return TomorrowForecast(date=target_date + timedelta(days=1), **data)
+        except ValueError:
+            return None
+
+    def actual_results(self, sections: SectionIndex) -> Optional[ActualResultSeries]:
+        if self._actual_results is None:
+            return None
+        header, (date_idx, time_idx, value_idx), _ = self._actual_results
+        section = sections.section(header)
+        if not section:
+            return None
+        rows = section.rows
+        # 当日実績は補助的なデータなので、解析できなくても当日・翌日の予測は保存する
+        try:
+            # 日時の解析は先頭と末尾だけ行い、間隔が一定であることを確認する
+            start = datetime.strptime(f"{rows[0][date_idx]} {rows[0][time_idx]}", "%Y/%m/%d %H:%M")
+            end = datetime.strptime(f"{rows[-1][date_idx]} {rows[-1][time_idx]}", "%Y/%m/%d %H:%M")
+            if start + self._interval * (len(rows) - 1) != end:
+                raise ValueError("actual results are not in a fixed interval")
+            missing = ActualResultSeries.MISSING
+            values = array("i", [int(row[value_idx]) if row[value_idx] else missing for row in rows])
+        except (ValueError, IndexError) as e:
+            logger.warning(f"{self.area.value}: actual results are skipped: {e}")
+            return None
+        return ActualResultSeries(start=start, interval=self._interval, values=values)
+
+    def parse(self, raw_data: str, target_date: date) -> ForecastData:
+        recorder = get_recorder()
+        sections = self.sections(raw_data)
+        with recorder.stage("transform.today") as metrics:
+            today_frame = self.today(sections)
+            metrics.set(rows=len(today_frame))
+        with recorder.stage("transform.tomorrow") as metrics:
+            tomorrow_forecast = self.tomorrow(sections, target_date)
+            metrics.set(rows=0 if tomorrow_forecast is None else 1)
+        actual_results = None
+        if self._actual_results is not None:
+            with recorder.stage("transform.actual_results") as metrics:
+                actual_results = self.actual_results(sections)
+                metrics.set(rows=0 if actual_results is None else len(actual_results))
+        return ForecastData(
+            area=self.area,
+            today_frame=today_frame,
+            tomorrow_forecast=tomorrow_forecast,
+            actual_results=actual_results,
+            updated_at=sections.updated_at(),
+        )
+
+
+@lru_cache(maxsize=None)
+def compile_spec(area: Area) -> CompiledSpec:
+    # プロセスごとに一度だけ読み込み・検証する
+    return CompiledSpec(load_spec(area))
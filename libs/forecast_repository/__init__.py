@@ -0,0 +1,3 @@
+from .cache import TTLCache  # noqa: F401
+from .repository import ForecastRepository, InvalidatingSaver  # noqa: F401
+from .source import AthenaForecastSource, ForecastSource, SqliteForecastSource  # noqa: F401
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from libs.constants.area import Area
+
+_MISSING = object()
+
+
+class TTLCache:
+    # 件数の上限を超えたら最も古く参照されたものから捨てる (LRU)。ttl 秒を過ぎたものは使わない
+    # キーは (area, ...) のタプルとし、エリア単位で無効化できるようにする
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # invalidate() のたびに増やす (全体 / エリアごと)。読み込み中に無効化された値を put しないために使う
+        self._generation = 0
+        self._area_generations: Dict[Optional[Area], int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple[Optional[Area], Hashable], default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def generation(self, area: Optional[Area]) -> Tuple[int, int]:
+        # 読み込む前に取得し、put に渡す
+        with self._lock:
+            return self._generation, self._area_generations.get(area, 0)
+
+    def put(self, key: Tuple[Optional[Area], Hashable], value, generation: Optional[Tuple[int, int]] = None):
+        # generation を指定した場合、それ以降にそのエリアが無効化されていれば保持しない (古い値の可能性がある)
+        with self._lock:
+            if generation is not None and generation != (self._generation, self._area_generations.get(key[0], 0)):
+                return
+            self._entries[key] = (self._clock() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, area: Optional[Area] = None):
+        # area を省略した場合はすべて捨てる
+        # エリアを指定しないクエリ (key[0] が None) の結果は、どのエリアが更新されても捨てる
+        with self._lock:
+            if area is None:
+                self._generation += 1
+                self._entries.clear()
+                return
+            self._area_generations[area] = self._area_generations.get(area, 0) + 1
+            self._area_generations[None] = self._area_generations.get(None, 0) + 1
+            for key in [k for k in self._entries if k[0] is None or k[0] == area]:
+                del self._entries[key]
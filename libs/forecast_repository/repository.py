@@ -0,0 +1,128 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Hashable, Iterable, List, Optional
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData, ForecastFrame
+from libs.data.rollup import DailyRollup
+from libs.forecast_repository.cache import TTLCache
+from libs.forecast_repository.source import ForecastSource
+from libs.forecast_saver.saver import Saver
+from libs.forecast_saver.snapshot import ForecastChanges
+from libs.instrumentation import get_recorder
+
+
+class ForecastRepository:
+    # 保存済みの予測を ForecastData として返す
+    # 結果はプロセス内の LRU/TTL キャッシュに保持し、saver が書き込んだエリアの分は捨てる
+    # キャッシュした ForecastData は呼び出し側で共有されるので変更しないこと
+    def __init__(self, source: ForecastSource, cache: Optional[TTLCache] = None) -> None:
+        self._source = source
+        self._cache = cache if cache is not None else TTLCache()
+        self._version: Optional[Hashable] = None
+        self._version_lock = threading.Lock()
+
+    def with_cache(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        return self
+
+    def invalidate(self, area: Optional[Area] = None):
+        self._cache.invalidate(area)
+
+    def _check_version(self):
+        # 別のプロセスなどから書き込まれたことを取得元が検知できる場合はキャッシュを捨てる
+        version = self._source.version()
+        if version is None:
+            return
+        with self._version_lock:
+            if version != self._version:
+                self._cache.invalidate()
+                self._version = version
+
+    def _cached(self, key: tuple, load: Callable[[], object]):
+        self._check_version()
+        value = self._cache.get(key, default=key)
+        if value is not key:
+            return value
+        # 読み込み中に保存されて無効化された場合は、古いかもしれないのでキャッシュしない
+        generation = self._cache.generation(key[0])
+        with get_recorder().stage("repository.load", area=key[0]):
+            value = load()
+        self._cache.put(key, value, generation=generation)
+        return value
+
+    def _forecast_data(self, area: Area, frame: ForecastFrame) -> ForecastData:
+        # 翌日の見通しは最後の行の翌日のもの
+        tomorrow_forecast = None
+        if frame:
+            tomorrow_forecast = self._source.tomorrow_forecast(area, frame.dt[-1].date() + timedelta(days=1))
+        return ForecastData.model_construct(
+            area=area, today_frame=frame, tomorrow_forecast=tomorrow_forecast, actual_results=None, updated_at=None
+        )
+
+    def range(self, area: Area, start: datetime, end: datetime) -> ForecastData:
+        # start <= datetime < end
+        return self._cached(
+            (area, "range", start, end),
+            lambda: self._forecast_data(area, self._source.today_frame(area, start, end)),
+        )
+
+    def day(self, area: Area, target_date: date) -> ForecastData:
+        start = datetime.combine(target_date, datetime.min.time())
+        return self.range(area, start, start + timedelta(days=1))
+
+    def latest(self, area: Area, n: int = 24) -> ForecastData:
+        # 最新の n 行
+        return self._cached(
+            (area, "latest", n),
+            lambda: self._forecast_data(area, self._source.latest_frame(area, n)),
+        )
+
+    def peak_usage_day(self, area: Area, start: date, end: date) -> Optional[ForecastData]:
+        # start <= date < end のうち、使用率の最大値が最も高い日のデータ
+        peak_date = self._cached(
+            (area, "peak_usage_date", start, end),
+            lambda: self._source.peak_usage_date(area, start, end),
+        )
+        if peak_date is None:
+            return None
+        return self.day(area, peak_date)
+
+    def daily_rollups(self, area: Area, start: date, end: date) -> List[DailyRollup]:
+        # start <= date < end の日ごとの集計値
+        return self._cached(
+            (area, "daily_rollups", start, end),
+            lambda: self._source.daily_rollups(area, start, end),
+        )
+
+    def watch(self, saver: Saver) -> "InvalidatingSaver":
+        return InvalidatingSaver(saver, self)
+
+
+class InvalidatingSaver(Saver):
+    # 書き込んだエリアのキャッシュを捨てる (失敗した場合も一部が書き込まれている可能性があるので捨てる)
+    def __init__(self, saver: Saver, repository: ForecastRepository) -> None:
+        super().__init__()
+        self._saver = saver
+        self._repository = repository
+
+    def _invalidate(self, areas: Iterable[Area]):
+        for area in set(areas):
+            self._repository.invalidate(area)
+
+    def run_batch(self, forecasts: Iterable[ForecastData]):
+        forecasts = list(forecasts)
+        try:
+            return self._saver.run_batch(forecasts=forecasts)
+        finally:
+            self._invalidate(f.area for f in forecasts)
+
+    def run_changes(self, changes: Iterable[ForecastChanges]):
+        changes = list(changes)
+        try:
+            return self._saver.run_changes(changes=changes)
+        finally:
+            self._invalidate(c.area for c in changes)
+
+    def run(self, structured_data: ForecastData):
+        return self.run_batch(forecasts=[structured_data])
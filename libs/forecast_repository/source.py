@@ -0,0 +1,161 @@
+from abc import ABC, abstractmethod
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Hashable, List, Optional
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastFrame, TomorrowForecast
+from libs.data.rollup import DailyRollup
+from libs.forecast_saver.athena import AthenaQueryError, AthenaQueryPipeline
+from libs.forecast_saver.clients import aws_client
+from libs.forecast_saver.saver import SqliteSaver
+
+TOMORROW_COLUMNS = SqliteSaver.TOMORROW_COLUMNS
+
+
+class ForecastSource(ABC):
+    # 保存済みの today_forecast / tomorrow_forecast を読み出す
+    @abstractmethod
+    def today_frame(self, area: Area, start: datetime, end: datetime) -> ForecastFrame:
+        pass
+
+    @abstractmethod
+    def latest_frame(self, area: Area, n: int) -> ForecastFrame:
+        pass
+
+    @abstractmethod
+    def tomorrow_forecast(self, area: Area, target_date: date) -> Optional[TomorrowForecast]:
+        pass
+
+    @abstractmethod
+    def peak_usage_date(self, area: Area, start: date, end: date) -> Optional[date]:
+        pass
+
+    @abstractmethod
+    def daily_rollups(self, area: Area, start: date, end: date) -> List[DailyRollup]:
+        pass
+
+    def version(self) -> Optional[Hashable]:
+        # 書き込まれるたびに変わる値を返せる場合、キャッシュはこの値が変わったときに捨てられる
+        return None
+
+
+class SqliteForecastSource(ForecastSource):
+    def __init__(self, saver: SqliteSaver) -> None:
+        self._saver = saver
+
+    def today_frame(self, area: Area, start: datetime, end: datetime) -> ForecastFrame:
+        return self._saver.today_frame(area, start, end)
+
+    def latest_frame(self, area: Area, n: int) -> ForecastFrame:
+        return self._saver.latest_frame(area, n)
+
+    def tomorrow_forecast(self, area: Area, target_date: date) -> Optional[TomorrowForecast]:
+        forecasts = self._saver.tomorrow_forecasts(area, target_date, target_date + timedelta(days=1))
+        return forecasts[0] if forecasts else None
+
+    def peak_usage_date(self, area: Area, start: date, end: date) -> Optional[date]:
+        return self._saver.peak_usage_date(area, start, end)
+
+    def daily_rollups(self, area: Area, start: date, end: date) -> List[DailyRollup]:
+        return self._saver.daily_rollups(area, start, end)
+
+    def version(self) -> Optional[Hashable]:
+        return self._saver.data_version()
+
+
+class AthenaForecastSource(ForecastSource):
+    # AthenaSaver が書き込んだテーブルを SELECT で読み出す
+    def __init__(self, client=None) -> None:
+        self.client = client if client is not None else aws_client("athena")
+        self._database = "default"
+        self._workgroup = "primary"
+        self._poll_interval = (0.2, 5.0)
+
+    def with_database(self, database: str):
+        self._database = database
+        return self
+
+    def with_workgroup(self, workgroup: str):
+        self._workgroup = workgroup
+        return self
+
+    def with_poll_interval(self, initial_interval: float, max_interval: float):
+        self._poll_interval = (initial_interval, max_interval)
+        return self
+
+    def _select(self, query: str) -> List[List[Optional[str]]]:
+        initial_interval, max_interval = self._poll_interval
+        pipeline = AthenaQueryPipeline(
+            client=self.client,
+            workgroup=self._workgroup,
+            initial_interval=initial_interval,
+            max_interval=max_interval,
+        )
+        handle = pipeline.submit(query=query)
+        pipeline.wait()
+        if not handle.succeeded:
+            raise AthenaQueryError([handle])
+        rows = []
+        paginator = self.client.get_paginator("get_query_results")
+        for page in paginator.paginate(QueryExecutionId=handle.execution_id):
+            rows.extend([column.get("VarCharValue") for column in row["Data"]] for row in page["ResultSet"]["Rows"])
+        # 先頭行は列名
+        return rows[1:]
+
+    @staticmethod
+    def _frame(rows: List[List[Optional[str]]]) -> ForecastFrame:
+        return ForecastFrame.model_construct(
+            dt=[datetime.fromisoformat(row[0]) for row in rows],
+            actual_result=array("i", [int(row[1]) for row in rows]),
+            forecast_demand=array("i", [int(row[2]) for row in rows]),
+            forecast_supply=array("i", [int(row[3]) for row in rows]),
+        )
+
+    def today_frame(self, area: Area, start: datetime, end: datetime) -> ForecastFrame:
+        return self._frame(
+            self._select(
+                "SELECT datetime, actual_result, forecast_demand, forecast_supply"
+                f" FROM {self._database}.today_forecast WHERE area = '{area.value}'"
+                f" AND datetime >= TIMESTAMP '{start:%Y-%m-%d %H:%M:%S}'"
+                f" AND datetime < TIMESTAMP '{end:%Y-%m-%d %H:%M:%S}'"
+                " ORDER BY datetime"
+            )
+        )
+
+    def latest_frame(self, area: Area, n: int) -> ForecastFrame:
+        rows = self._select(
+            "SELECT datetime, actual_result, forecast_demand, forecast_supply"
+            f" FROM {self._database}.today_forecast WHERE area = '{area.value}'"
+            f" ORDER BY datetime DESC LIMIT {int(n)}"
+        )
+        return self._frame(rows[::-1])
+
+    def tomorrow_forecast(self, area: Area, target_date: date) -> Optional[TomorrowForecast]:
+        rows = self._select(
+            f"SELECT {', '.join(TOMORROW_COLUMNS)} FROM {self._database}.tomorrow_forecast"
+            f" WHERE area = '{area.value}' AND date = DATE '{target_date.isoformat()}' LIMIT 1"
+        )
+        if not rows:
+            return None
+        return TomorrowForecast(date=target_date, **dict(zip(TOMORROW_COLUMNS, rows[0])))
+
+    def peak_usage_date(self, area: Area, start: date, end: date) -> Optional[date]:
+        rows = self._select(
+            "SELECT date(datetime) AS day, max(CAST(forecast_demand AS double) / forecast_supply) AS usage"
+            f" FROM {self._database}.today_forecast WHERE area = '{area.value}'"
+            f" AND datetime >= TIMESTAMP '{start.isoformat()} 00:00:00'"
+            f" AND datetime < TIMESTAMP '{end.isoformat()} 00:00:00'"
+            " AND forecast_supply > 0"
+            " GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT 1"
+        )
+        return date.fromisoformat(rows[0][0]) if rows else None
+
+    def daily_rollups(self, area: Area, start: date, end: date) -> List[DailyRollup]:
+        rows = self._select(
+            f"SELECT date, {', '.join(DailyRollup.COLUMNS)} FROM {self._database}.daily_rollup"
+            f" WHERE area = '{area.value}'"
+            f" AND date >= DATE '{start.isoformat()}' AND date < DATE '{end.isoformat()}'"
+            " ORDER BY date"
+        )
+        return [DailyRollup(area=area, date=row[0], **dict(zip(DailyRollup.COLUMNS, row[1:]))) for row in rows]
@@ -1 +1,7 @@
-from .saver import AthenaSaver, CsvSaver  # noqa: F401
+from .athena import AthenaQueryError  # noqa: F401
+from .clients import aws_client, clear_clients  # noqa: F401
+from .fanout import FanOutResult, FanOutSaver  # noqa: F401
+from .saver import AthenaSaver, CsvSaver, IncrementalSaver, ParquetSaver, SqliteSaver  # noqa: F401
+from .snapshot import ForecastChanges, SnapshotStore  # noqa: F401
+from .spool import ForecastSpool, SinkState  # noqa: F401
+from .store import LocalObjectStore, S3ObjectStore  # noqa: F401
@@ -0,0 +1,144 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from libs.instrumentation import get_recorder
+
+logger = logging.getLogger(__name__)
+
+SUCCEEDED = "SUCCEEDED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+# 依存するクエリが失敗したため実行しなかった
+SKIPPED = "SKIPPED"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED, SKIPPED)
+
+
+class AthenaQueryError(Exception):
+    def __init__(self, handles: List["QueryHandle"]) -> None:
+        super().__init__(f"{len(handles)} queries did not succeed")
+        self.handles = handles
+
+
+class QueryHandle:
+    def __init__(self, query: str, after: Sequence["QueryHandle"]) -> None:
+        self.query = query
+        self.after = list(after)
+        self.execution_id: Optional[str] = None
+        self.state: Optional[str] = None
+        self.reason: Optional[str] = None
+
+    @property
+    def submitted(self) -> bool:
+        return self.execution_id is not None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def succeeded(self) -> bool:
+        return self.state == SUCCEEDED
+
+
+class AthenaQueryPipeline:
+    # 依存関係のないクエリはすぐに投入し、実行中のクエリは batch_get_query_execution でまとめて監視する
+    # 待ち合わせは after で指定した依存クエリ (同じエリア・テーブルの DELETE -> INSERT など) のみ
+    BATCH_SIZE = 50  # batch_get_query_execution の上限
+
+    def __init__(
+        self,
+        client,
+        workgroup: str = "primary",
+        initial_interval: float = 0.2,
+        max_interval: float = 5.0,
+        backoff: float = 1.5,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._client = client
+        self._workgroup = workgroup
+        self._initial_interval = initial_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._sleep = sleep
+        self._handles: List[QueryHandle] = []
+
+    def submit(self, query: str, after: Sequence[QueryHandle] = ()) -> QueryHandle:
+        handle = QueryHandle(query=query, after=after)
+        self._handles.append(handle)
+        self._start_ready()
+        return handle
+
+    def _start(self, handle: QueryHandle) -> None:
+        logger.info(handle.query)
+        handle.execution_id = self._client.start_query_execution(
+            QueryString=handle.query,
+            WorkGroup=self._workgroup,
+        )["QueryExecutionId"]
+        handle.state = "QUEUED"
+
+    def _start_ready(self) -> bool:
+        started = False
+        for handle in self._handles:
+            if handle.submitted or handle.finished:
+                continue
+            if any(dep.finished and not dep.succeeded for dep in handle.after):
+                handle.state = SKIPPED
+                handle.reason = "dependency did not succeed"
+                started = True
+                continue
+            if all(dep.succeeded for dep in handle.after):
+                self._start(handle)
+                started = True
+        return started
+
+    def _poll(self, running: List[QueryHandle]) -> bool:
+        progressed = False
+        by_id: Dict[str, QueryHandle] = {h.execution_id: h for h in running}
+        ids = list(by_id.keys())
+        for idx in range(0, len(ids), self.BATCH_SIZE):
+            response = self._client.batch_get_query_execution(QueryExecutionIds=ids[idx : idx + self.BATCH_SIZE])
+            for execution in response.get("QueryExecutions", []):
+                handle = by_id[execution["QueryExecutionId"]]
+                status = execution["Status"]
+                if status["State"] != handle.state:
+                    handle.state = status["State"]
+                    handle.reason = status.get("StateChangeReason")
+                    if handle.finished:
+                        progressed = True
+                        self._record(handle, execution.get("Statistics", {}))
+            for unprocessed in response.get("UnprocessedQueryExecutionIds", []):
+                logger.warning(f"{unprocessed['QueryExecutionId']}: {unprocessed.get('ErrorMessage')}")
+        return progressed
+
+    def _record(self, handle: QueryHandle, statistics: dict):
+        # キュー待ち時間と実行時間
+        get_recorder().record(
+            "athena.query",
+            properties={"state": handle.state, "statement": handle.query.split(None, 1)[0].upper()},
+            queue_ms=statistics.get("QueryQueueTimeInMillis"),
+            execution_ms=statistics.get("EngineExecutionTimeInMillis"),
+            total_ms=statistics.get("TotalExecutionTimeInMillis"),
+            scanned_bytes=statistics.get("DataScannedInBytes"),
+        )
+
+    def wait(self) -> List[QueryHandle]:
+        interval = self._initial_interval
+        while True:
+            running = [h for h in self._handles if h.submitted and not h.finished]
+            if not running:
+                if not self._start_ready():
+                    break
+                continue
+            self._sleep(interval)
+            progressed = self._poll(running)
+            if self._start_ready() or progressed:
+                interval = self._initial_interval
+            else:
+                interval = min(interval * self._backoff, self._max_interval)
+
+        for handle in self._handles:
+            if not handle.succeeded:
+                logger.error(f"{handle.state}: {handle.reason}\n{handle.query}")
+        handles, self._handles = self._handles, []
+        return handles
@@ -0,0 +1,26 @@
+from threading import Lock
+from typing import Dict
+
+_clients: Dict[str, object] = {}
+_lock = Lock()
+
+
+def aws_client(service: str):
+    # boto3 の Session / client の生成は重いので、モジュールスコープで保持してウォームスタート間で再利用する
+    # boto3 自体も初めて使うときに import する
+    client = _clients.get(service)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(service)
+        if client is None:
+            import boto3
+
+            client = boto3.session.Session().client(service)
+            _clients[service] = client
+    return client
+
+
+def clear_clients():
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,167 @@
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from libs.data.forecast import ForecastData
+from libs.forecast_saver.saver import Saver
+from libs.forecast_saver.spool import ForecastSpool, SinkState
+from libs.instrumentation import get_recorder
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutResult:
+    def __init__(self) -> None:
+        # 保存先ごとの今回配送できたエントリ数
+        self.delivered: Dict[str, int] = {}
+        # 失敗した保存先 (エントリは spool に残り、次回以降に再送する)
+        self.errors: Dict[str, Exception] = {}
+        # リトライの待機中、または timeout までに終わらなかった保存先
+        self.deferred: List[str] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and not self.deferred
+
+
+class FanOutSaver(Saver):
+    # ForecastData をまず spool に記録し、その後で複数の保存先 (sink) に並行して書き込む
+    # 保存先ごとに未配送のエントリとリトライの状態を持つので、遅い・失敗している保存先が他を待たせない
+    # 失敗したエントリは次の実行で古い順に再送する (saver は同じデータの再書き込みで壊れない前提)
+    def __init__(self, sinks: Dict[str, Saver], spool: ForecastSpool) -> None:
+        super().__init__()
+        if not sinks:
+            raise ValueError("sinks must not be empty")
+        self._sinks = sinks
+        self._spool = spool
+        self._backoff = (timedelta(minutes=1), timedelta(hours=1))
+        self._timeout: Optional[float] = None
+        self._clock: Callable[[], datetime] = datetime.now
+        # timeout で待つのをやめた配送が終わるまで、同じ保存先への配送を始めない
+        self._running = {name: threading.Lock() for name in sinks}
+
+    def with_backoff(self, initial: timedelta, maximum: timedelta):
+        self._backoff = (initial, maximum)
+        return self
+
+    def with_timeout(self, timeout: Optional[float]):
+        # 指定した秒数で待つのをやめる (終わらなかった保存先は次回に再送する)
+        self._timeout = timeout
+        return self
+
+    def with_clock(self, clock: Callable[[], datetime]):
+        self._clock = clock
+        return self
+
+    def _next_attempt_at(self, attempts: int, now: datetime) -> datetime:
+        initial, maximum = self._backoff
+        delay = min(maximum, initial * 2 ** (attempts - 1))
+        # 同時に失敗した保存先が同じ時刻に再試行しないよう、待ち時間を半分から全体の間でずらす
+        return now + delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _latest(pending: List[Tuple[int, str, Optional[str]]]) -> Tuple[List[Tuple[int, str]], List[int]]:
+        # エントリはエリア・日ごとの全行を含むので、同じエリア・日は最新のエントリだけを配送すればよい
+        # (配送するエントリ, 置き換えられたエントリ) を返す
+        latest: Dict[Tuple[str, object], Tuple[int, str]] = {}
+        for entry_id, area, day in pending:
+            # day のないエントリ (当日の行がない) は置き換えない
+            latest[(area, day if day is not None else entry_id)] = (entry_id, area)
+        deliver = sorted(latest.values())
+        kept = {entry_id for entry_id, _ in deliver}
+        return deliver, [entry_id for entry_id, _, _ in pending if entry_id not in kept]
+
+    @staticmethod
+    def _rounds(pending: List[Tuple[int, str]]) -> Iterator[List[int]]:
+        # 同じエリアのエントリが 1 回の run_batch に複数入らないよう、古い順に分ける
+        rounds: List[Tuple[set, List[int]]] = []
+        for entry_id, area in pending:
+            for areas, entry_ids in rounds:
+                if area not in areas:
+                    break
+            else:
+                areas, entry_ids = set(), []
+                rounds.append((areas, entry_ids))
+            areas.add(area)
+            entry_ids.append(entry_id)
+        # 同じエリアは前の round の方が古いので、round の順に書き込めば順序が保たれる
+        for _, entry_ids in rounds:
+            yield entry_ids
+
+    def _deliver(self, name: str, sink: Saver, now: datetime) -> Optional[int]:
+        # 配送したエントリ数を返す (リトライの待機中・前回の配送が終わっていない場合は None)
+        running = self._running[name]
+        if not running.acquire(blocking=False):
+            return None
+        try:
+            return self._deliver_pending(name, sink, now)
+        finally:
+            running.release()
+
+    def _deliver_pending(self, name: str, sink: Saver, now: datetime) -> Optional[int]:
+        state = self._spool.sink_state(name)
+        if state.next_attempt_at is not None and now < state.next_attempt_at:
+            return None
+        delivered = 0
+        with get_recorder().stage("save.fanout") as metrics:
+            metrics.tag(sink=name)
+            pending, superseded = self._latest(self._spool.pending(name))
+            if superseded:
+                # 最新のエントリは未配送のまま残るので、先に配送済みにしてもデータは失われない
+                self._spool.delivered(name, superseded)
+                metrics.set(superseded=len(superseded))
+            try:
+                for entry_ids in self._rounds(pending):
+                    sink.run_batch(forecasts=self._spool.load(entry_ids))
+                    self._spool.delivered(name, entry_ids)
+                    delivered += len(entry_ids)
+            except Exception as e:
+                attempts = state.attempts + 1
+                self._spool.set_sink_state(
+                    name, SinkState(attempts, self._next_attempt_at(attempts, now), repr(e)[:1000])
+                )
+                raise
+            finally:
+                metrics.set(rows=delivered)
+        if state.attempts:
+            self._spool.set_sink_state(name, SinkState())
+        return delivered
+
+    def replay(self) -> FanOutResult:
+        # spool に残っているエントリを保存先ごとに配送する
+        result = FanOutResult()
+        now = self._clock()
+        self._spool.purge(now, self._sinks)
+        executor = ThreadPoolExecutor(max_workers=len(self._sinks), thread_name_prefix="fanout")
+        try:
+            futures = {executor.submit(self._deliver, name, sink, now): name for name, sink in self._sinks.items()}
+            wait(futures, timeout=self._timeout)
+            for future, name in futures.items():
+                if not future.done():
+                    logger.warning(f"{name}: still running after {self._timeout}s; pending entries are kept.")
+                    result.deferred.append(name)
+                elif future.exception() is not None:
+                    logger.error(f"{name}: {future.exception()!r}")
+                    result.errors[name] = future.exception()
+                elif future.result() is None:
+                    result.deferred.append(name)
+                else:
+                    result.delivered[name] = future.result()
+        finally:
+            # timeout を過ぎた保存先は待たない
+            executor.shutdown(wait=False)
+        return result
+
+    def run_batch(self, forecasts: Iterable[ForecastData]) -> FanOutResult:
+        forecasts = list(forecasts)
+        if forecasts:
+            with get_recorder().stage("save.spool") as metrics:
+                self._spool.append(forecasts, self._sinks, self._clock())
+                metrics.set(rows=len(forecasts))
+        return self.replay()
+
+    def run(self, structured_data: ForecastData) -> FanOutResult:
+        return self.run_batch(forecasts=[structured_data])
@@ -1,13 +1,40 @@
 import csv
-import time
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import math
+import pickle
+import sqlite3
+import threading
 from abc import ABC, abstractmethod
-from datetime import timedelta
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from pathlib import Path
-
-import boto3
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 from libs.constants.area import Area
-from libs.data.forecast import ForecastData, TodayForecast, TomorrowForecast
+from libs.data.forecast import ActualResultSeries, ForecastData, ForecastFrame, TomorrowForecast
+from libs.data.rollup import DailyRollup
+from libs.forecast_saver.athena import AthenaQueryError, AthenaQueryPipeline, QueryHandle
+from libs.forecast_saver.clients import aws_client
+from libs.forecast_saver.snapshot import ForecastChanges, SnapshotStore
+from libs.forecast_saver.store import LocalObjectStore, ObjectStore, S3ObjectStore
+from libs.instrumentation import get_recorder
+
+
+def daily_rollups(changes: Iterable[ForecastChanges]) -> List[DailyRollup]:
+    # 変更のあった日だけを、今回取得したデータ (その日の全行を含む) から集計し直す
+    with get_recorder().stage("rollup") as metrics:
+        rollups = [
+            rollup
+            for change in changes
+            for rollup in DailyRollup.from_frame(change.area, change.forecast.today_frame, dates=change.changed_dates)
+        ]
+        metrics.set(rows=len(rollups))
+    return rollups
 
 
 class Saver(ABC):
@@ -15,52 +42,189 @@ class Saver(ABC):
     def run(self, structured_data: ForecastData):
         pass
 
+    def run_batch(self, forecasts: Iterable[ForecastData]):
+        for structured_data in forecasts:
+            self.run(structured_data=structured_data)
+
+    def run_stream(self, forecasts: Iterable[ForecastData], batch_size: int = 30) -> Iterator[List[ForecastData]]:
+        # 先頭から batch_size 件ずつ run_batch に渡し、保存できたバッチを返す
+        # 全件をリストにしないので、件数によらず保持するのは 1 バッチ分だけになる
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        iterator = iter(forecasts)
+        while True:
+            batch = list(itertools.islice(iterator, batch_size))
+            if not batch:
+                return
+            self.run_batch(forecasts=batch)
+            yield batch
+
+    def run_changes(self, changes: Iterable[ForecastChanges]):
+        # 差分だけを書き込めない saver は、変更のあったエリアのデータを丸ごと保存する
+        self.run_batch(forecasts=[change.forecast for change in changes if change.changed])
+
 
 class CsvSaver(Saver):
+    # today_forecast / tomorrow_forecast を area= / date= で分割した CSV として保存する
+    # パーティションごとに一時ファイルへ書いてから置き換える (ObjectStore.put)
+    # manifest に各パーティションの内容のハッシュを記録し、再実行時は内容が変わったパーティションだけを書き直す
+    FILE_NAME = "part-0.csv"
+    MANIFEST_KEY = "_manifest.json"
+
+    def __init__(self, store: Optional[ObjectStore] = None) -> None:
+        super().__init__()
+        self._store = store
+        self._gzip = False
+        self._manifest: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def with_store(self, store: ObjectStore):
+        self._store = store
+        self._manifest = None
+        return self
+
     def with_output_path(self, path: str):
-        self._path: Path = Path(path)
+        return self.with_store(LocalObjectStore(path))
+
+    def with_gzip(self, enabled: bool = True):
+        self._gzip = enabled
         return self
 
-    def _output_today_forecasts(self, today_forecasts: list[TodayForecast]):
-        save_data = [d.model_dump() for d in today_forecasts]
-        if not save_data:
-            return
-        fields = list(save_data[0].keys())
-        path = self._path / Path("today_forecast.csv")
-        with path.open("w") as f:
-            writer = csv.DictWriter(f, fieldnames=fields)
-            writer.writeheader()
-            writer.writerows(save_data)
-
-    def _output_tomorrow_forecast(self, tomorrow_forecast: TomorrowForecast):
-        if tomorrow_forecast is None:
-            return
+    def partition_key(self, table: str, area: Area, target_date: date) -> str:
+        name = f"{self.FILE_NAME}.gz" if self._gzip else self.FILE_NAME
+        return f"{table}/area={area.value}/date={target_date.isoformat()}/{name}"
+
+    def _load_manifest(self) -> Dict[str, str]:
+        if self._manifest is None:
+            body = self._store.get(self.MANIFEST_KEY)
+            try:
+                self._manifest = json.loads(body) if body else {}
+            except ValueError:
+                # 壊れている場合はすべてのパーティションを書き直す
+                self._manifest = {}
+        return self._manifest
+
+    def _save_manifest(self):
+        self._store.put(self.MANIFEST_KEY, json.dumps(self._manifest, sort_keys=True).encode())
+
+    @staticmethod
+    def _digest(header: Sequence[str], columns: Sequence[Sequence]) -> str:
+        # CSV に変換する前の列からハッシュを求める (変更のないパーティションは CSV に変換しない)
+        values = [column.tobytes() if isinstance(column, array) else column for column in columns]
+        return hashlib.sha256(pickle.dumps((list(header), values), protocol=5)).hexdigest()
+
+    def _write(self, key: str, header: Sequence[str], columns: Sequence[Sequence]) -> bool:
+        # 1 パーティション分 (1 日分) をハッシュで比べ、変わっている場合だけまとめて書き出す
+        digest = self._digest(header, columns)
+        manifest = self._load_manifest()
+        if manifest.get(key) == digest and self._store.exists(key):
+            return False
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        writer.writerows(zip(*columns))
+        body = buffer.getvalue().encode()
+        if self._gzip:
+            # mtime を固定して同じ内容なら同じバイト列にする
+            body = gzip.compress(body, mtime=0)
+        self._store.put(key, body)
+        manifest[key] = digest
+        # 圧縮の有無を切り替えた場合、もう一方の拡張子で書いたパーティションが同じ日の行を重複して持つので消す
+        previous = key[: -len(".gz")] if self._gzip else f"{key}.gz"
+        if manifest.pop(previous, None) is not None:
+            self._store.delete(previous)
+        return True
+
+    def _output_today_forecasts(
+        self, area: Area, today_frame: ForecastFrame, dates: Optional[Set[date]] = None
+    ) -> int:
+        written = 0
+        for target_date, start, end in today_frame.day_slices():
+            if dates is not None and target_date not in dates:
+                continue
+            written += self._write(
+                key=self.partition_key("today_forecast", area, target_date),
+                header=ForecastFrame.COLUMNS,
+                columns=[
+                    today_frame.dt[start:end],
+                    today_frame.actual_result[start:end],
+                    today_frame.forecast_demand[start:end],
+                    today_frame.forecast_supply[start:end],
+                ],
+            )
+        return written
 
+    def _output_tomorrow_forecast(self, area: Area, tomorrow_forecast: Optional[TomorrowForecast]) -> int:
+        if tomorrow_forecast is None:
+            return 0
         save_data = tomorrow_forecast.model_dump()
-        fields = list(save_data.keys())
-        path = self._path / Path("tomorrow_forecast.csv")
-        with path.open("w") as f:
-            writer = csv.DictWriter(f, fieldnames=fields)
-            writer.writeheader()
-            writer.writerow(save_data)
+        return self._write(
+            key=self.partition_key("tomorrow_forecast", area, tomorrow_forecast.date),
+            header=list(save_data.keys()),
+            columns=[[value] for value in save_data.values()],
+        )
 
-    def run(self, structured_data: ForecastData):
-        if self._path is None:
+    def _save(self, changes: Iterable[ForecastChanges]):
+        if self._store is None:
             raise Exception("need output path")
 
-        self._output_today_forecasts(today_forecasts=structured_data.today_forecasts)
-        self._output_tomorrow_forecast(
-            tomorrow_forecast=structured_data.tomorrow_forecast
-        )
+        # forecasts は 1 エリア (バックフィルでは 1 日) ずつ書き出すので、全件をメモリに持たない
+        with self._lock:
+            try:
+                for change in changes:
+                    with get_recorder().stage("save.csv", area=change.area) as metrics:
+                        written = self._output_today_forecasts(
+                            area=change.area, today_frame=change.forecast.today_frame, dates=change.changed_dates
+                        )
+                        if change.tomorrow_changed:
+                            written += self._output_tomorrow_forecast(
+                                area=change.area, tomorrow_forecast=change.forecast.tomorrow_forecast
+                            )
+                        metrics.set(rows=len(change.today_frame), partitions=written)
+            finally:
+                # 書き込めたパーティションの分は途中で失敗しても記録する
+                if self._manifest is not None:
+                    self._save_manifest()
+
+    def run_batch(self, forecasts: Iterable[ForecastData]):
+        self._save(ForecastChanges.full(forecast) for forecast in forecasts)
+
+    def run_changes(self, changes: Iterable[ForecastChanges]):
+        # 変更のあった日のパーティションだけを書き直す
+        self._save(changes)
+
+    def run(self, structured_data: ForecastData):
+        self.run_batch(forecasts=[structured_data])
 
 
 class AthenaSaver(Saver):
-    def __init__(self) -> None:
+    # Athena のクエリ文字列の上限は 262144 バイト
+    MAX_QUERY_BYTES = 262144
+    # INSERT で指定する列 (VALUES の順)。テーブル定義は sql/athena_tables.sql
+    TABLE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+        "today_forecast": ("datetime", "actual_result", "forecast_demand", "forecast_supply", "area"),
+        "tomorrow_forecast": (
+            "date",
+            "demand_peak_time",
+            "demand_peak_supply",
+            "demand_peak_demand",
+            "usage_peak_time",
+            "usage_peak_supply",
+            "usage_peak_demand",
+            "temperature",
+            "area",
+        ),
+        "daily_rollup": ("date", *DailyRollup.COLUMNS, "area"),
+    }
+
+    def __init__(self, client=None) -> None:
         super().__init__()
         self._database = "default"
         self._workgroup = "primary"
-        session = boto3.session.Session()
-        self.client = session.client("athena")
+        self.client = client if client is not None else aws_client("athena")
+        self._pipeline: Optional[AthenaQueryPipeline] = None
+        self._poll_interval = (0.2, 5.0)
+        self._rollups = False
 
     def with_database(self, database: str):
         self._database = database
@@ -70,76 +234,509 @@ class AthenaSaver(Saver):
         self._workgroup = workgroup
         return self
 
-    def _execute(self, query: str):
-        print(query)
-        exec_id = self.client.start_query_execution(
-            QueryString=query,
-            WorkGroup=self._workgroup,
-        )["QueryExecutionId"]
-        status = self.client.get_query_execution(QueryExecutionId=exec_id)[
-            "QueryExecution"
-        ]["Status"]
-
-        # ポーリング
-        while status["State"] not in ["SUCCEEDED", "FAILED", "CANCELLED"]:
-            print("{}: wait query running...".format(status["State"]))
-            time.sleep(5)
-            status = self.client.get_query_execution(QueryExecutionId=exec_id)[
-                "QueryExecution"
-            ]["Status"]
-        return status["State"], exec_id
-
-    def _output_today_forecasts(self, area: Area, today_forecasts: list[TodayForecast]):
-        if not today_forecasts:
+    def with_poll_interval(self, initial_interval: float, max_interval: float):
+        self._poll_interval = (initial_interval, max_interval)
+        return self
+
+    def with_rollups(self, enabled: bool = True):
+        # daily_rollup テーブルも更新する
+        self._rollups = enabled
+        return self
+
+    def _submit(self, query: str, after: Sequence[QueryHandle] = ()) -> QueryHandle:
+        return self._pipeline.submit(query=query, after=after)
+
+    def _chunk(self, parts: List[str], separator: str, overhead: int) -> Iterator[List[str]]:
+        # クエリ文字列の上限 (MAX_QUERY_BYTES) を超えないように分割する
+        limit = self.MAX_QUERY_BYTES - overhead
+        chunk: List[str] = []
+        size = 0
+        for part in parts:
+            part_size = len(part.encode()) + len(separator)
+            if chunk and size + part_size > limit:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(part)
+            size += part_size
+        if chunk:
+            yield chunk
+
+    def _upsert(self, table: str, predicates: List[str], values: List[str]):
+        # 全エリア分を 1 つの DELETE (OR で結合した条件) と 1 つの INSERT にまとめる
+        if not values:
             return
-        target_date = today_forecasts[0].dt.date()
-        target_date_p1 = target_date + timedelta(days=1)
-        self._execute(
-            f"""
-            DELETE FROM {self._database}.today_forecast
-            WHERE TIMESTAMP '{target_date.isoformat()}' < datetime
-            AND datetime <= TIMESTAMP '{target_date_p1.isoformat()}'
-            AND area = '{area.value}'
-            """
-        )
-        value_query = [
-            f"(timestamp '{tf.dt:%Y-%m-%d %H:%M:%S}', {tf.actual_result}, {tf.forecast_demand}, {tf.forecast_supply}, '{area.value}')"
-            for tf in today_forecasts
+        delete_prefix = f"DELETE FROM {self._database}.{table} WHERE "
+        # テーブルの列の順序に依存しないよう、列名を指定する
+        insert_prefix = f"INSERT INTO {self._database}.{table} ({', '.join(self.TABLE_COLUMNS[table])}) VALUES "
+        deletes = [
+            self._submit(query=delete_prefix + " OR ".join(chunk))
+            for chunk in self._chunk(predicates, separator=" OR ", overhead=len(delete_prefix.encode()))
         ]
-        query = f"INSERT INTO {self._database}.today_forecast VALUES {','.join(value_query)}"
-        self._execute(query=query)
+        for chunk in self._chunk(values, separator=",", overhead=len(insert_prefix.encode())):
+            self._submit(query=insert_prefix + ",".join(chunk), after=deletes)
 
-    def _output_tomorrow_forecast(
-        self, area: Area, tomorrow_forecast: TomorrowForecast
-    ):
-        if tomorrow_forecast is None:
-            return
+    def _output_today_forecasts(self, forecasts: List[ForecastData]):
+        predicates = []
+        values = []
+        for structured_data in forecasts:
+            area = structured_data.area
+            today_frame = structured_data.today_frame
+            # frame に含まれる日ごとに、その日の 0:00 から翌日の 0:00 の手前までを置き換える
+            predicates.extend(
+                f"(TIMESTAMP '{target_date.isoformat()}' <= datetime"
+                f" AND datetime < TIMESTAMP '{(target_date + timedelta(days=1)).isoformat()}'"
+                f" AND area = '{area.value}')"
+                for target_date, _, _ in today_frame.day_slices()
+            )
+            values.extend(self._today_values(area=area, today_frame=today_frame))
+        self._upsert(table="today_forecast", predicates=predicates, values=values)
+
+    @staticmethod
+    def _today_values(area: Area, today_frame: ForecastFrame) -> Iterator[str]:
+        return (
+            f"(timestamp '{dt:%Y-%m-%d %H:%M:%S}', {actual_result}, {forecast_demand}, {forecast_supply},"
+            f" '{area.value}')"
+            for dt, actual_result, forecast_demand, forecast_supply in today_frame.rows()
+        )
+
+    def _output_today_changes(self, changes: List[ForecastChanges]):
+        # 変更のあった日時の範囲だけを DELETE し、変更のあった行だけを INSERT する
+        predicates = []
+        values = []
+        for change in changes:
+            area = change.area
+            predicates.extend(
+                f"(TIMESTAMP '{start:%Y-%m-%d %H:%M:%S}' <= datetime"
+                f" AND datetime <= TIMESTAMP '{end:%Y-%m-%d %H:%M:%S}'"
+                f" AND area = '{area.value}')"
+                for start, end in change.ranges
+            )
+            values.extend(self._today_values(area=area, today_frame=change.today_frame))
+        self._upsert(table="today_forecast", predicates=predicates, values=values)
+
+    def _output_tomorrow_forecast(self, forecasts: List[ForecastData]):
         if self._database is None:
             raise Exception("need database")
-        tf = tomorrow_forecast
-        self._execute(
-            query=f"""
-            DELETE FROM {self._database}.tomorrow_forecast
-            WHERE date = date '{tf.date.isoformat()}'\
-            AND area = '{area.value}'
-            """
+        predicates = []
+        values = []
+        for structured_data in forecasts:
+            area = structured_data.area
+            tf = structured_data.tomorrow_forecast
+            if tf is None:
+                continue
+            predicates.append(f"(date = date '{tf.date.isoformat()}' AND area = '{area.value}')")
+            values.append(
+                f"(date '{tf.date.isoformat()}', '{tf.demand_peak_time}', {tf.demand_peak_supply}, "
+                f"{tf.demand_peak_demand}, '{tf.usage_peak_time}', {tf.usage_peak_supply}, {tf.usage_peak_demand}, "
+                f"{tf.temperature}, '{area.value}')"
+            )
+        self._upsert(table="tomorrow_forecast", predicates=predicates, values=values)
+
+    def _output_daily_rollups(self, changes: List[ForecastChanges]):
+        if not self._rollups:
+            return
+        predicates = []
+        values = []
+        for rollup in daily_rollups(changes):
+            predicates.append(f"(date = date '{rollup.date.isoformat()}' AND area = '{rollup.area.value}')")
+            columns = ", ".join(self._literal(value) for value in rollup.values())
+            values.append(f"(date '{rollup.date.isoformat()}', {columns}, '{rollup.area.value}')")
+        self._upsert(table="daily_rollup", predicates=predicates, values=values)
+
+    @staticmethod
+    def _literal(value) -> str:
+        if value is None:
+            return "NULL"
+        if isinstance(value, datetime):
+            return f"timestamp '{value:%Y-%m-%d %H:%M:%S}'"
+        return str(value)
+
+    def _execute(self, output: Callable[[], None], rows: int) -> List[QueryHandle]:
+        initial_interval, max_interval = self._poll_interval
+        self._pipeline = AthenaQueryPipeline(
+            client=self.client,
+            workgroup=self._workgroup,
+            initial_interval=initial_interval,
+            max_interval=max_interval,
+        )
+        with get_recorder().stage("save.athena") as metrics:
+            output()
+            handles = self._pipeline.wait()
+            metrics.set(rows=rows, queries=len(handles))
+        failed = [h for h in handles if not h.succeeded]
+        if failed:
+            raise AthenaQueryError(failed)
+        return handles
+
+    def run_batch(self, forecasts: Iterable[ForecastData]):
+        # エリア数によらずテーブルごとに DELETE / INSERT を 1 回ずつ (クエリ長の上限を超える場合のみ分割)
+        # today_forecast と tomorrow_forecast の更新は並行して実行する
+        forecasts = list(forecasts)
+
+        def output():
+            self._output_today_forecasts(forecasts=forecasts)
+            self._output_tomorrow_forecast(forecasts=forecasts)
+            self._output_daily_rollups(changes=[ForecastChanges.full(f) for f in forecasts])
+
+        return self._execute(output, rows=sum(len(f.today_frame) for f in forecasts))
+
+    def run_changes(self, changes: Iterable[ForecastChanges]):
+        changes = [change for change in changes if change.changed]
+
+        def output():
+            self._output_today_changes(changes=changes)
+            self._output_tomorrow_forecast(forecasts=[c.forecast for c in changes if c.tomorrow_changed])
+            self._output_daily_rollups(changes=changes)
+
+        return self._execute(output, rows=sum(len(c.today_frame) for c in changes))
+
+    def run(self, structured_data: ForecastData):
+        return self.run_batch(forecasts=[structured_data])
+
+
+class ParquetSaver(Saver):
+    # today_forecast / tomorrow_forecast を area= / date= で分割した Parquet ファイルとして保存する
+    # 再実行時はパーティションのファイルを丸ごと置き換える (Athena などからそのまま読める)
+    FILE_NAME = "part-0.parquet"
+    # 列の型 (pyarrow の型名)。値から推測せず、空のパーティションや欠測値でも型を固定する
+    COLUMN_TYPES = {
+        "datetime": "timestamp[ms]",
+        "actual_result": "int32",
+        "forecast_demand": "int32",
+        "forecast_supply": "int32",
+        "demand_peak_time": "string",
+        "demand_peak_supply": "int32",
+        "demand_peak_demand": "int32",
+        "usage_peak_time": "string",
+        "usage_peak_supply": "int32",
+        "usage_peak_demand": "int32",
+        "temperature": "double",
+    }
+
+    def __init__(self, store: Optional[ObjectStore] = None) -> None:
+        super().__init__()
+        self._store = store
+
+    def with_store(self, store: ObjectStore):
+        self._store = store
+        return self
+
+    def with_output_path(self, path: str):
+        return self.with_store(LocalObjectStore(path))
+
+    def with_s3(self, bucket: str, prefix: str = "", client=None):
+        return self.with_store(S3ObjectStore(bucket=bucket, prefix=prefix, client=client))
+
+    @classmethod
+    def partition_key(cls, table: str, area: Area, target_date: date) -> str:
+        return f"{table}/area={area.value}/date={target_date.isoformat()}/{cls.FILE_NAME}"
+
+    def _write(self, key: str, columns: dict):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("ParquetSaver requires pyarrow (install the parquet extra)") from e
+
+        table = pa.table(
+            {
+                name: pa.array(values, type=pa.type_for_alias(self.COLUMN_TYPES[name]))
+                for name, values in columns.items()
+            }
         )
+        buffer = pa.BufferOutputStream()
+        pq.write_table(table, buffer, compression="snappy")
+        self._store.put(key, buffer.getvalue().to_pybytes())
+
+    def _output_today_forecasts(self, area: Area, today_frame: ForecastFrame):
+        # 日付の切れ目ごとに 1 パーティションとする
+        for target_date, start, end in today_frame.day_slices():
+            self._write(
+                key=self.partition_key("today_forecast", area, target_date),
+                columns={
+                    "datetime": today_frame.dt[start:end],
+                    "actual_result": today_frame.actual_result[start:end],
+                    "forecast_demand": today_frame.forecast_demand[start:end],
+                    "forecast_supply": today_frame.forecast_supply[start:end],
+                },
+            )
 
-        query = f"""
-        INSERT INTO {self._database}.tomorrow_forecast
-        VALUES (
-            date '{tf.date.isoformat()}', '{tf.demand_peak_time}', {tf.demand_peak_supply}, {tf.demand_peak_demand},
-            '{tf.usage_peak_time}', {tf.usage_peak_supply}, {tf.usage_peak_demand},
-            {tf.temperature}, '{area.value}'
+    def _output_tomorrow_forecast(self, area: Area, tomorrow_forecast: TomorrowForecast):
+        if tomorrow_forecast is None:
+            return
+        # date はパーティションのキーとして持つ
+        save_data = tomorrow_forecast.model_dump(exclude={"date"})
+        self._write(
+            key=self.partition_key("tomorrow_forecast", area, tomorrow_forecast.date),
+            columns={name: [value] for name, value in save_data.items()},
         )
-        """
-        self._execute(query=query)
 
     def run(self, structured_data: ForecastData):
-        self._output_today_forecasts(
-            area=structured_data.area, today_forecasts=structured_data.today_forecasts
+        if self._store is None:
+            raise Exception("need output store")
+
+        with get_recorder().stage("save.parquet", area=structured_data.area) as metrics:
+            self._output_today_forecasts(area=structured_data.area, today_frame=structured_data.today_frame)
+            self._output_tomorrow_forecast(
+                area=structured_data.area,
+                tomorrow_forecast=structured_data.tomorrow_forecast,
+            )
+            metrics.set(rows=len(structured_data.today_frame))
+
+
+class SqliteSaver(Saver):
+    # 組み込みの SQLite に保存する (ローカル開発・テスト・AWS を使わない環境向け)
+    # 1 回の run / run_batch を 1 トランザクションとし、executemany でまとめて upsert する
+    # (area, datetime) / (area, date) の主キーで範囲検索する
+    DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS today_forecast ("
+        " area TEXT NOT NULL, datetime TEXT NOT NULL,"
+        " actual_result INTEGER NOT NULL, forecast_demand INTEGER NOT NULL, forecast_supply INTEGER NOT NULL,"
+        " PRIMARY KEY (area, datetime)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS tomorrow_forecast ("
+        " area TEXT NOT NULL, date TEXT NOT NULL,"
+        " demand_peak_time TEXT NOT NULL, demand_peak_supply INTEGER NOT NULL, demand_peak_demand INTEGER NOT NULL,"
+        " usage_peak_time TEXT NOT NULL, usage_peak_supply INTEGER NOT NULL, usage_peak_demand INTEGER NOT NULL,"
+        " temperature REAL NOT NULL,"
+        " PRIMARY KEY (area, date)) WITHOUT ROWID",
+        # 5 分間隔の実績 (欠測値は保存しない)
+        "CREATE TABLE IF NOT EXISTS actual_result ("
+        " area TEXT NOT NULL, datetime TEXT NOT NULL, value INTEGER NOT NULL,"
+        " PRIMARY KEY (area, datetime)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS daily_rollup ("
+        " area TEXT NOT NULL, date TEXT NOT NULL, hours INTEGER NOT NULL,"
+        " peak_demand INTEGER NOT NULL, peak_demand_time TEXT NOT NULL,"
+        " peak_usage_pc INTEGER NOT NULL, peak_usage_time TEXT NOT NULL,"
+        " min_reserve INTEGER NOT NULL, min_reserve_time TEXT NOT NULL,"
+        " observed_hours INTEGER NOT NULL, peak_actual INTEGER,"
+        " mean_abs_error REAL, max_abs_error INTEGER, mean_abs_error_pc REAL,"
+        " PRIMARY KEY (area, date)) WITHOUT ROWID",
+        # エリアをまたいだ期間指定の検索用
+        "CREATE INDEX IF NOT EXISTS today_forecast_datetime ON today_forecast (datetime)",
+        "CREATE INDEX IF NOT EXISTS tomorrow_forecast_date ON tomorrow_forecast (date)",
+    )
+    TOMORROW_COLUMNS = (
+        "demand_peak_time",
+        "demand_peak_supply",
+        "demand_peak_demand",
+        "usage_peak_time",
+        "usage_peak_supply",
+        "usage_peak_demand",
+        "temperature",
+    )
+
+    def __init__(self, path: str = ":memory:") -> None:
+        super().__init__()
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # トランザクションは明示的に BEGIN / COMMIT する
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            # 書き込み中も読み出しをブロックしない
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                self._connection.execute(statement)
+
+    def close(self):
+        self._connection.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def _upsert_today(self, connection: sqlite3.Connection, area: Area, today_frame: ForecastFrame):
+        connection.executemany(
+            "INSERT INTO today_forecast VALUES (?, ?, ?, ?, ?) ON CONFLICT (area, datetime) DO UPDATE SET"
+            " actual_result = excluded.actual_result,"
+            " forecast_demand = excluded.forecast_demand,"
+            " forecast_supply = excluded.forecast_supply",
+            (
+                (area.value, f"{dt:{self.DATETIME_FORMAT}}", actual_result, forecast_demand, forecast_supply)
+                for dt, actual_result, forecast_demand, forecast_supply in today_frame.rows()
+            ),
+        )
+
+    def _upsert_tomorrow(self, connection: sqlite3.Connection, area: Area, tomorrow_forecast: TomorrowForecast):
+        updates = ", ".join(f"{column} = excluded.{column}" for column in self.TOMORROW_COLUMNS)
+        connection.execute(
+            f"INSERT INTO tomorrow_forecast VALUES (?, ?, {', '.join('?' * len(self.TOMORROW_COLUMNS))})"
+            f" ON CONFLICT (area, date) DO UPDATE SET {updates}",
+            (
+                area.value,
+                tomorrow_forecast.date.isoformat(),
+                *(getattr(tomorrow_forecast, column) for column in self.TOMORROW_COLUMNS),
+            ),
         )
-        self._output_tomorrow_forecast(
-            area=structured_data.area,
-            tomorrow_forecast=structured_data.tomorrow_forecast,
+
+    def _upsert_actual_results(self, connection: sqlite3.Connection, area: Area, series: ActualResultSeries):
+        connection.executemany(
+            "INSERT INTO actual_result VALUES (?, ?, ?)"
+            " ON CONFLICT (area, datetime) DO UPDATE SET value = excluded.value",
+            (
+                (area.value, f"{series.dt_at(idx):{self.DATETIME_FORMAT}}", value)
+                for idx, value in enumerate(series.values)
+                if value != ActualResultSeries.MISSING
+            ),
+        )
+
+    def _upsert_daily_rollups(self, connection: sqlite3.Connection, rollups: List[DailyRollup]):
+        updates = ", ".join(f"{column} = excluded.{column}" for column in DailyRollup.COLUMNS)
+        connection.executemany(
+            f"INSERT INTO daily_rollup VALUES (?, ?, {', '.join('?' * len(DailyRollup.COLUMNS))})"
+            f" ON CONFLICT (area, date) DO UPDATE SET {updates}",
+            (
+                (
+                    rollup.area.value,
+                    rollup.date.isoformat(),
+                    *(
+                        f"{value:{self.DATETIME_FORMAT}}" if isinstance(value, datetime) else value
+                        for value in rollup.values()
+                    ),
+                )
+                for rollup in rollups
+            ),
         )
+
+    def run_batch(self, forecasts: Iterable[ForecastData]):
+        forecasts = list(forecasts)
+        rollups = daily_rollups(ForecastChanges.full(f) for f in forecasts)
+        with get_recorder().stage("save.sqlite") as metrics, self._transaction() as connection:
+            for structured_data in forecasts:
+                area = structured_data.area
+                self._upsert_today(connection, area, structured_data.today_frame)
+                if structured_data.tomorrow_forecast is not None:
+                    self._upsert_tomorrow(connection, area, structured_data.tomorrow_forecast)
+                if structured_data.actual_results is not None:
+                    self._upsert_actual_results(connection, area, structured_data.actual_results)
+            self._upsert_daily_rollups(connection, rollups)
+            metrics.set(rows=sum(len(f.today_frame) for f in forecasts))
+
+    def run_changes(self, changes: Iterable[ForecastChanges]):
+        # 主キーで upsert するので変更のあった行だけを書けばよい
+        changes = list(changes)
+        rollups = daily_rollups(changes)
+        with get_recorder().stage("save.sqlite") as metrics, self._transaction() as connection:
+            for change in changes:
+                self._upsert_today(connection, change.area, change.today_frame)
+                if change.tomorrow_changed:
+                    self._upsert_tomorrow(connection, change.area, change.forecast.tomorrow_forecast)
+                if change.forecast.actual_results is not None:
+                    self._upsert_actual_results(connection, change.area, change.forecast.actual_results)
+            self._upsert_daily_rollups(connection, rollups)
+            metrics.set(rows=sum(len(c.today_frame) for c in changes))
+
+    def run(self, structured_data: ForecastData):
+        self.run_batch(forecasts=[structured_data])
+
+    def _select(self, query: str, parameters: Sequence) -> List[tuple]:
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+    def _frame(self, rows: List[tuple]) -> ForecastFrame:
+        return ForecastFrame.model_construct(
+            dt=[datetime.strptime(row[0], self.DATETIME_FORMAT) for row in rows],
+            actual_result=array("i", [row[1] for row in rows]),
+            forecast_demand=array("i", [row[2] for row in rows]),
+            forecast_supply=array("i", [row[3] for row in rows]),
+        )
+
+    def today_frame(self, area: Area, start: datetime, end: datetime) -> ForecastFrame:
+        # start <= datetime < end の行を日時順に返す
+        rows = self._select(
+            "SELECT datetime, actual_result, forecast_demand, forecast_supply FROM today_forecast"
+            " WHERE area = ? AND datetime >= ? AND datetime < ? ORDER BY datetime",
+            (area.value, f"{start:{self.DATETIME_FORMAT}}", f"{end:{self.DATETIME_FORMAT}}"),
+        )
+        return self._frame(rows)
+
+    def latest_frame(self, area: Area, n: int) -> ForecastFrame:
+        # 最新の n 行を日時順に返す
+        rows = self._select(
+            "SELECT datetime, actual_result, forecast_demand, forecast_supply FROM today_forecast"
+            " WHERE area = ? ORDER BY datetime DESC LIMIT ?",
+            (area.value, n),
+        )
+        return self._frame(rows[::-1])
+
+    def peak_usage_date(self, area: Area, start: date, end: date) -> Optional[date]:
+        # start <= date < end のうち、使用率 (予測需要 / 予測供給) の最大値が最も高い日
+        row = self._select(
+            "SELECT substr(datetime, 1, 10) AS day, max(CAST(forecast_demand AS REAL) / forecast_supply) AS usage"
+            " FROM today_forecast WHERE area = ? AND datetime >= ? AND datetime < ? AND forecast_supply > 0"
+            " GROUP BY day ORDER BY usage DESC, day LIMIT 1",
+            (area.value, start.isoformat(), end.isoformat()),
+        )
+        return date.fromisoformat(row[0][0]) if row else None
+
+    def data_version(self) -> Tuple[int, int]:
+        # 他の接続 (data_version) またはこの接続 (total_changes) から書き込まれると変わる
+        with self._lock:
+            return self._connection.execute("PRAGMA data_version").fetchone()[0], self._connection.total_changes
+
+    def tomorrow_forecasts(self, area: Area, start: date, end: date) -> List[TomorrowForecast]:
+        # start <= date < end
+        rows = self._select(
+            f"SELECT date, {', '.join(self.TOMORROW_COLUMNS)} FROM tomorrow_forecast"
+            " WHERE area = ? AND date >= ? AND date < ? ORDER BY date",
+            (area.value, start.isoformat(), end.isoformat()),
+        )
+        return [
+            TomorrowForecast(date=date.fromisoformat(row[0]), **dict(zip(self.TOMORROW_COLUMNS, row[1:])))
+            for row in rows
+        ]
+
+    def daily_rollups(self, area: Area, start: date, end: date) -> List[DailyRollup]:
+        # start <= date < end
+        rows = self._select(
+            f"SELECT date, {', '.join(DailyRollup.COLUMNS)} FROM daily_rollup"
+            " WHERE area = ? AND date >= ? AND date < ? ORDER BY date",
+            (area.value, start.isoformat(), end.isoformat()),
+        )
+        return [DailyRollup(area=area, date=row[0], **dict(zip(DailyRollup.COLUMNS, row[1:]))) for row in rows]
+
+    def actual_results(
+        self, area: Area, start: datetime, end: datetime, interval: timedelta = timedelta(minutes=5)
+    ) -> ActualResultSeries:
+        # start <= datetime < end の実績を返す (保存されていない時刻は欠測値)
+        rows = self._select(
+            "SELECT datetime, value FROM actual_result WHERE area = ? AND datetime >= ? AND datetime < ?",
+            (area.value, f"{start:{self.DATETIME_FORMAT}}", f"{end:{self.DATETIME_FORMAT}}"),
+        )
+        values = array("i", [ActualResultSeries.MISSING]) * math.ceil((end - start) / interval)
+        for dt, value in rows:
+            values[(datetime.strptime(dt, self.DATETIME_FORMAT) - start) // interval] = value
+        return ActualResultSeries(start=start, interval=interval, values=values)
+
+
+class IncrementalSaver(Saver):
+    # スナップショットと比較し、前回から追加・変更された行だけを saver に渡す
+    # 通常は最新の 1 時間分の actual_result のみが変わるため、書き込み量と DELETE の対象が小さくなる
+    def __init__(self, saver: Saver, snapshot: SnapshotStore) -> None:
+        super().__init__()
+        self._saver = saver
+        self._snapshot = snapshot
+
+    def run_batch(self, forecasts: Iterable[ForecastData]):
+        with get_recorder().stage("save.diff") as metrics:
+            changes = [self._snapshot.diff(forecast) for forecast in forecasts]
+            changes = [change for change in changes if change.changed]
+            metrics.set(rows=sum(len(change.today_frame) for change in changes))
+        if not changes:
+            return None
+        result = self._saver.run_changes(changes=changes)
+        # 保存に失敗した場合はスナップショットを更新しない (次回も同じ行が差分になる)
+        self._snapshot.commit(changes)
+        return result
+
+    def run(self, structured_data: ForecastData):
+        return self.run_batch(forecasts=[structured_data])
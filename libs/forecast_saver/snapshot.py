@@ -0,0 +1,162 @@
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData, ForecastFrame
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class ForecastChanges:
+    # 前回保存した内容との差分
+    # today_frame は追加・変更された行のみ、ranges はその行の日時の連続した範囲 (両端を含む)
+    def __init__(
+        self,
+        forecast: ForecastData,
+        today_frame: ForecastFrame,
+        ranges: List[Tuple[datetime, datetime]],
+        tomorrow_changed: bool,
+    ) -> None:
+        self.forecast = forecast
+        self.today_frame = today_frame
+        self.ranges = ranges
+        self.tomorrow_changed = tomorrow_changed
+
+    @property
+    def area(self) -> Area:
+        return self.forecast.area
+
+    @property
+    def changed_dates(self) -> Set[date]:
+        return {dt.date() for dt in self.today_frame.dt}
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.today_frame) or self.tomorrow_changed
+
+    @classmethod
+    def full(cls, forecast: ForecastData) -> "ForecastChanges":
+        # スナップショットを使わない場合 (全行が変更されたものとして扱う)
+        frame = forecast.today_frame
+        return cls(
+            forecast=forecast,
+            today_frame=frame,
+            ranges=[(frame.dt[0], frame.dt[-1])] if frame else [],
+            tomorrow_changed=forecast.tomorrow_forecast is not None,
+        )
+
+
+class SnapshotStore:
+    # 保存済みの today_forecast を (area, datetime) ごと、tomorrow_forecast を (area, date) ごとに SQLite に保持する
+    # Lambda では /tmp に置く。失われても全行が新規扱いになるだけで、保存先の内容は壊れない
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS today_forecast ("
+        " area TEXT NOT NULL, datetime TEXT NOT NULL,"
+        " actual_result INTEGER NOT NULL, forecast_demand INTEGER NOT NULL, forecast_supply INTEGER NOT NULL,"
+        " PRIMARY KEY (area, datetime)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS tomorrow_forecast ("
+        " area TEXT NOT NULL, date TEXT NOT NULL, body TEXT NOT NULL,"
+        " PRIMARY KEY (area, date)) WITHOUT ROWID",
+    )
+
+    def __init__(self, path: str, retention_days: int = 7) -> None:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._retention = timedelta(days=retention_days)
+        self._lock = threading.Lock()
+        with self._lock:
+            for statement in self.SCHEMA:
+                self._connection.execute(statement)
+
+    def close(self):
+        self._connection.close()
+
+    def _stored_rows(self, area: Area, frame: ForecastFrame) -> Dict[str, Tuple[int, int, int]]:
+        cursor = self._connection.execute(
+            "SELECT datetime, actual_result, forecast_demand, forecast_supply FROM today_forecast"
+            " WHERE area = ? AND datetime BETWEEN ? AND ?",
+            (area.value, f"{frame.dt[0]:{DATETIME_FORMAT}}", f"{frame.dt[-1]:{DATETIME_FORMAT}}"),
+        )
+        return {row[0]: row[1:] for row in cursor}
+
+    def _stored_tomorrow(self, forecast: ForecastData) -> Optional[str]:
+        row = self._connection.execute(
+            "SELECT body FROM tomorrow_forecast WHERE area = ? AND date = ?",
+            (forecast.area.value, forecast.tomorrow_forecast.date.isoformat()),
+        ).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _ranges(frame: ForecastFrame, indices: List[int]) -> List[Tuple[datetime, datetime]]:
+        # 連続した行をひとつの範囲にまとめる
+        ranges = []
+        start = 0
+        for pos in range(1, len(indices) + 1):
+            if pos < len(indices) and indices[pos] == indices[pos - 1] + 1:
+                continue
+            ranges.append((frame.dt[indices[start]], frame.dt[indices[pos - 1]]))
+            start = pos
+        return ranges
+
+    def diff(self, forecast: ForecastData) -> ForecastChanges:
+        frame = forecast.today_frame
+        with self._lock:
+            stored = self._stored_rows(forecast.area, frame) if frame else {}
+            stored_tomorrow = self._stored_tomorrow(forecast) if forecast.tomorrow_forecast is not None else None
+        indices = [
+            idx
+            for idx, (dt, *values) in enumerate(frame.rows())
+            if stored.get(f"{dt:{DATETIME_FORMAT}}") != tuple(values)
+        ]
+        tomorrow_changed = (
+            forecast.tomorrow_forecast is not None
+            and stored_tomorrow != forecast.tomorrow_forecast.model_dump_json()
+        )
+        return ForecastChanges(
+            forecast=forecast,
+            today_frame=frame.take(indices),
+            ranges=self._ranges(frame, indices),
+            tomorrow_changed=tomorrow_changed,
+        )
+
+    def commit(self, changes: Iterable[ForecastChanges]):
+        # 保存先への書き込みが成功した後に呼ぶ
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                for change in changes:
+                    self._commit(change)
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def _commit(self, change: ForecastChanges):
+        area = change.area.value
+        if change.today_frame:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO today_forecast VALUES (?, ?, ?, ?, ?)",
+                (
+                    (area, f"{dt:{DATETIME_FORMAT}}", actual_result, forecast_demand, forecast_supply)
+                    for dt, actual_result, forecast_demand, forecast_supply in change.today_frame.rows()
+                ),
+            )
+            # 古い行は比較に使わないので削除する
+            cutoff = change.today_frame.dt[-1] - self._retention
+            self._connection.execute(
+                "DELETE FROM today_forecast WHERE area = ? AND datetime < ?", (area, f"{cutoff:{DATETIME_FORMAT}}")
+            )
+        if change.tomorrow_changed:
+            tomorrow_forecast = change.forecast.tomorrow_forecast
+            self._connection.execute(
+                "INSERT OR REPLACE INTO tomorrow_forecast VALUES (?, ?, ?)",
+                (area, tomorrow_forecast.date.isoformat(), tomorrow_forecast.model_dump_json()),
+            )
+            cutoff = tomorrow_forecast.date - self._retention
+            self._connection.execute(
+                "DELETE FROM tomorrow_forecast WHERE area = ? AND date < ?", (area, cutoff.isoformat())
+            )
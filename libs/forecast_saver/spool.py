@@ -0,0 +1,171 @@
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from libs.data.forecast import ForecastData
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class SinkState:
+    # 保存先ごとのリトライ状態
+    def __init__(self, attempts: int = 0, next_attempt_at: Optional[datetime] = None, last_error: str = "") -> None:
+        self.attempts = attempts
+        self.next_attempt_at = next_attempt_at
+        self.last_error = last_error
+
+    def __repr__(self) -> str:
+        return (
+            f"SinkState(attempts={self.attempts}, next_attempt_at={self.next_attempt_at},"
+            f" last_error={self.last_error!r})"
+        )
+
+
+class ForecastSpool:
+    # 保存先に書き込む前の ForecastData を SQLite に記録する (write-ahead spool)
+    # エントリは保存先ごとの未配送の行 (pending) を持ち、全ての保存先に配送されたら削除する
+    # 本文は JSON を zlib で圧縮して保持する (tokyo の 1 回分で 1 KB 程度)
+    # day はエントリが表す日 (today_frame の先頭の日)。同じエリア・日の新しいエントリは古いものを置き換える
+    # Lambda では /tmp に置く。途中で失敗しても次の実行で未配送のエントリから再開できる
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS entry ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT, area TEXT NOT NULL, created_at TEXT NOT NULL, body BLOB NOT NULL,"
+        " day TEXT)",
+        "CREATE TABLE IF NOT EXISTS pending ("
+        " sink TEXT NOT NULL, entry_id INTEGER NOT NULL REFERENCES entry (id) ON DELETE CASCADE,"
+        " PRIMARY KEY (sink, entry_id)) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS pending_entry ON pending (entry_id)",
+        "CREATE TABLE IF NOT EXISTS sink ("
+        " name TEXT PRIMARY KEY, attempts INTEGER NOT NULL, next_attempt_at TEXT, last_error TEXT NOT NULL)"
+        " WITHOUT ROWID",
+    )
+
+    def __init__(self, path: str, retention_days: int = 7) -> None:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._retention = timedelta(days=retention_days)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA foreign_keys=ON")
+            for statement in self.SCHEMA:
+                self._connection.execute(statement)
+            # day 列がない以前の spool (既存のエントリは置き換えの対象にしない)
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(entry)")}
+            if "day" not in columns:
+                self._connection.execute("ALTER TABLE entry ADD COLUMN day TEXT")
+
+    def close(self):
+        self._connection.close()
+
+    @staticmethod
+    def encode(forecast: ForecastData) -> bytes:
+        return zlib.compress(forecast.model_dump_json().encode())
+
+    @staticmethod
+    def decode(body: bytes) -> ForecastData:
+        return ForecastData.model_validate_json(zlib.decompress(body))
+
+    @staticmethod
+    def day(forecast: ForecastData) -> Optional[str]:
+        frame = forecast.today_frame
+        return frame.dt[0].date().isoformat() if frame else None
+
+    def _transaction(self, statements):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._connection)
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return result
+
+    def append(self, forecasts: Iterable[ForecastData], sinks: Iterable[str], now: datetime) -> List[int]:
+        # 保存先に書き込む前に呼ぶ。COMMIT した時点で、以降の失敗ではデータを失わない
+        bodies = [(forecast.area.value, self.day(forecast), self.encode(forecast)) for forecast in forecasts]
+        sinks = list(sinks)
+
+        def statements(connection: sqlite3.Connection) -> List[int]:
+            entry_ids = []
+            for area, day, body in bodies:
+                cursor = connection.execute(
+                    "INSERT INTO entry (area, created_at, body, day) VALUES (?, ?, ?, ?)",
+                    (area, f"{now:{DATETIME_FORMAT}}", body, day),
+                )
+                entry_ids.append(cursor.lastrowid)
+            connection.executemany(
+                "INSERT INTO pending VALUES (?, ?)", ((sink, entry_id) for entry_id in entry_ids for sink in sinks)
+            )
+            return entry_ids
+
+        return self._transaction(statements)
+
+    def pending(self, sink: str) -> List[Tuple[int, str, Optional[str]]]:
+        # 未配送のエントリの (id, area, day) を古い順に返す
+        with self._lock:
+            return self._connection.execute(
+                "SELECT entry.id, entry.area, entry.day FROM pending JOIN entry ON entry.id = pending.entry_id"
+                " WHERE pending.sink = ? ORDER BY entry.id",
+                (sink,),
+            ).fetchall()
+
+    def load(self, entry_ids: List[int]) -> List[ForecastData]:
+        with self._lock:
+            rows = dict(
+                self._connection.execute(
+                    f"SELECT id, body FROM entry WHERE id IN ({', '.join('?' * len(entry_ids))})", entry_ids
+                ).fetchall()
+            )
+        return [self.decode(rows[entry_id]) for entry_id in entry_ids]
+
+    def delivered(self, sink: str, entry_ids: List[int]):
+        def statements(connection: sqlite3.Connection):
+            connection.executemany(
+                "DELETE FROM pending WHERE sink = ? AND entry_id = ?", ((sink, i) for i in entry_ids)
+            )
+            # 全ての保存先に配送されたエントリを削除する
+            connection.execute("DELETE FROM entry WHERE id NOT IN (SELECT entry_id FROM pending)")
+
+        self._transaction(statements)
+
+    def sink_state(self, sink: str) -> SinkState:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT attempts, next_attempt_at, last_error FROM sink WHERE name = ?", (sink,)
+            ).fetchone()
+        if row is None:
+            return SinkState()
+        attempts, next_attempt_at, last_error = row
+        return SinkState(
+            attempts=attempts,
+            next_attempt_at=datetime.strptime(next_attempt_at, DATETIME_FORMAT) if next_attempt_at else None,
+            last_error=last_error,
+        )
+
+    def set_sink_state(self, sink: str, state: SinkState):
+        next_attempt_at = f"{state.next_attempt_at:{DATETIME_FORMAT}}" if state.next_attempt_at else None
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sink VALUES (?, ?, ?, ?)",
+                (sink, state.attempts, next_attempt_at, state.last_error),
+            )
+
+    def purge(self, now: datetime, sinks: Iterable[str]) -> int:
+        # 保存先の設定から外れたものと、保持期間を過ぎたエントリは配送を諦める
+        sinks = list(sinks)
+        cutoff = now - self._retention
+
+        def statements(connection: sqlite3.Connection) -> int:
+            connection.execute(f"DELETE FROM pending WHERE sink NOT IN ({', '.join('?' * len(sinks))})", sinks)
+            connection.execute("DELETE FROM entry WHERE id NOT IN (SELECT entry_id FROM pending)")
+            return connection.execute(
+                "DELETE FROM entry WHERE created_at < ?", (f"{cutoff:{DATETIME_FORMAT}}",)
+            ).rowcount
+
+        return self._transaction(statements)
@@ -0,0 +1,110 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Optional
+
+from libs.forecast_saver.clients import aws_client
+
+
+class ObjectStore(ABC):
+    # パーティションファイルの書き込み先
+    # put は同じキーのファイルを原子的に置き換える (読み手から書きかけのファイルは見えない)
+
+    @abstractmethod
+    def put(self, key: str, body: bytes):
+        pass
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def list(self, prefix: str) -> List[str]:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    def exists(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+class LocalObjectStore(ObjectStore):
+    # ローカルディレクトリ (テストや S3 の代わりにも使う)
+    def __init__(self, root: str) -> None:
+        self._root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self._root / key
+
+    def put(self, key: str, body: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 同じディレクトリに一時ファイルを書いてから rename する
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        return path.read_bytes()
+
+    def list(self, prefix: str) -> List[str]:
+        if not self._root.exists():
+            return []
+        keys = (p.relative_to(self._root).as_posix() for p in self._root.rglob("*") if p.is_file())
+        return sorted(k for k in keys if k.startswith(prefix) and not Path(k).name.startswith("."))
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+
+class S3ObjectStore(ObjectStore):
+    # S3 互換ストレージ (PutObject は 1 オブジェクト単位で原子的)
+    def __init__(self, bucket: str, prefix: str = "", client=None) -> None:
+        self._client = client if client is not None else aws_client("s3")
+        self._bucket = bucket
+        self._prefix = prefix.strip("/")
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}/{key}" if self._prefix else key
+
+    def put(self, key: str, body: bytes):
+        self._client.put_object(Bucket=self._bucket, Key=self._key(key), Body=body)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self._client.get_object(Bucket=self._bucket, Key=self._key(key))
+        except self._client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        paginator = self._client.get_paginator("list_objects_v2")
+        strip = len(self._key(""))
+        for page in paginator.paginate(Bucket=self._bucket, Prefix=self._key(prefix)):
+            keys.extend(obj["Key"][strip:] for obj in page.get("Contents", []))
+        return sorted(keys)
+
+    def delete(self, key: str):
+        self._client.delete_object(Bucket=self._bucket, Key=self._key(key))
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self._bucket, Key=self._key(key))
+        except self._client.exceptions.ClientError:
+            return False
+        return True
@@ -0,0 +1,9 @@
+from .metrics import (  # noqa: F401
+    EmbeddedMetricSink,
+    InMemorySink,
+    MetricRecord,
+    MetricsSink,
+    Recorder,
+    get_recorder,
+    set_recorder,
+)
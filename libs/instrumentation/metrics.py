@@ -0,0 +1,190 @@
+import json
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, TextIO
+
+from libs.constants.area import Area
+
+# stage() の中で実行される処理 (ダウンロードや解析) に area を引き継ぐ
+_current_area: ContextVar[Optional[str]] = ContextVar("metrics_area", default=None)
+
+
+class MetricRecord:
+    def __init__(
+        self,
+        stage: str,
+        area: Optional[str],
+        metrics: Dict[str, float],
+        properties: Dict[str, str],
+    ) -> None:
+        self.stage = stage
+        self.area = area
+        # 数値 (duration_ms / bytes / rows など)
+        self.metrics = metrics
+        # 数値以外の付加情報 (エラー種別など)
+        self.properties = properties
+
+    def __repr__(self) -> str:
+        return f"MetricRecord(stage={self.stage!r}, area={self.area!r}, metrics={self.metrics!r})"
+
+
+class MetricsSink(ABC):
+    @abstractmethod
+    def emit(self, record: MetricRecord):
+        pass
+
+
+class InMemorySink(MetricsSink):
+    # テスト用
+    def __init__(self) -> None:
+        self.records: List[MetricRecord] = []
+        self._lock = threading.Lock()
+
+    def emit(self, record: MetricRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def find(self, stage: str, area: Optional[Area] = None) -> List[MetricRecord]:
+        return [
+            r for r in self.records if r.stage == stage and (area is None or r.area == Area(area).value)
+        ]
+
+
+class EmbeddedMetricSink(MetricsSink):
+    # CloudWatch Embedded Metric Format の JSON を 1 行ずつ出力する (Lambda では標準出力がそのままログになる)
+    UNITS = {
+        "duration_ms": "Milliseconds",
+        "queue_ms": "Milliseconds",
+        "execution_ms": "Milliseconds",
+        "total_ms": "Milliseconds",
+        "bytes": "Bytes",
+        "scanned_bytes": "Bytes",
+        "rows": "Count",
+        "queries": "Count",
+        "partitions": "Count",
+    }
+
+    def __init__(self, namespace: str = "ElectricityForecastCollector", stream: Optional[TextIO] = None) -> None:
+        self._namespace = namespace
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, record: MetricRecord):
+        metrics = [{"Name": name, "Unit": self.UNITS.get(name, "None")} for name in record.metrics]
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {"Namespace": self._namespace, "Dimensions": [["stage", "area"]], "Metrics": metrics}
+                ],
+            },
+            "stage": record.stage,
+            "area": record.area or "all",
+            **record.properties,
+            **record.metrics,
+        }
+        line = json.dumps(document, ensure_ascii=False)
+        with self._lock:
+            print(line, file=self._stream or sys.stdout, flush=True)
+
+
+class _NullStage:
+    # 計測が無効なときに返す (何もしない)
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **metrics: float):
+        pass
+
+    def tag(self, **properties: str):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, recorder: "Recorder", stage: str, area: Optional[Area]) -> None:
+        self._recorder = recorder
+        self._stage = stage
+        self._area = Area(area).value if area is not None else None
+        self._metrics: Dict[str, float] = {}
+        self._properties: Dict[str, str] = {}
+
+    def set(self, **metrics: float):
+        self._metrics.update(metrics)
+
+    def tag(self, **properties: str):
+        self._properties.update(properties)
+
+    def __enter__(self):
+        self._token = _current_area.set(self._area) if self._area is not None else None
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        area = self._area or _current_area.get()
+        if self._token is not None:
+            _current_area.reset(self._token)
+        if exc_type is not None:
+            self._properties["error"] = exc_type.__name__
+        self._recorder.emit(
+            MetricRecord(
+                stage=self._stage,
+                area=area,
+                metrics={"duration_ms": duration_ms, **self._metrics},
+                properties=self._properties,
+            )
+        )
+        return False
+
+
+class Recorder:
+    # ステージ (collect / download / transform.* / save.* / athena.query) ごとの計測値を sinks に送る
+    # sinks が空の場合は計測しない
+    def __init__(self, sinks: Sequence[MetricsSink] = ()) -> None:
+        self._sinks = list(sinks)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._sinks)
+
+    def stage(self, stage: str, area: Optional[Area] = None):
+        if not self._sinks:
+            return _NULL_STAGE
+        return _Stage(self, stage, area)
+
+    def record(self, stage: str, area: Optional[Area] = None, properties: Optional[Dict[str, str]] = None, **metrics):
+        if not self._sinks:
+            return
+        self.emit(
+            MetricRecord(
+                stage=stage,
+                area=Area(area).value if area is not None else _current_area.get(),
+                metrics={k: v for k, v in metrics.items() if v is not None},
+                properties=properties or {},
+            )
+        )
+
+    def emit(self, record: MetricRecord):
+        for sink in self._sinks:
+            sink.emit(record)
+
+
+_recorder = Recorder()
+
+
+def get_recorder() -> Recorder:
+    return _recorder
+
+
+def set_recorder(recorder: Recorder):
+    global _recorder
+    _recorder = recorder
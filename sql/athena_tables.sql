@@ -0,0 +1,49 @@
+-- AthenaSaver が書き込むテーブル (AthenaSaver.TABLE_COLUMNS の列を持つこと)
+-- DELETE を使うので Iceberg テーブルとして作成する。LOCATION は環境に合わせて置き換える
+
+CREATE TABLE IF NOT EXISTS default.today_forecast (
+  datetime timestamp,
+  actual_result int,
+  forecast_demand int,
+  forecast_supply int,
+  area string
+)
+PARTITIONED BY (area)
+LOCATION 's3://<bucket>/<prefix>/today_forecast/'
+TBLPROPERTIES ('table_type' = 'ICEBERG');
+
+CREATE TABLE IF NOT EXISTS default.tomorrow_forecast (
+  date date,
+  demand_peak_time string,
+  demand_peak_supply int,
+  demand_peak_demand int,
+  usage_peak_time string,
+  usage_peak_supply int,
+  usage_peak_demand int,
+  temperature double,
+  area string
+)
+PARTITIONED BY (area)
+LOCATION 's3://<bucket>/<prefix>/tomorrow_forecast/'
+TBLPROPERTIES ('table_type' = 'ICEBERG');
+
+-- AthenaSaver.with_rollups() を使う場合のみ
+CREATE TABLE IF NOT EXISTS default.daily_rollup (
+  date date,
+  hours int,
+  peak_demand int,
+  peak_demand_time timestamp,
+  peak_usage_pc int,
+  peak_usage_time timestamp,
+  min_reserve int,
+  min_reserve_time timestamp,
+  observed_hours int,
+  peak_actual int,
+  mean_abs_error double,
+  max_abs_error int,
+  mean_abs_error_pc double,
+  area string
+)
+PARTITIONED BY (area)
+LOCATION 's3://<bucket>/<prefix>/daily_rollup/'
+TBLPROPERTIES ('table_type' = 'ICEBERG');
@@ -0,0 +1,40 @@
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData, ForecastFrame, TomorrowForecast
+
+
+def make_frame(start: date, days: int = 1, offset: int = 0) -> ForecastFrame:
+    # start から days 日分の 1 時間ごとの行 (offset で値をずらす)
+    dt = [datetime(start.year, start.month, start.day) + timedelta(hours=hour) for hour in range(24 * days)]
+    return ForecastFrame(
+        dt=dt,
+        actual_result=array("i", [2300 + offset + idx % 24 for idx in range(len(dt))]),
+        forecast_demand=array("i", [2350 + offset + idx % 24 for idx in range(len(dt))]),
+        forecast_supply=array("i", [2800 + offset + idx % 24 for idx in range(len(dt))]),
+    )
+
+
+def make_tomorrow(target_date: date, temperature: float = 19.0) -> TomorrowForecast:
+    return TomorrowForecast(
+        date=target_date,
+        demand_peak_time="18:00〜19:00",
+        demand_peak_supply=3425,
+        demand_peak_demand=2768,
+        usage_peak_time="17:00〜18:00",
+        usage_peak_supply=3340,
+        usage_peak_demand=2728,
+        temperature=temperature,
+    )
+
+
+def make_forecast(
+    area: Area = Area.tokyo,
+    start: date = date(2023, 1, 1),
+    days: int = 1,
+    offset: int = 0,
+    tomorrow: Optional[TomorrowForecast] = None,
+) -> ForecastData:
+    return ForecastData(area=area, today_frame=make_frame(start, days, offset), tomorrow_forecast=tomorrow)
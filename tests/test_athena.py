@@ -0,0 +1,71 @@
+import pytest
+
+from benchmarks.stubs import StubAthenaClient
+from libs.forecast_saver import AthenaQueryError, AthenaSaver
+from libs.forecast_saver.athena import FAILED, SKIPPED, SUCCEEDED, AthenaQueryPipeline
+from tests.factories import make_forecast
+
+
+def pipeline(client: StubAthenaClient) -> AthenaQueryPipeline:
+    return AthenaQueryPipeline(client=client, initial_interval=0, sleep=lambda _: None)
+
+
+def test_independent_queries_are_started_on_submit():
+    client = StubAthenaClient()
+    queries = pipeline(client)
+    first = queries.submit("DELETE FROM a")
+    second = queries.submit("DELETE FROM b")
+    assert first.submitted and second.submitted
+    assert client.queries == ["DELETE FROM a", "DELETE FROM b"]
+
+
+def test_dependent_query_waits_for_its_dependency():
+    client = StubAthenaClient()
+    queries = pipeline(client)
+    delete = queries.submit("DELETE FROM a")
+    insert = queries.submit("INSERT INTO a VALUES (1)", after=[delete])
+    assert not insert.submitted
+    handles = queries.wait()
+    assert [h.state for h in handles] == [SUCCEEDED, SUCCEEDED]
+    assert client.queries == ["DELETE FROM a", "INSERT INTO a VALUES (1)"]
+
+
+def test_failed_delete_skips_the_dependent_insert():
+    client = StubAthenaClient(states={"DELETE": FAILED})
+    queries = pipeline(client)
+    delete = queries.submit("DELETE FROM a")
+    insert = queries.submit("INSERT INTO a VALUES (1)", after=[delete])
+    other = queries.submit("INSERT INTO b VALUES (1)")
+    queries.wait()
+    assert delete.state == FAILED
+    assert insert.state == SKIPPED
+    assert not insert.submitted
+    # 依存関係のないクエリは影響を受けない
+    assert other.state == SUCCEEDED
+    assert "INSERT INTO a VALUES (1)" not in client.queries
+
+
+def test_saver_raises_with_the_failed_and_skipped_queries():
+    client = StubAthenaClient(states={"DELETE": FAILED})
+    saver = AthenaSaver(client=client).with_poll_interval(0, 0)
+    with pytest.raises(AthenaQueryError) as e:
+        saver.run_batch([make_forecast()])
+    assert {h.state for h in e.value.handles} == {FAILED, SKIPPED}
+    assert not any(query.startswith("INSERT") for query in client.queries)
+
+
+def test_status_is_polled_in_batches():
+    client = StubAthenaClient()
+    calls = []
+    batch_get_query_execution = client.batch_get_query_execution
+
+    def record(QueryExecutionIds):
+        calls.append(len(QueryExecutionIds))
+        return batch_get_query_execution(QueryExecutionIds)
+
+    client.batch_get_query_execution = record
+    queries = pipeline(client)
+    for idx in range(AthenaQueryPipeline.BATCH_SIZE + 10):
+        queries.submit(f"INSERT INTO a VALUES ({idx})")
+    assert all(h.succeeded for h in queries.wait())
+    assert calls == [AthenaQueryPipeline.BATCH_SIZE, 10]
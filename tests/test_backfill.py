@@ -0,0 +1,138 @@
+import threading
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+import pytest
+
+from benchmarks.stubs import StubHTTPServer
+from libs.constants.area import Area
+from libs.forecast_collector import Backfill
+from libs.forecast_collector.backfill import HostRateLimiter
+from libs.forecast_collector.base import Collector, DataDownloader, DataTransformer
+from libs.forecast_collector.fetch import FetchPolicy, reset_circuit_breakers
+from libs.forecast_saver.saver import Saver
+from tests.factories import make_forecast
+
+AREA = Area.tokyo
+START = date(2023, 1, 1)
+END = date(2023, 1, 5)
+DAYS = [START + timedelta(days=offset) for offset in range(5)]
+
+
+class DatedDownloader(DataDownloader):
+    AREA = AREA
+    ENCODING = "ascii"
+
+    def __init__(self, url: str) -> None:
+        self._url = url
+
+    def run(self) -> str:
+        return self._fetch(f"{self._url}{self.target_date.isoformat()}.csv")
+
+
+class DatedTransformer(DataTransformer):
+    def run(self, raw_data: str):
+        return make_forecast(AREA, start=self.target_date)
+
+
+class RecordingSaver(Saver):
+    # 保存した日付を記録する (fail_after 件保存した後は失敗する)
+    def __init__(self, fail_after: Optional[int] = None) -> None:
+        self.fail_after = fail_after
+        self.saved = []
+
+    def run(self, structured_data):
+        if self.fail_after is not None and len(self.saved) >= self.fail_after:
+            raise RuntimeError("saver is down")
+        self.saved.append(structured_data.today_frame.dt[0].date())
+
+
+@pytest.fixture
+def server():
+    reset_circuit_breakers()
+    with StubHTTPServer(b"DATE,TIME,VALUE\r\n") as server:
+        yield server
+    reset_circuit_breakers()
+
+
+def backfill(server: StubHTTPServer, **options) -> Backfill:
+    policy = FetchPolicy(deadline=5, retries=0)
+
+    def collector(session, cache, target_date):
+        downloader = DatedDownloader(server.url).with_session(session).with_cache(cache).with_fetch_policy(policy)
+        return Collector(downloader.with_target_date(target_date), DatedTransformer().with_target_date(target_date))
+
+    options = {"max_workers": 1, "rate_limit": 0, "batch_size": 1, **options}
+    return (
+        Backfill(AREA, collector)
+        .with_max_workers(options["max_workers"])
+        .with_rate_limit(options["rate_limit"])
+        .with_batch_size(options["batch_size"])
+    )
+
+
+def test_each_day_is_fetched_and_saved_for_its_own_date(server):
+    saver = RecordingSaver()
+    result = backfill(server, max_workers=3, batch_size=2).run(START, END, saver)
+    assert sorted(result.saved) == DAYS
+    assert sorted(saver.saved) == DAYS
+    assert sorted(server.paths) == [f"/{day.isoformat()}.csv" for day in DAYS]
+    assert result.errors == {}
+
+
+def test_failed_day_does_not_stop_the_others(server):
+    # 取得は日付順 (max_workers=1) なので 2 日目が失敗する
+    server.faults = [("ok", 0), ("error", 404)]
+    saver = RecordingSaver()
+    result = backfill(server).run(START, END, saver)
+    assert list(result.errors) == [DAYS[1]]
+    assert result.saved == DAYS[:1] + DAYS[2:]
+    assert saver.saved == result.saved
+
+
+def test_interrupted_run_resumes_from_the_checkpoint(server, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    with pytest.raises(RuntimeError, match="saver is down"):
+        backfill(server).with_checkpoint(checkpoint).run(START, END, RecordingSaver(fail_after=2))
+
+    server.paths.clear()
+    saver = RecordingSaver()
+    result = backfill(server).with_checkpoint(checkpoint).run(START, END, saver)
+    assert result.skipped == DAYS[:2]
+    assert result.saved == DAYS[2:]
+    assert server.paths == [f"/{day.isoformat()}.csv" for day in DAYS[2:]]
+
+    # 全て終わっていれば取得しない
+    server.paths.clear()
+    result = backfill(server).with_checkpoint(checkpoint).run(START, END, RecordingSaver())
+    assert result.skipped == DAYS
+    assert server.paths == []
+
+
+def test_requests_to_the_host_are_rate_limited(server):
+    start = time.perf_counter()
+    result = backfill(server, max_workers=4, rate_limit=0.1).run(START, END, RecordingSaver())
+    # 4 本並行していても、同じホストへのリクエストは 0.1 秒ずつあける
+    assert time.perf_counter() - start >= 0.4
+    assert len(result.saved) == 5
+
+
+def test_rate_limiter_is_per_host():
+    limiter = HostRateLimiter(0.2)
+    acquired = []
+
+    def acquire(host):
+        limiter.acquire(host)
+        acquired.append((host, time.perf_counter()))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=acquire, args=(host,)) for host in ["a", "a", "b"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = {host: [t - start for h, t in acquired if h == host] for host in ["a", "b"]}
+    assert max(elapsed["b"]) < 0.1
+    assert sorted(elapsed["a"])[0] < 0.1
+    assert sorted(elapsed["a"])[1] >= 0.2
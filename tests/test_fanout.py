@@ -0,0 +1,257 @@
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData
+from libs.forecast_saver import FanOutSaver, ForecastSpool
+from libs.forecast_saver.saver import Saver
+from tests.factories import make_forecast
+
+NOW = datetime(2023, 1, 1, 12, 0)
+# 失敗した保存先のリトライの待機 (最大 1 時間) が明けた後
+LATER = NOW + timedelta(hours=2)
+
+
+class RecordingSaver(Saver):
+    # run_batch に渡されたエントリを記録する (fail が True の間は失敗する)
+    def __init__(self) -> None:
+        self.fail = False
+        self.batches = []
+
+    def run_batch(self, forecasts):
+        forecasts = list(forecasts)
+        if self.fail:
+            raise RuntimeError("sink is down")
+        self.batches.append([(f.area, f.today_frame.dt[0].date(), f.today_frame.actual_result[0]) for f in forecasts])
+
+    def run(self, structured_data: ForecastData):
+        self.run_batch([structured_data])
+
+
+@pytest.fixture
+def spool():
+    spool = ForecastSpool(":memory:")
+    yield spool
+    spool.close()
+
+
+def fan_out(spool: ForecastSpool, **sinks: Saver) -> FanOutSaver:
+    return FanOutSaver(sinks, spool).with_clock(lambda: NOW)
+
+
+def pending_ids(spool: ForecastSpool, sink: str):
+    return [entry_id for entry_id, _, _ in spool.pending(sink)]
+
+
+def test_spool_round_trip(spool):
+    forecast = make_forecast()
+    entry_ids = spool.append([forecast], ["a", "b"], NOW)
+    assert spool.load(entry_ids) == [forecast]
+    spool.delivered("a", entry_ids)
+    # 他の保存先に配送されるまではエントリを残す
+    assert spool.load(entry_ids) == [forecast]
+    spool.delivered("b", entry_ids)
+    assert spool.pending("b") == []
+    assert spool._connection.execute("SELECT count(*) FROM entry").fetchone() == (0,)
+
+
+def test_failing_sink_keeps_pending_entries_and_backoff(spool):
+    failing, healthy = RecordingSaver(), RecordingSaver()
+    failing.fail = True
+    saver = fan_out(spool, failing=failing, healthy=healthy).with_backoff(timedelta(minutes=1), timedelta(hours=1))
+    result = saver.run_batch([make_forecast()])
+
+    # 他の保存先は配送できる
+    assert result.delivered == {"healthy": 1}
+    assert healthy.batches == [[(Area.tokyo, date(2023, 1, 1), 2300)]]
+    assert isinstance(result.errors["failing"], RuntimeError)
+    assert not result.ok
+    assert pending_ids(spool, "failing") == [1]
+    assert pending_ids(spool, "healthy") == []
+
+    state = spool.sink_state("failing")
+    assert state.attempts == 1
+    assert NOW + timedelta(seconds=30) <= state.next_attempt_at <= NOW + timedelta(minutes=1)
+    assert "sink is down" in state.last_error
+
+
+def test_sink_is_not_retried_during_backoff(spool):
+    failing = RecordingSaver()
+    failing.fail = True
+    saver = fan_out(spool, failing=failing)
+    saver.run_batch([make_forecast()])
+    failing.fail = False
+    result = saver.with_clock(lambda: NOW + timedelta(seconds=10)).replay()
+    assert result.deferred == ["failing"]
+    assert failing.batches == []
+    assert pending_ids(spool, "failing") == [1]
+
+
+def test_backoff_grows_and_resets_on_success(spool):
+    failing = RecordingSaver()
+    failing.fail = True
+    saver = fan_out(spool, failing=failing).with_backoff(timedelta(minutes=1), timedelta(minutes=3))
+    saver.run_batch([make_forecast()])
+    for attempt in (2, 3, 4):
+        now = spool.sink_state("failing").next_attempt_at
+        saver.with_clock(lambda: now).replay()
+        state = spool.sink_state("failing")
+        assert state.attempts == attempt
+        # 待ち時間は上限 (3 分) を超えない
+        assert now + timedelta(seconds=30) <= state.next_attempt_at <= now + timedelta(minutes=3)
+    failing.fail = False
+    saver.with_clock(lambda: LATER).replay()
+    assert spool.sink_state("failing").attempts == 0
+    assert spool.pending("failing") == []
+
+
+def test_replay_delivers_oldest_first_one_entry_per_area_per_batch(spool):
+    sink = RecordingSaver()
+    sink.fail = True
+    saver = fan_out(spool, sink=sink)
+    saver.run_batch([make_forecast(Area.tokyo, date(2023, 1, 1)), make_forecast(Area.hokkaido, date(2023, 1, 1))])
+    saver.run_batch([make_forecast(Area.tokyo, date(2023, 1, 2))])
+    saver.run_batch([make_forecast(Area.tokyo, date(2023, 1, 3)), make_forecast(Area.hokkaido, date(2023, 1, 2))])
+    sink.fail = False
+    result = saver.with_clock(lambda: LATER).replay()
+
+    assert result.delivered == {"sink": 5}
+    assert [[(area, day) for area, day, _ in batch] for batch in sink.batches] == [
+        [(Area.tokyo, date(2023, 1, 1)), (Area.hokkaido, date(2023, 1, 1))],
+        [(Area.tokyo, date(2023, 1, 2)), (Area.hokkaido, date(2023, 1, 2))],
+        [(Area.tokyo, date(2023, 1, 3))],
+    ]
+
+
+def test_failure_mid_replay_keeps_the_rest(spool):
+    class FailOnSecondBatch(RecordingSaver):
+        def run_batch(self, forecasts):
+            self.fail = len(self.batches) == 1
+            super().run_batch(forecasts)
+
+    sink = FailOnSecondBatch()
+    spool.append([make_forecast(start=date(2023, 1, 1)), make_forecast(start=date(2023, 1, 2))], ["sink"], NOW)
+    result = fan_out(spool, sink=sink).replay()
+    assert "sink" in result.errors
+    # 配送できたバッチは配送済みになり、残りは次回に再送する
+    assert [day for _, _, day in spool.pending("sink")] == ["2023-01-02"]
+
+
+def test_slow_sink_is_deferred(spool):
+    release = threading.Event()
+
+    class SlowSaver(RecordingSaver):
+        def run_batch(self, forecasts):
+            release.wait(5)
+            super().run_batch(forecasts)
+
+    slow, healthy = SlowSaver(), RecordingSaver()
+    saver = fan_out(spool, slow=slow, healthy=healthy).with_timeout(0.2)
+    result = saver.run_batch([make_forecast()])
+    assert result.deferred == ["slow"]
+    assert result.delivered == {"healthy": 1}
+    assert pending_ids(spool, "slow") == [1]
+
+    # 前回の配送が終わるまで同じ保存先には書き込まない
+    assert saver.replay().deferred == ["slow"]
+    release.set()
+    for _ in range(50):
+        if not spool.pending("slow"):
+            break
+        threading.Event().wait(0.05)
+    assert spool.pending("slow") == []
+    assert len(slow.batches) == 1
+
+
+def test_purge_removes_expired_entries_and_removed_sinks():
+    spool = ForecastSpool(":memory:", retention_days=7)
+    old = spool.append([make_forecast(start=date(2022, 12, 20))], ["a", "b"], NOW - timedelta(days=8))
+    new = spool.append([make_forecast()], ["a", "b"], NOW)
+
+    assert spool.purge(NOW, ["a", "b"]) == 1
+    assert pending_ids(spool, "a") == new
+    assert pending_ids(spool, "b") == new
+    with pytest.raises(KeyError):
+        spool.load(old)
+
+    # 保存先の設定から外れた保存先の未配送分は削除し、どこにも配送されないエントリも削除する
+    spool.purge(NOW, ["a"])
+    assert spool.pending("b") == []
+    assert pending_ids(spool, "a") == new
+    spool.purge(NOW, ["c"])
+    assert spool._connection.execute("SELECT count(*) FROM entry").fetchone() == (0,)
+    spool.close()
+
+
+def test_spool_survives_a_restart(tmp_path):
+    path = str(tmp_path / "spool.sqlite3")
+    failing = RecordingSaver()
+    failing.fail = True
+    spool = ForecastSpool(path)
+    fan_out(spool, sink=failing).run_batch([make_forecast()])
+    spool.close()
+
+    spool = ForecastSpool(path)
+    sink = RecordingSaver()
+    assert spool.sink_state("sink").attempts == 1
+    assert fan_out(spool, sink=sink).with_clock(lambda: LATER).replay().delivered == {"sink": 1}
+    assert sink.batches == [[(Area.tokyo, date(2023, 1, 1), 2300)]]
+    spool.close()
+
+
+def test_newest_entry_per_area_and_day_is_delivered(spool):
+    sink = RecordingSaver()
+    saver = fan_out(spool, sink=sink)
+    sink.fail = True
+    for offset in range(3):
+        saver.run_batch([make_forecast(Area.tokyo, offset=offset), make_forecast(Area.hokkaido, offset=offset)])
+    sink.fail = False
+
+    result = saver.with_clock(lambda: LATER).replay()
+    # 同じエリア・日の古いエントリは最新のエントリに置き換えられる
+    assert sink.batches == [[(Area.tokyo, date(2023, 1, 1), 2302), (Area.hokkaido, date(2023, 1, 1), 2302)]]
+    assert result.delivered == {"sink": 2}
+    assert spool.pending("sink") == []
+
+
+def test_entries_for_different_days_are_all_delivered(spool):
+    sink = RecordingSaver()
+    sink.fail = True
+    saver = fan_out(spool, sink=sink)
+    saver.run_batch([make_forecast(start=date(2023, 1, 1)), make_forecast(start=date(2023, 1, 2))])
+    sink.fail = False
+    saver.with_clock(lambda: LATER).replay()
+    assert [[day for _, day, _ in batch] for batch in sink.batches] == [[date(2023, 1, 1)], [date(2023, 1, 2)]]
+
+
+def test_superseded_entries_are_kept_for_other_sinks(spool):
+    failing, healthy = RecordingSaver(), RecordingSaver()
+    failing.fail = True
+    saver = fan_out(spool, failing=failing, healthy=healthy)
+    saver.run_batch([make_forecast(offset=0)])
+    saver.run_batch([make_forecast(offset=1)])
+    assert len(healthy.batches) == 2
+    # 失敗している保存先には両方が残り、再送時には最新のものだけを配送する
+    assert [entry_id for entry_id, _, _ in spool.pending("failing")] == [1, 2]
+    failing.fail = False
+    saver.with_clock(lambda: LATER).replay()
+    assert failing.batches == [[(Area.tokyo, date(2023, 1, 1), 2301)]]
+
+
+def test_spool_without_day_column_is_migrated(tmp_path):
+    path = str(tmp_path / "spool.sqlite3")
+    spool = ForecastSpool(path)
+    spool._connection.execute("DROP TABLE pending")
+    spool._connection.execute("DROP TABLE entry")
+    spool._connection.execute(
+        "CREATE TABLE entry ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT, area TEXT NOT NULL, created_at TEXT NOT NULL, body BLOB NOT NULL)"
+    )
+    spool.close()
+
+    spool = ForecastSpool(path)
+    spool.append([make_forecast()], ["sink"], NOW)
+    assert spool.pending("sink") == [(1, "tokyo", "2023-01-01")]
+    spool.close()
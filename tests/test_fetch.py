@@ -0,0 +1,200 @@
+import time
+
+import pytest
+import requests
+
+from benchmarks.stubs import StubHTTPServer
+from libs.constants.area import Area
+from libs.forecast_collector import base
+from libs.forecast_collector.base import DataDownloader
+from libs.forecast_collector.fetch import (
+    CircuitBreaker,
+    CircuitOpen,
+    DeadlineExceeded,
+    FetchPolicy,
+    reset_circuit_breakers,
+)
+
+BODY = b"DATE,TIME,VALUE\r\n" * 20
+
+
+class StubDownloader(DataDownloader):
+    ENCODING = "ascii"
+
+    def __init__(self, url: str) -> None:
+        self._url = url
+
+    def run(self) -> str:
+        return self._fetch(self._url)
+
+
+@pytest.fixture(autouse=True)
+def breakers():
+    reset_circuit_breakers()
+    yield
+    reset_circuit_breakers()
+
+
+@pytest.fixture
+def server():
+    with StubHTTPServer(BODY) as server:
+        yield server
+
+
+def download(server: StubHTTPServer, **policy) -> str:
+    policy.setdefault("backoff_base", 0.05)
+    return StubDownloader(server.url).with_fetch_policy(FetchPolicy(**policy)).run()
+
+
+def test_healthy_source_is_fetched_once(server):
+    assert download(server, deadline=5) == BODY.decode()
+    assert server.requests == 1
+
+
+def test_transient_errors_are_retried(server):
+    server.faults = [("error", 503), ("error", 503)]
+    assert download(server, deadline=5) == BODY.decode()
+    assert server.requests == 3
+
+
+def test_retries_are_bounded(server):
+    server.faults = [("error", 503)] * 5
+    with pytest.raises(requests.HTTPError):
+        download(server, deadline=5, retries=2)
+    assert server.requests == 3
+
+
+def test_client_errors_are_not_retried(server):
+    server.faults = [("error", 404)] * 5
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            download(server, deadline=5)
+    # 取得元は応答しているのでサーキットブレーカーは開かない
+    assert server.requests == 3
+
+
+def test_stalled_headers_time_out_and_retry(server):
+    server.faults = [("delay", 3)]
+    assert download(server, deadline=5, read_timeout=0.3) == BODY.decode()
+    assert server.requests == 2
+
+
+def test_trickling_body_is_cut_at_the_deadline(server):
+    server.faults = [("trickle", 0.05)] * 3
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        download(server, deadline=0.5, read_timeout=3)
+    assert time.perf_counter() - start < 1.5
+    # 持ち時間を使い切っているのでリトライしない
+    assert server.requests == 1
+
+
+def test_hedged_request_wins_over_a_slow_one(server):
+    server.faults = [("delay", 1.5)]
+    start = time.perf_counter()
+    assert download(server, deadline=5, read_timeout=3, hedge_after=0.2) == BODY.decode()
+    assert time.perf_counter() - start < 1.0
+    assert server.requests == 2
+
+
+def test_no_hedge_for_a_fast_response(server):
+    assert download(server, deadline=5, hedge_after=0.5) == BODY.decode()
+    assert server.requests == 1
+
+
+def test_circuit_opens_after_three_failures(server):
+    server.faults = [("error", 500)] * 10
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            download(server, deadline=5, retries=0)
+    with pytest.raises(CircuitOpen):
+        download(server, deadline=5, retries=0)
+    assert server.requests == 3
+
+
+def test_circuit_half_open_trial():
+    now = [0.0]
+    breaker = CircuitBreaker("stub", failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_request()
+
+    now[0] = 10.0
+    # 1 回だけ試し、その結果が出るまでは他のリクエストを通さない
+    breaker.before_request()
+    with pytest.raises(CircuitOpen):
+        breaker.before_request()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_request()
+
+    now[0] = 20.0
+    breaker.before_request()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.before_request()
+
+
+SJIS_BODY = "DATE,TIME,当日実績(万kW)\r\n2023/10/21,0:00,2300\r\n".encode("cp932") * 20
+
+
+class DetectingDownloader(StubDownloader):
+    ENCODING = None
+
+
+@pytest.fixture
+def detections(monkeypatch):
+    # 判定結果はエリアごとに覚えるので、テストごとに消して判定の回数を数える
+    monkeypatch.setattr(base, "_DETECTED_ENCODINGS", {})
+    samples = []
+
+    def detect(sample):
+        samples.append(sample)
+        return {"encoding": "cp932"}
+
+    monkeypatch.setattr(base.chardet, "detect", detect)
+    return samples
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_declared_encoding_is_used_without_detection(detections, stream):
+    class Cp932Downloader(StubDownloader):
+        ENCODING = "cp932"
+        CHUNK_SIZE = 7
+
+    with StubHTTPServer(SJIS_BODY) as server:
+        assert Cp932Downloader(server.url).with_stream(stream).run() == SJIS_BODY.decode("cp932")
+    assert detections == []
+
+
+def test_multibyte_characters_split_across_chunks(detections):
+    class SmallChunkDownloader(DetectingDownloader):
+        CHUNK_SIZE = 3
+
+    with StubHTTPServer(SJIS_BODY) as server:
+        assert SmallChunkDownloader(server.url).run() == SJIS_BODY.decode("cp932")
+    # 判定には先頭のチャンクだけを使う
+    assert detections == [SJIS_BODY[:3]]
+
+
+def test_undeclared_encoding_is_detected_once_per_area(detections):
+    class TokyoDownloader(DetectingDownloader):
+        AREA = Area.tokyo
+
+    class KansaiDownloader(DetectingDownloader):
+        AREA = Area.kansai
+
+    with StubHTTPServer(SJIS_BODY) as server:
+        for _ in range(2):
+            assert TokyoDownloader(server.url).run() == SJIS_BODY.decode("cp932")
+        assert KansaiDownloader(server.url).with_stream(False).run() == SJIS_BODY.decode("cp932")
+    assert len(detections) == 2
+    assert base._DETECTED_ENCODINGS == {Area.tokyo: "cp932", Area.kansai: "cp932"}
+
+
+def test_detection_falls_back_to_utf8(monkeypatch):
+    monkeypatch.setattr(base, "_DETECTED_ENCODINGS", {})
+    monkeypatch.setattr(base.chardet, "detect", lambda sample: {"encoding": None})
+    with StubHTTPServer("日付".encode()) as server:
+        assert DetectingDownloader(server.url).run() == "日付"
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from libs.data.forecast import ActualResultSeries
+
+MISSING = ActualResultSeries.MISSING
+START = datetime(2023, 10, 21)
+FIVE_MINUTES = timedelta(minutes=5)
+
+
+def series(values, start=START, interval=FIVE_MINUTES) -> ActualResultSeries:
+    return ActualResultSeries(start=start, interval=interval, values=values)
+
+
+def test_resample_averages_each_chunk():
+    hourly = series(list(range(2300, 2324))).resample(timedelta(hours=1))
+    assert hourly.interval == timedelta(hours=1)
+    assert hourly.start == START
+    # 2300..2311 と 2312..2323 の平均 (切り捨て)
+    assert hourly.values.tolist() == [2305, 2317]
+
+
+def test_resample_skips_missing_values():
+    values = [2300, MISSING, 2310, MISSING] + [MISSING] * 4 + [2400, 2401, 2402, MISSING]
+    assert series(values).resample(timedelta(minutes=20)).values.tolist() == [2305, MISSING, 2401]
+
+
+def test_resample_keeps_a_short_last_chunk():
+    assert series([2300] * 12 + [2400, 2410]).hourly().values.tolist() == [2300, 2405]
+
+
+@pytest.mark.parametrize("interval", [timedelta(minutes=7), timedelta(minutes=1), timedelta(0)])
+def test_resample_rejects_non_multiple_intervals(interval):
+    with pytest.raises(ValueError, match="multiple"):
+        series([2300] * 12).resample(interval)
+
+
+def test_peak():
+    assert series([2300, 2450, MISSING, 2450, 2400]).peak() == (START + FIVE_MINUTES, 2450)
+    assert series([MISSING, MISSING]).peak() is None
+    assert series([]).peak() is None
+
+
+def test_observed_count_and_end():
+    values = series([2300, MISSING, 2310])
+    assert values.observed_count() == 2
+    assert values.end == START + FIVE_MINUTES * 3
+
+
+def test_concat_joins_contiguous_series():
+    first = series([2300, 2310])
+    second = series([2320], start=first.end)
+    joined = ActualResultSeries.concat([first, second])
+    assert joined.start == START
+    assert joined.values.tolist() == [2300, 2310, 2320]
+
+
+def test_concat_rejects_gaps_and_mismatched_intervals():
+    first = series([2300, 2310])
+    with pytest.raises(ValueError, match="contiguous"):
+        ActualResultSeries.concat([first, series([2320], start=first.end + FIVE_MINUTES)])
+    with pytest.raises(ValueError, match="interval"):
+        ActualResultSeries.concat([first, series([2320], start=first.end, interval=timedelta(minutes=10))])
+    with pytest.raises(ValueError, match="empty"):
+        ActualResultSeries.concat([])
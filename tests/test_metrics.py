@@ -0,0 +1,103 @@
+import contextvars
+import io
+import json
+import threading
+
+import pytest
+
+from libs.constants.area import Area
+from libs.instrumentation import EmbeddedMetricSink, InMemorySink, MetricRecord, Recorder, get_recorder, set_recorder
+from libs.instrumentation.metrics import _NULL_STAGE
+
+
+@pytest.fixture
+def sink():
+    sink = InMemorySink()
+    set_recorder(Recorder(sinks=[sink]))
+    yield sink
+    set_recorder(Recorder())
+
+
+def test_stage_records_duration_metrics_and_tags(sink):
+    with get_recorder().stage("download", area=Area.tokyo) as metrics:
+        metrics.set(bytes=100)
+        metrics.tag(status="200")
+    (record,) = sink.find("download", Area.tokyo)
+    assert record.area == "tokyo"
+    assert record.metrics["bytes"] == 100
+    assert record.metrics["duration_ms"] >= 0
+    assert record.properties == {"status": "200"}
+
+
+def test_area_is_inherited_by_nested_stages_and_records(sink):
+    recorder = get_recorder()
+    with recorder.stage("collect", area=Area.kansai):
+        with recorder.stage("transform"):
+            recorder.record("download.retry", attempt=1, ignored=None)
+    with recorder.stage("save"):
+        pass
+    assert sink.find("transform")[0].area == "kansai"
+    (retry,) = sink.find("download.retry", Area.kansai)
+    assert retry.metrics == {"attempt": 1}
+    # stage を抜けたら引き継がない
+    assert sink.find("save")[0].area is None
+
+
+def test_area_is_inherited_by_threads_running_in_the_context(sink):
+    recorder = get_recorder()
+
+    def download():
+        with recorder.stage("download"):
+            pass
+
+    with recorder.stage("collect", area=Area.chubu):
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(download,))
+        thread.start()
+        thread.join()
+    assert sink.find("download")[0].area == "chubu"
+
+
+def test_failed_stage_records_the_error(sink):
+    with pytest.raises(ValueError):
+        with get_recorder().stage("transform", area=Area.tokyo):
+            raise ValueError("broken")
+    assert sink.find("transform")[0].properties == {"error": "ValueError"}
+
+
+def test_disabled_recorder_returns_the_null_stage():
+    recorder = Recorder()
+    assert not recorder.enabled
+    with recorder.stage("download", area=Area.tokyo) as metrics:
+        assert metrics is _NULL_STAGE
+        metrics.set(bytes=100)
+        metrics.tag(status="200")
+    recorder.record("download.retry", attempt=1)
+
+
+def test_embedded_metric_format():
+    stream = io.StringIO()
+    sink = EmbeddedMetricSink(namespace="Test", stream=stream)
+    sink.emit(MetricRecord("download", "tokyo", {"duration_ms": 12.5, "bytes": 100, "custom": 1}, {"status": "200"}))
+    sink.emit(MetricRecord("save.athena", None, {"rows": 24}, {}))
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    (directive,) = first["_aws"]["CloudWatchMetrics"]
+    assert isinstance(first["_aws"]["Timestamp"], int)
+    assert directive["Namespace"] == "Test"
+    assert directive["Dimensions"] == [["stage", "area"]]
+    assert directive["Metrics"] == [
+        {"Name": "duration_ms", "Unit": "Milliseconds"},
+        {"Name": "bytes", "Unit": "Bytes"},
+        {"Name": "custom", "Unit": "None"},
+    ]
+    assert {key: first[key] for key in ("stage", "area", "status", "duration_ms", "bytes", "custom")} == {
+        "stage": "download",
+        "area": "tokyo",
+        "status": "200",
+        "duration_ms": 12.5,
+        "bytes": 100,
+        "custom": 1,
+    }
+    # エリアのない計測値は "all" にまとめる
+    assert second["area"] == "all"
+    assert second["rows"] == 24
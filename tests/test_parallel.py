@@ -0,0 +1,88 @@
+import threading
+import time
+
+import requests
+
+from libs.constants.area import Area
+from libs.forecast_collector import ConcurrentCollector, SourceNotModified
+from tests.factories import make_forecast
+
+
+class TrackingSession(requests.Session):
+    def __init__(self) -> None:
+        super().__init__()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+def test_one_failure_does_not_cancel_the_other_areas():
+    started = threading.Barrier(3, timeout=5)
+
+    def failing(session, cache):
+        started.wait()
+        raise RuntimeError("source is down")
+
+    def slow(area):
+        def collect(session, cache):
+            started.wait()
+            time.sleep(0.1)
+            return make_forecast(area)
+
+        return collect
+
+    result = (
+        ConcurrentCollector({Area.hokkaido: slow(Area.hokkaido), Area.tohoku: failing, Area.tokyo: slow(Area.tokyo)})
+        .with_max_workers(3)
+        .run()
+    )
+    assert not result.ok
+    assert list(result.errors) == [Area.tohoku]
+    assert str(result.errors[Area.tohoku]) == "source is down"
+    # Area の定義順で返す
+    assert [forecast.area for forecast in result.forecasts] == [Area.hokkaido, Area.tokyo]
+
+
+def test_unchanged_areas_are_reported_separately():
+    cached = make_forecast(Area.tokyo)
+
+    def unchanged(session, cache):
+        raise SourceNotModified(url="http://example.invalid/", forecast=cached)
+
+    result = ConcurrentCollector({Area.tokyo: unchanged}).run()
+    assert result.ok
+    assert result.forecasts == []
+    assert result.unchanged == {Area.tokyo: cached}
+
+
+def test_given_session_is_shared_and_not_closed():
+    session = TrackingSession()
+    seen = []
+
+    def collect(area):
+        def run(s, cache):
+            seen.append(s)
+            return make_forecast(area)
+
+        return run
+
+    ConcurrentCollector({Area.tokyo: collect(Area.tokyo), Area.hokkaido: collect(Area.hokkaido)}).with_session(
+        session
+    ).run()
+    assert seen == [session, session]
+    assert not session.closed
+
+
+def test_own_session_is_closed(monkeypatch):
+    sessions = []
+
+    def build_session(pool_size):
+        sessions.append(TrackingSession())
+        return sessions[-1]
+
+    monkeypatch.setattr("libs.forecast_collector.parallel.build_session", build_session)
+    ConcurrentCollector({Area.tokyo: lambda s, cache: make_forecast()}).run()
+    assert len(sessions) == 1
+    assert sessions[0].closed
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from libs.constants.area import Area
+from libs.forecast_collector import ForecastPipeline
+from libs.forecast_collector.cache import SourceNotModified
+from libs.forecast_saver.saver import Saver
+from tests.factories import make_forecast
+
+
+class StubCollector:
+    # download / transform だけを持つ Collector の代わり (失敗させる段を指定できる)
+    def __init__(self, key: int, fail: str = "", unchanged: bool = False) -> None:
+        self.key = key
+        self._fail = fail
+        self._unchanged = unchanged
+        self.downloaded = threading.Event()
+
+    def download(self) -> str:
+        self.downloaded.set()
+        if self._unchanged:
+            raise SourceNotModified(url=str(self.key), forecast=None)
+        if self._fail == "download":
+            raise RuntimeError(f"download {self.key}")
+        return str(self.key)
+
+    def transform(self, raw_data: str):
+        if self._fail == "transform":
+            raise ValueError(f"transform {self.key}")
+        return make_forecast(Area.tokyo, offset=int(raw_data))
+
+
+class RecordingSaver(Saver):
+    def __init__(self, fail_at: int = -1, delay: float = 0.0) -> None:
+        self._fail_at = fail_at
+        self._delay = delay
+        self.batches = []
+
+    def run_batch(self, forecasts):
+        forecasts = list(forecasts)
+        if len(self.batches) == self._fail_at:
+            raise RuntimeError("saver is down")
+        time.sleep(self._delay)
+        # offset (= キー) を記録する
+        self.batches.append([forecast.today_frame.actual_result[0] - 2300 for forecast in forecasts])
+
+    def run(self, structured_data):
+        self.run_batch([structured_data])
+
+
+def pipeline(saver: Saver, workers: int = 1, queue_size: int = 2, batch_size: int = 2) -> ForecastPipeline:
+    return (
+        ForecastPipeline(saver)
+        .with_download_workers(workers)
+        .with_queue_size(queue_size)
+        .with_batch_size(batch_size)
+    )
+
+
+def assert_threads_stopped():
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("pipeline-")]
+
+
+def test_saved_keys_match_their_batches():
+    saver = RecordingSaver()
+    collectors = [(key, StubCollector(key)) for key in range(5)]
+    result = pipeline(saver).run(collectors)
+    assert saver.batches == [[0, 1], [2, 3], [4]]
+    assert result.saved == [0, 1, 2, 3, 4]
+    assert result.ok
+
+
+def test_keys_follow_the_forecasts_with_several_workers():
+    saver = RecordingSaver()
+    saved = []
+    collectors = [(key, StubCollector(key)) for key in range(20)]
+    pipeline(saver, workers=4, batch_size=3).run(collectors, on_saved=saved.append)
+    # 取得の順は入れ替わっても、各バッチのキーは保存した解析結果と一致する
+    assert saved == saver.batches
+    assert sorted(key for batch in saved for key in batch) == list(range(20))
+
+
+def test_failures_and_unchanged_are_isolated():
+    collectors = [
+        (0, StubCollector(0)),
+        (1, StubCollector(1, fail="download")),
+        (2, StubCollector(2, fail="transform")),
+        (3, StubCollector(3, unchanged=True)),
+        (4, StubCollector(4)),
+    ]
+    result = pipeline(RecordingSaver()).run(collectors)
+    assert result.saved == [0, 4]
+    assert isinstance(result.errors[1], RuntimeError)
+    assert isinstance(result.errors[2], ValueError)
+    assert result.unchanged == {3: None}
+    assert not result.ok
+
+
+def test_bounded_queues_hold_back_the_downloads():
+    collectors = [StubCollector(key) for key in range(20)]
+    saver = RecordingSaver(delay=0.3)
+    stream = pipeline(saver, queue_size=2, batch_size=1).stream((c.key, c) for c in collectors)
+    assert next(stream) == [0]
+    time.sleep(0.2)
+    # 保存中の 1 件 + キュー 2 本分 + 取得中・解析中の分しか先に進まない
+    downloaded = sum(c.downloaded.is_set() for c in collectors)
+    assert downloaded <= 1 + 2 * 2 + 2
+    stream.close()
+    assert_threads_stopped()
+
+
+def test_saver_failure_stops_the_pipeline():
+    collectors = [StubCollector(key) for key in range(100)]
+    with pytest.raises(RuntimeError, match="saver is down"):
+        pipeline(RecordingSaver(fail_at=1), batch_size=1).run((c.key, c) for c in collectors)
+    assert_threads_stopped()
+    # 止まった後は取得しない
+    assert sum(c.downloaded.is_set() for c in collectors) < 20
+
+
+def test_failing_collectors_iterable_is_raised():
+    def collectors():
+        yield 0, StubCollector(0)
+        raise KeyError("broken spec")
+
+    saver = RecordingSaver()
+    with pytest.raises(KeyError, match="broken spec"):
+        pipeline(saver, workers=2).run(collectors())
+    assert_threads_stopped()
+
+
+def test_consumer_can_stop_early():
+    collectors = [StubCollector(key) for key in range(100)]
+    stream = pipeline(RecordingSaver(), batch_size=1).stream((c.key, c) for c in collectors)
+    assert next(stream) == [0]
+    stream.close()
+    assert_threads_stopped()
+    assert sum(c.downloaded.is_set() for c in collectors) < 20
+
+
+@pytest.mark.parametrize("option", ["with_download_workers", "with_queue_size", "with_batch_size"])
+def test_options_must_be_positive(option):
+    with pytest.raises(ValueError):
+        getattr(ForecastPipeline(RecordingSaver()), option)(0)
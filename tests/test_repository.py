@@ -0,0 +1,181 @@
+from datetime import date, datetime
+
+import pytest
+
+from libs.constants.area import Area
+from libs.forecast_repository import ForecastRepository, SqliteForecastSource, TTLCache
+from libs.forecast_saver import SqliteSaver
+from libs.forecast_saver.saver import Saver
+from tests.factories import make_forecast, make_tomorrow
+
+DAY = date(2023, 1, 1)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expires_entries():
+    clock = Clock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.put((Area.tokyo, "a"), 1)
+    clock.now = 9.9
+    assert cache.get((Area.tokyo, "a")) == 1
+    clock.now = 10
+    assert cache.get((Area.tokyo, "a")) is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_cache_evicts_the_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.put((Area.tokyo, "a"), 1)
+    cache.put((Area.tokyo, "b"), 2)
+    cache.get((Area.tokyo, "a"))
+    cache.put((Area.tokyo, "c"), 3)
+    assert cache.get((Area.tokyo, "b")) is None
+    assert cache.get((Area.tokyo, "a")) == 1
+    assert cache.get((Area.tokyo, "c")) == 3
+
+
+def test_ttl_cache_invalidates_by_area():
+    cache = TTLCache()
+    cache.put((Area.tokyo, "a"), 1)
+    cache.put((Area.kansai, "a"), 2)
+    cache.put((None, "all"), 3)
+    cache.invalidate(Area.tokyo)
+    # エリアを指定しないクエリの結果も捨てる
+    assert cache.get((Area.tokyo, "a")) is None
+    assert cache.get((None, "all")) is None
+    assert cache.get((Area.kansai, "a")) == 2
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_ttl_cache_skips_values_loaded_before_an_invalidation():
+    cache = TTLCache()
+    tokyo, kansai, everything = cache.generation(Area.tokyo), cache.generation(Area.kansai), cache.generation(None)
+    cache.invalidate(Area.tokyo)
+    cache.put((Area.tokyo, "a"), 1, generation=tokyo)
+    cache.put((None, "all"), 3, generation=everything)
+    cache.put((Area.kansai, "a"), 2, generation=kansai)
+    assert cache.get((Area.tokyo, "a")) is None
+    assert cache.get((None, "all")) is None
+    assert cache.get((Area.kansai, "a")) == 2
+
+    kansai = cache.generation(Area.kansai)
+    cache.invalidate()
+    cache.put((Area.kansai, "b"), 2, generation=kansai)
+    assert cache.get((Area.kansai, "b")) is None
+
+
+class CountingSource(SqliteForecastSource):
+    # today_frame を読み込んだ回数を数える (during_load で読み込み中の書き込みを再現する)
+    # versioned が False の間は version() を返さず、InvalidatingSaver による無効化だけを確認できる
+    def __init__(self, saver: SqliteSaver) -> None:
+        super().__init__(saver)
+        self.loads = 0
+        self.during_load = None
+        self.versioned = False
+
+    def version(self):
+        return super().version() if self.versioned else None
+
+    def today_frame(self, area, start, end):
+        self.loads += 1
+        frame = super().today_frame(area, start, end)
+        if self.during_load is not None:
+            during_load, self.during_load = self.during_load, None
+            during_load()
+        return frame
+
+
+@pytest.fixture
+def saver(tmp_path):
+    saver = SqliteSaver(str(tmp_path / "forecast.sqlite"))
+    saver.run(make_forecast(tomorrow=make_tomorrow(date(2023, 1, 2))))
+    yield saver
+    saver.close()
+
+
+@pytest.fixture
+def source(saver):
+    return CountingSource(saver)
+
+
+def test_repository_caches_loads(source):
+    repository = ForecastRepository(source)
+    forecast = repository.day(Area.tokyo, DAY)
+    assert len(forecast.today_frame) == 24
+    assert forecast.tomorrow_forecast == make_tomorrow(date(2023, 1, 2))
+    assert repository.day(Area.tokyo, DAY) is forecast
+    assert source.loads == 1
+
+
+def test_repository_entries_expire(source):
+    clock = Clock()
+    repository = ForecastRepository(source, TTLCache(ttl=60, clock=clock))
+    repository.day(Area.tokyo, DAY)
+    clock.now = 60
+    repository.day(Area.tokyo, DAY)
+    assert source.loads == 2
+
+
+def test_repository_evicts_the_least_recently_used(source):
+    repository = ForecastRepository(source).with_cache(maxsize=1, ttl=60)
+    repository.day(Area.tokyo, DAY)
+    repository.latest(Area.tokyo)
+    repository.day(Area.tokyo, DAY)
+    assert source.loads == 2
+
+
+class FailingSaver(Saver):
+    def run(self, structured_data):
+        raise RuntimeError("saver is down")
+
+
+@pytest.mark.parametrize("failing", [False, True])
+def test_saving_through_the_repository_invalidates_the_area(saver, source, failing):
+    repository = ForecastRepository(source)
+    repository.day(Area.tokyo, DAY)
+    repository.day(Area.kansai, DAY)
+    watched = repository.watch(FailingSaver() if failing else saver)
+    if failing:
+        # 一部が書き込まれている可能性があるので、失敗しても捨てる
+        with pytest.raises(RuntimeError):
+            watched.run(make_forecast(offset=100))
+    else:
+        watched.run(make_forecast(offset=100))
+    assert source.loads == 2
+    forecast = repository.day(Area.tokyo, DAY)
+    repository.day(Area.kansai, DAY)
+    assert source.loads == 3
+    expected = make_forecast(offset=0 if failing else 100).today_frame.actual_result.tolist()
+    assert forecast.today_frame.actual_result.tolist() == expected
+
+
+def test_value_loaded_during_a_save_is_not_cached(saver, source):
+    repository = ForecastRepository(source)
+    watched = repository.watch(saver)
+    source.during_load = lambda: watched.run(make_forecast(offset=100))
+    # 読み込んだ値は保存前のもの
+    assert repository.day(Area.tokyo, DAY).today_frame.actual_result[0] == 2300
+    assert repository.day(Area.tokyo, DAY).today_frame.actual_result[0] == 2400
+    assert repository.day(Area.tokyo, DAY).today_frame.actual_result[0] == 2400
+    assert source.loads == 2
+
+
+def test_writes_from_another_connection_are_detected(saver, source, tmp_path):
+    source.versioned = True
+    repository = ForecastRepository(source)
+    repository.day(Area.tokyo, DAY)
+    other = SqliteSaver(str(tmp_path / "forecast.sqlite"))
+    other.run(make_forecast(offset=100))
+    other.close()
+    forecast = repository.range(Area.tokyo, datetime(2023, 1, 1), datetime(2023, 1, 2))
+    assert forecast.today_frame.actual_result[0] == 2400
+    assert source.loads == 2
@@ -0,0 +1,77 @@
+from array import array
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastFrame
+from libs.data.rollup import DailyRollup
+from tests.factories import make_frame
+
+DAY = datetime(2023, 1, 1)
+
+
+def frame(actual, demand, supply, start: datetime = DAY) -> ForecastFrame:
+    return ForecastFrame(
+        dt=[start + timedelta(hours=hour) for hour in range(len(demand))],
+        actual_result=array("i", actual),
+        forecast_demand=array("i", demand),
+        forecast_supply=array("i", supply),
+    )
+
+
+def test_peaks_and_minimum_reserve():
+    (rollup,) = DailyRollup.from_frame(
+        Area.tokyo,
+        frame(actual=[2000, 2100, 2500, 2400], demand=[2000, 2600, 2550, 2300], supply=[3000, 3000, 2800, 2500]),
+    )
+    assert rollup.area == Area.tokyo
+    assert rollup.date == date(2023, 1, 1)
+    assert rollup.hours == 4
+    assert (rollup.peak_demand, rollup.peak_demand_time) == (2600, DAY + timedelta(hours=1))
+    # 2300 / 2500 = 92% (2550 / 2800 = 91% より高い)
+    assert (rollup.peak_usage_pc, rollup.peak_usage_time) == (92, DAY + timedelta(hours=3))
+    assert (rollup.min_reserve, rollup.min_reserve_time) == (200, DAY + timedelta(hours=3))
+
+
+def test_errors_are_averaged_over_observed_hours():
+    (rollup,) = DailyRollup.from_frame(
+        Area.tokyo, frame(actual=[2000, 2500, 0, 0], demand=[2100, 2400, 2600, 2700], supply=[3000] * 4)
+    )
+    # 実績が 0 の時間帯 (まだ実績が出ていない) は除く
+    assert rollup.observed_hours == 2
+    assert rollup.peak_actual == 2500
+    assert rollup.mean_abs_error == 100
+    assert rollup.max_abs_error == 100
+    assert rollup.mean_abs_error_pc == pytest.approx((100 / 2000 + 100 / 2500) / 2 * 100)
+
+
+def test_no_observed_hours():
+    (rollup,) = DailyRollup.from_frame(Area.tokyo, frame(actual=[0, 0], demand=[2000, 2100], supply=[0, 3000]))
+    assert rollup.observed_hours == 0
+    assert rollup.peak_actual is None
+    assert rollup.mean_abs_error is None
+    # 供給が 0 の行は使用率 0 として扱う
+    assert (rollup.peak_usage_pc, rollup.peak_usage_time) == (70, DAY + timedelta(hours=1))
+
+
+def test_one_rollup_per_day():
+    rollups = DailyRollup.from_frame(Area.kansai, make_frame(date(2023, 1, 1), days=3))
+    assert [rollup.date for rollup in rollups] == [date(2023, 1, 1), date(2023, 1, 2), date(2023, 1, 3)]
+    assert {rollup.hours for rollup in rollups} == {24}
+    assert {rollup.peak_demand_time.hour for rollup in rollups} == {23}
+    assert rollups[1].peak_demand_time == datetime(2023, 1, 2, 23)
+    assert {rollup.peak_actual for rollup in rollups} == {2323}
+
+
+def test_dates_filter():
+    forecast_frame = make_frame(date(2023, 1, 1), days=3)
+    rollups = DailyRollup.from_frame(Area.tokyo, forecast_frame, dates=[date(2023, 1, 2), date(2023, 1, 5)])
+    assert [rollup.date for rollup in rollups] == [date(2023, 1, 2)]
+    assert rollups == DailyRollup.from_frame(Area.tokyo, forecast_frame)[1:2]
+    assert DailyRollup.from_frame(Area.tokyo, forecast_frame, dates=[]) == []
+
+
+def test_values_follow_the_columns():
+    (rollup,) = DailyRollup.from_frame(Area.tokyo, make_frame(date(2023, 1, 1)))
+    assert dict(zip(DailyRollup.COLUMNS, rollup.values())) == rollup.model_dump(exclude={"area", "date"})
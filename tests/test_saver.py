@@ -0,0 +1,272 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from benchmarks.stubs import StubAthenaClient
+from libs.constants.area import Area
+from libs.data.forecast import ActualResultSeries, ForecastFrame
+from libs.data.rollup import DailyRollup
+from libs.forecast_saver import AthenaSaver, CsvSaver, LocalObjectStore, ParquetSaver, SqliteSaver
+from tests.factories import make_forecast, make_tomorrow
+
+
+def athena_saver(client: StubAthenaClient) -> AthenaSaver:
+    return AthenaSaver(client=client).with_poll_interval(0, 0)
+
+
+def test_athena_today_delete_covers_each_day_of_the_frame():
+    client = StubAthenaClient()
+    athena_saver(client).run_batch([make_forecast(Area.hokkaido, date(2023, 1, 1), days=2)])
+    delete = next(query for query in client.queries if query.startswith("DELETE FROM default.today_forecast"))
+    # 0:00 はその日に含め、翌日の 0:00 は含めない
+    assert delete.count(" OR ") == 1
+    assert (
+        "(TIMESTAMP '2023-01-01' <= datetime AND datetime < TIMESTAMP '2023-01-02' AND area = 'hokkaido')" in delete
+    )
+    assert (
+        "(TIMESTAMP '2023-01-02' <= datetime AND datetime < TIMESTAMP '2023-01-03' AND area = 'hokkaido')" in delete
+    )
+
+
+def test_athena_today_delete_does_not_touch_the_next_day():
+    # 日ごとのファイルを完了順に保存しても、後の日の 0:00 の行を消さない
+    client = StubAthenaClient()
+    athena_saver(client).run_batch([make_forecast(Area.hokkaido, date(2023, 1, 2)), make_forecast(Area.hokkaido)])
+    delete = next(query for query in client.queries if query.startswith("DELETE FROM default.today_forecast"))
+    assert delete.count("TIMESTAMP '2023-01-02' <= datetime") == 1
+    assert "datetime < TIMESTAMP '2023-01-02'" in delete
+    assert "datetime <= TIMESTAMP" not in delete
+
+
+def test_athena_inserts_name_their_columns():
+    client = StubAthenaClient()
+    forecast = make_forecast(tomorrow=make_tomorrow(date(2023, 1, 2)))
+    athena_saver(client).with_rollups().run_batch([forecast])
+    inserts = {query.split()[2]: query for query in client.queries if query.startswith("INSERT")}
+    assert inserts["default.daily_rollup"].startswith(
+        f"INSERT INTO default.daily_rollup (date, {', '.join(DailyRollup.COLUMNS)}, area) VALUES (date '2023-01-01', "
+    )
+    assert inserts["default.today_forecast"].startswith(
+        "INSERT INTO default.today_forecast (datetime, actual_result, forecast_demand, forecast_supply, area) VALUES "
+    )
+    tomorrow_columns = AthenaSaver.TABLE_COLUMNS["tomorrow_forecast"]
+    assert inserts["default.tomorrow_forecast"].startswith(
+        f"INSERT INTO default.tomorrow_forecast ({', '.join(tomorrow_columns)}) VALUES "
+    )
+    assert tomorrow_columns[1:-1] == SqliteSaver.TOMORROW_COLUMNS
+
+
+def read_parquet(store: LocalObjectStore, key: str):
+    pq = pytest.importorskip("pyarrow.parquet")
+    pa = pytest.importorskip("pyarrow")
+    return pq.read_table(pa.BufferReader(store.get(key)))
+
+
+def test_parquet_partitions_and_column_types(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    store = LocalObjectStore(str(tmp_path))
+    forecast = make_forecast(days=2, tomorrow=make_tomorrow(date(2023, 1, 3)))
+    ParquetSaver(store).run(forecast)
+    assert store.list("") == [
+        "today_forecast/area=tokyo/date=2023-01-01/part-0.parquet",
+        "today_forecast/area=tokyo/date=2023-01-02/part-0.parquet",
+        "tomorrow_forecast/area=tokyo/date=2023-01-03/part-0.parquet",
+    ]
+
+    today = read_parquet(store, "today_forecast/area=tokyo/date=2023-01-02/part-0.parquet")
+    assert today.schema.names == ["datetime", "actual_result", "forecast_demand", "forecast_supply"]
+    assert today.schema.field("datetime").type == pa.timestamp("ms")
+    assert {today.schema.field(name).type for name in today.schema.names[1:]} == {pa.int32()}
+    assert today.num_rows == 24
+    assert today.column("datetime")[0].as_py() == datetime(2023, 1, 2, 0)
+    assert today.column("actual_result").to_pylist() == forecast.today_frame.actual_result[24:].tolist()
+
+    tomorrow = read_parquet(store, "tomorrow_forecast/area=tokyo/date=2023-01-03/part-0.parquet")
+    assert "date" not in tomorrow.schema.names
+    assert tomorrow.schema.field("demand_peak_time").type == pa.string()
+    assert tomorrow.schema.field("demand_peak_supply").type == pa.int32()
+    assert tomorrow.schema.field("temperature").type == pa.float64()
+    assert tomorrow.to_pylist() == [make_tomorrow(date(2023, 1, 3)).model_dump(exclude={"date"})]
+
+
+def test_parquet_rerun_overwrites_the_partition(tmp_path):
+    pytest.importorskip("pyarrow")
+    store = LocalObjectStore(str(tmp_path))
+    saver = ParquetSaver(store)
+    saver.run(make_forecast())
+    saver.run(make_forecast(offset=100))
+    assert store.list("") == ["today_forecast/area=tokyo/date=2023-01-01/part-0.parquet"]
+    table = read_parquet(store, "today_forecast/area=tokyo/date=2023-01-01/part-0.parquet")
+    assert table.num_rows == 24
+    assert table.column("actual_result").to_pylist() == make_forecast(offset=100).today_frame.actual_result.tolist()
+
+
+@pytest.fixture
+def sqlite_saver(tmp_path):
+    saver = SqliteSaver(str(tmp_path / "db" / "forecast.sqlite"))
+    yield saver
+    saver.close()
+
+
+def test_sqlite_upsert_is_idempotent(sqlite_saver, tmp_path):
+    forecast = make_forecast(days=2, tomorrow=make_tomorrow(date(2023, 1, 3)))
+    sqlite_saver.run(forecast)
+    sqlite_saver.run(forecast)
+    # 同じ日時の行は更新される
+    sqlite_saver.run(make_forecast(start=date(2023, 1, 2), offset=100, tomorrow=make_tomorrow(date(2023, 1, 3), 21.0)))
+
+    frame = sqlite_saver.today_frame(Area.tokyo, datetime(2023, 1, 1), datetime(2023, 1, 3))
+    assert len(frame) == 48
+    assert frame.actual_result[:24].tolist() == forecast.today_frame.actual_result[:24].tolist()
+    assert frame.actual_result[24:].tolist() == make_forecast(offset=100).today_frame.actual_result.tolist()
+    assert sqlite_saver.tomorrow_forecasts(Area.tokyo, date(2023, 1, 1), date(2023, 1, 4)) == [
+        make_tomorrow(date(2023, 1, 3), 21.0)
+    ]
+    rollups = sqlite_saver.daily_rollups(Area.tokyo, date(2023, 1, 1), date(2023, 1, 3))
+    assert [(rollup.date, rollup.peak_demand) for rollup in rollups] == [
+        (date(2023, 1, 1), 2373),
+        (date(2023, 1, 2), 2473),
+    ]
+
+    # 別の接続からも読める
+    reopened = SqliteSaver(str(tmp_path / "db" / "forecast.sqlite"))
+    assert len(reopened.latest_frame(Area.tokyo, 100)) == 48
+    reopened.close()
+
+
+def test_sqlite_range_and_latest_queries(sqlite_saver):
+    sqlite_saver.run_batch([make_forecast(days=3), make_forecast(Area.kansai, days=3, offset=500)])
+    frame = sqlite_saver.today_frame(Area.tokyo, datetime(2023, 1, 2), datetime(2023, 1, 2, 6))
+    # end は含めない
+    assert frame.dt == [datetime(2023, 1, 2, hour) for hour in range(6)]
+    assert frame.forecast_supply.tolist() == [2800 + hour for hour in range(6)]
+
+    latest = sqlite_saver.latest_frame(Area.kansai, 3)
+    assert latest.dt == [datetime(2023, 1, 3, hour) for hour in (21, 22, 23)]
+    assert latest.actual_result.tolist() == [2300 + 500 + hour for hour in (21, 22, 23)]
+    assert len(sqlite_saver.latest_frame(Area.hokkaido, 3)) == 0
+
+
+def test_sqlite_stores_actual_results(sqlite_saver):
+    start = datetime(2023, 1, 1)
+    series = ActualResultSeries(
+        start=start, interval=timedelta(minutes=5), values=[2300, ActualResultSeries.MISSING, 2310]
+    )
+    forecast = make_forecast().model_copy(update={"actual_results": series})
+    sqlite_saver.run(forecast)
+    stored = sqlite_saver.actual_results(Area.tokyo, start, start + timedelta(minutes=20))
+    # 欠測値と保存されていない時刻は MISSING
+    assert stored.values.tolist() == [2300, ActualResultSeries.MISSING, 2310, ActualResultSeries.MISSING]
+    assert stored.interval == timedelta(minutes=5)
+
+
+def test_sqlite_failed_batch_is_rolled_back(sqlite_saver, monkeypatch):
+    sqlite_saver.run(make_forecast())
+    version = sqlite_saver.data_version()
+
+    def fail(connection, rollups):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(sqlite_saver, "_upsert_daily_rollups", fail)
+    with pytest.raises(RuntimeError, match="disk full"):
+        sqlite_saver.run_batch([make_forecast(offset=100), make_forecast(start=date(2023, 1, 2))])
+    frame = sqlite_saver.today_frame(Area.tokyo, datetime(2023, 1, 1), datetime(2023, 1, 3))
+    assert frame.actual_result.tolist() == make_forecast().today_frame.actual_result.tolist()
+
+    # 失敗した後も書き込める
+    monkeypatch.undo()
+    sqlite_saver.run(make_forecast(start=date(2023, 1, 2)))
+    assert sqlite_saver.data_version() != version
+    assert len(sqlite_saver.today_frame(Area.tokyo, datetime(2023, 1, 1), datetime(2023, 1, 3))) == 48
+
+
+def read_csv(store: LocalObjectStore, key: str):
+    body = store.get(key)
+    if key.endswith(".gz"):
+        body = gzip.decompress(body)
+    return list(csv.reader(io.StringIO(body.decode())))
+
+
+def test_csv_partitions(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    forecast = make_forecast(days=2, tomorrow=make_tomorrow(date(2023, 1, 3)))
+    CsvSaver(store).run(forecast)
+    assert store.list("") == [
+        "_manifest.json",
+        "today_forecast/area=tokyo/date=2023-01-01/part-0.csv",
+        "today_forecast/area=tokyo/date=2023-01-02/part-0.csv",
+        "tomorrow_forecast/area=tokyo/date=2023-01-03/part-0.csv",
+    ]
+    today = read_csv(store, "today_forecast/area=tokyo/date=2023-01-02/part-0.csv")
+    assert today[0] == list(ForecastFrame.COLUMNS)
+    assert today[1] == ["2023-01-02 00:00:00", "2300", "2350", "2800"]
+    assert len(today) == 25
+    tomorrow = read_csv(store, "tomorrow_forecast/area=tokyo/date=2023-01-03/part-0.csv")
+    assert tomorrow[0] == list(make_tomorrow(date(2023, 1, 3)).model_dump())
+    assert tomorrow[1][:2] == ["2023-01-03", "18:00〜19:00"]
+
+
+class CountingStore(LocalObjectStore):
+    def __init__(self, root: str) -> None:
+        super().__init__(root)
+        self.puts = []
+
+    def put(self, key: str, body: bytes):
+        self.puts.append(key)
+        super().put(key, body)
+
+
+def changed_on_the_second_day():
+    # 2 日目の最後の行だけ実績が変わった予測
+    forecast = make_forecast(days=2)
+    forecast.today_frame.actual_result[-1] += 1
+    return forecast
+
+
+def test_csv_unchanged_partitions_are_skipped(tmp_path):
+    store = CountingStore(str(tmp_path))
+    CsvSaver(store).run(make_forecast(days=2))
+    store.puts.clear()
+    # 別のインスタンスでも manifest から判定する
+    CsvSaver(store).run(changed_on_the_second_day())
+    assert store.puts == ["today_forecast/area=tokyo/date=2023-01-02/part-0.csv", CsvSaver.MANIFEST_KEY]
+
+    # manifest にあっても消えていれば書き直す
+    store.delete("today_forecast/area=tokyo/date=2023-01-01/part-0.csv")
+    store.puts.clear()
+    CsvSaver(store).run(changed_on_the_second_day())
+    assert store.puts == ["today_forecast/area=tokyo/date=2023-01-01/part-0.csv", CsvSaver.MANIFEST_KEY]
+
+
+CSV_KEY = "today_forecast/area=tokyo/date=2023-01-01/part-0.csv"
+GZIP_KEY = f"{CSV_KEY}.gz"
+
+
+def test_csv_gzip_round_trip(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    forecast = make_forecast()
+    CsvSaver(store).with_gzip().run(forecast)
+    assert store.list("today_forecast/") == [GZIP_KEY]
+    rows = read_csv(store, GZIP_KEY)
+    assert [int(row[1]) for row in rows[1:]] == forecast.today_frame.actual_result.tolist()
+    # 同じ内容なら同じバイト列になる
+    body = store.get(GZIP_KEY)
+    store.delete(GZIP_KEY)
+    CsvSaver(store).with_gzip().run(forecast)
+    assert store.get(GZIP_KEY) == body
+
+
+def test_csv_toggling_gzip_replaces_the_partition(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    CsvSaver(store).run(make_forecast())
+    CsvSaver(store).with_gzip().run(make_forecast())
+    assert store.list("today_forecast/") == [GZIP_KEY]
+    assert list(json.loads(store.get(CsvSaver.MANIFEST_KEY))) == [GZIP_KEY]
+
+    CsvSaver(store).run(make_forecast(offset=100))
+    assert store.list("today_forecast/") == [CSV_KEY]
+    assert list(json.loads(store.get(CsvSaver.MANIFEST_KEY))) == [CSV_KEY]
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from libs.constants.area import Area
+from libs.forecast_collector.schedule import UpdateSchedule
+
+AREA = Area.tokyo
+DAY = datetime(2023, 10, 21)
+
+
+def at(hour: int, minute: int = 0) -> datetime:
+    return DAY.replace(hour=hour, minute=minute)
+
+
+def recorded(*updates: datetime, schedule: Optional[UpdateSchedule] = None) -> UpdateSchedule:
+    schedule = schedule or UpdateSchedule(None)
+    for updated_at in updates:
+        schedule.record(AREA, updated_at, checked_at=updated_at + timedelta(minutes=1))
+    return schedule
+
+
+def test_no_history_is_collected():
+    decision = UpdateSchedule(None).decide(AREA, at(10))
+    assert decision.collect
+    assert decision.reason == "no history"
+    assert UpdateSchedule(None).next_update(AREA) is None
+
+
+def test_cadence_is_the_median_interval():
+    schedule = recorded(at(9, 5), at(9, 35), at(10, 5), at(11, 5))
+    assert schedule.cadence(AREA) == timedelta(minutes=30)
+    assert schedule.next_update(AREA) == at(11, 35)
+    assert recorded(at(9, 5)).cadence(AREA) is None
+
+
+def test_default_cadence_for_a_single_update():
+    schedule = recorded(at(9, 5), schedule=UpdateSchedule(None, default_cadence=timedelta(minutes=40)))
+    assert schedule.next_update(AREA) == at(9, 45)
+
+
+def test_older_or_repeated_updates_are_ignored():
+    schedule = recorded(at(9, 5), at(10, 5), at(10, 5), at(9, 35))
+    assert schedule.updates(AREA) == [at(9, 5), at(10, 5)]
+
+
+def test_history_is_bounded():
+    schedule = recorded(*(at(0) + timedelta(minutes=5 * i) for i in range(UpdateSchedule.HISTORY + 5)))
+    assert len(schedule.updates(AREA)) == UpdateSchedule.HISTORY
+
+
+def test_skip_until_the_next_update():
+    schedule = recorded(at(9, 5), at(10, 5))
+    decision = schedule.decide(AREA, at(10, 30))
+    assert not decision.collect
+    assert decision.reason == "not updated yet"
+    assert decision.next_due == at(11, 5)
+    # early_margin (2 分) 前から取得する
+    assert not schedule.decide(AREA, at(11, 2)).collect
+    assert schedule.decide(AREA, at(11, 3)).reason == "update due"
+
+
+def test_tomorrow_forecast_time_is_not_skipped():
+    schedule = recorded(at(15, 30), at(17, 30))
+    assert schedule.next_update(AREA) == at(18)
+    assert schedule.decide(AREA, at(17, 59)).collect
+    # 18:00 をまたがなければ通常の予測どおり
+    schedule = recorded(at(18, 5), at(19, 5))
+    assert schedule.next_update(AREA) == at(20, 5)
+
+
+def test_stale_check_is_collected_even_if_not_due():
+    schedule = recorded(at(6), at(9), schedule=UpdateSchedule(None, max_interval=timedelta(hours=2)))
+    # 予測では 12:00 だが、最後の確認 (9:01) から 2 時間たっている
+    assert not schedule.decide(AREA, at(11)).collect
+    assert schedule.decide(AREA, at(11, 1)).reason == "stale"
+    # 変わっていなかった場合も確認日時は進む
+    schedule.record(AREA, None, checked_at=at(11, 1))
+    assert schedule.decide(AREA, at(11, 30)).reason == "not updated yet"
+
+
+def test_state_survives_a_restart(tmp_path):
+    path = tmp_path / "schedule.json"
+    schedule = recorded(at(9, 5), at(10, 5), schedule=UpdateSchedule(str(path)))
+    schedule.save()
+    assert UpdateSchedule(str(path)).next_update(AREA) == at(11, 5)
+
+
+def test_broken_state_is_collected(tmp_path):
+    path = tmp_path / "schedule.json"
+    path.write_text("{")
+    assert UpdateSchedule(str(path)).decide(AREA, at(10)).reason == "no history"
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+
+from libs.forecast_collector.section import SectionIndex
+
+DOCUMENT = [
+    "2023/10/21 18:15 UPDATE",
+    "PEAK,時間帯,更新日",
+    "3425,18:00〜19:00,10/21",
+    "",
+    "DATE,TIME,実績",
+    "2023/10/21,0:00,2300",
+    "2023/10/21,1:00,2310",
+    "",
+    "",
+    "DATE,TIME,5分実績",
+    "2023/10/21,0:00,2290",
+]
+
+
+def document(newline: str) -> str:
+    return newline.join(DOCUMENT) + newline
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_sections_are_found_for_either_newline(newline):
+    sections = SectionIndex(document(newline))
+    assert sections.headers() == ["UPDATE", "PEAK,時間帯,更新日", "DATE,TIME,実績", "DATE,TIME,5分実績"]
+    section = sections.section("DATE,TIME,実績")
+    assert section.fieldnames == ["DATE", "TIME", "実績"]
+    assert section.rows == [["2023/10/21", "0:00", "2300"], ["2023/10/21", "1:00", "2310"]]
+    assert section.values("実績") == ["2300", "2310"]
+
+
+def test_explicit_newline_overrides_detection():
+    # 先頭の改行だけが LF でも、指定した CRLF で区切る
+    raw_data = "2023/10/21 18:15 UPDATE\n" + document("\r\n").split("\r\n", 1)[1]
+    assert len(SectionIndex(raw_data).section("DATE,TIME,実績")) == 0
+    assert len(SectionIndex(raw_data, newline="\r\n").section("DATE,TIME,実績")) == 2
+
+
+def test_header_prefix_falls_back_to_the_first_match():
+    sections = SectionIndex(document("\n"))
+    assert sections.section("PEAK").rows == [["3425", "18:00〜19:00", "10/21"]]
+    assert sections.section("DATE,TIME,5").values("5分実績") == ["2290"]
+
+
+def test_missing_section_is_empty():
+    sections = SectionIndex(document("\n"))
+    assert sections.lines("MISSING") == []
+    assert len(sections.section("MISSING")) == 0
+    assert sections.section("MISSING").fieldnames == []
+
+
+def test_prefix_lookups_are_cached(monkeypatch):
+    sections = SectionIndex(document("\n"))
+    assert sections.lines("MISSING") == []
+    assert sections.lines("PEAK")
+    # 2 回目以降は表を走査し直さない
+    monkeypatch.setattr(sections, "_offsets", {})
+    assert sections.lines("MISSING") == []
+    assert sections.lines("PEAK") == document("\n").splitlines()[1:3]
+
+
+def test_update_row_is_parsed():
+    assert SectionIndex(document("\r\n")).updated_at() == datetime(2023, 10, 21, 18, 15)
+
+
+@pytest.mark.parametrize("first_line", ["DATE,TIME,実績", "2023/13/41 18:15 UPDATE", "xx UPDATE"])
+def test_missing_or_malformed_update_row(first_line):
+    assert SectionIndex(first_line + "\n2023/10/21,0:00,2300\n").updated_at() is None
+
+
+def test_update_row_followed_by_a_blank_line():
+    raw_data = "2023/10/21 18:15 UPDATE\n\nDATE,TIME,実績\n2023/10/21,0:00,2300\n"
+    sections = SectionIndex(raw_data)
+    assert sections.updated_at() == datetime(2023, 10, 21, 18, 15)
+    assert len(sections.section("DATE,TIME,実績")) == 1
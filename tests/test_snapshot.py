@@ -0,0 +1,112 @@
+from array import array
+from datetime import date, datetime
+
+import pytest
+
+from libs.constants.area import Area
+from libs.data.forecast import ForecastData
+from libs.forecast_saver import IncrementalSaver, SnapshotStore
+from libs.forecast_saver.saver import Saver
+from tests.factories import make_forecast, make_tomorrow
+
+
+class RecordingSaver(Saver):
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.changes = []
+
+    def run_changes(self, changes):
+        if self.fail:
+            raise RuntimeError("sink is down")
+        self.changes.append(changes)
+
+    def run(self, structured_data: ForecastData):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def snapshot():
+    store = SnapshotStore(":memory:")
+    yield store
+    store.close()
+
+
+def with_actual_result(forecast: ForecastData, hour: int, value: int) -> ForecastData:
+    actual_result = array("i", forecast.today_frame.actual_result)
+    actual_result[hour] = value
+    return forecast.model_copy(
+        update={"today_frame": forecast.today_frame.model_copy(update={"actual_result": actual_result})}
+    )
+
+
+def test_first_diff_contains_every_row(snapshot):
+    forecast = make_forecast(tomorrow=make_tomorrow(date(2023, 1, 2)))
+    changes = snapshot.diff(forecast)
+    assert len(changes.today_frame) == 24
+    assert changes.ranges == [(datetime(2023, 1, 1, 0), datetime(2023, 1, 1, 23))]
+    assert changes.tomorrow_changed
+
+
+def test_committed_rows_are_not_changed_again(snapshot):
+    forecast = make_forecast(tomorrow=make_tomorrow(date(2023, 1, 2)))
+    snapshot.commit([snapshot.diff(forecast)])
+    changes = snapshot.diff(forecast)
+    assert not changes.changed
+    assert changes.ranges == []
+
+
+def test_diff_returns_only_changed_rows_as_ranges(snapshot):
+    forecast = make_forecast()
+    snapshot.commit([snapshot.diff(forecast)])
+    updated = with_actual_result(with_actual_result(forecast, 10, 9999), 11, 9999)
+    updated = with_actual_result(updated, 15, 9999)
+    changes = snapshot.diff(updated)
+    assert changes.today_frame.dt == [datetime(2023, 1, 1, hour) for hour in (10, 11, 15)]
+    assert changes.ranges == [
+        (datetime(2023, 1, 1, 10), datetime(2023, 1, 1, 11)),
+        (datetime(2023, 1, 1, 15), datetime(2023, 1, 1, 15)),
+    ]
+    assert not changes.tomorrow_changed
+
+
+def test_tomorrow_change_is_detected(snapshot):
+    snapshot.commit([snapshot.diff(make_forecast(tomorrow=make_tomorrow(date(2023, 1, 2))))])
+    changes = snapshot.diff(make_forecast(tomorrow=make_tomorrow(date(2023, 1, 2), temperature=21.5)))
+    assert changes.tomorrow_changed
+    assert not changes.today_frame
+
+
+def test_areas_are_compared_separately(snapshot):
+    snapshot.commit([snapshot.diff(make_forecast(Area.tokyo))])
+    assert len(snapshot.diff(make_forecast(Area.hokkaido)).today_frame) == 24
+
+
+def test_incremental_saver_passes_only_changes(snapshot):
+    sink = RecordingSaver()
+    saver = IncrementalSaver(sink, snapshot)
+    forecast = make_forecast()
+    saver.run(forecast)
+    saver.run(forecast)
+    saver.run(with_actual_result(forecast, 5, 9999))
+    assert [[len(change.today_frame) for change in changes] for changes in sink.changes] == [[24], [1]]
+
+
+def test_failed_save_does_not_commit_the_snapshot(snapshot):
+    saver = IncrementalSaver(RecordingSaver(fail=True), snapshot)
+    forecast = make_forecast(tomorrow=make_tomorrow(date(2023, 1, 2)))
+    with pytest.raises(RuntimeError):
+        saver.run(forecast)
+    # 次回も同じ行が差分になる
+    changes = snapshot.diff(forecast)
+    assert len(changes.today_frame) == 24
+    assert changes.tomorrow_changed
+
+
+def test_old_rows_are_dropped_after_retention():
+    snapshot = SnapshotStore(":memory:", retention_days=2)
+    snapshot.commit([snapshot.diff(make_forecast(start=date(2023, 1, 1)))])
+    snapshot.commit([snapshot.diff(make_forecast(start=date(2023, 1, 5)))])
+    # 保持期間を過ぎた行は新規扱いになる
+    assert len(snapshot.diff(make_forecast(start=date(2023, 1, 1))).today_frame) == 24
+    assert not snapshot.diff(make_forecast(start=date(2023, 1, 5))).changed
+    snapshot.close()
@@ -0,0 +1,126 @@
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+
+from benchmarks.stubs import StubHTTPServer
+from libs.constants.area import Area
+from libs.data.forecast import ActualResultSeries
+from libs.forecast_collector import (
+    CompiledSpec,
+    ConcurrentCollector,
+    SourceCache,
+    compile_spec,
+    enabled_areas,
+    load_spec,
+    spec_areas,
+)
+from libs.forecast_collector.base import Collector
+from libs.forecast_collector.fetch import reset_circuit_breakers
+from libs.forecast_collector.sources import SpecDataDownloader, SpecDataTransformer
+
+SAMPLE_DIR = Path(__file__).resolve().parent / "csv"
+# 定義を導入する前から取得していたエリアのうち、取得元のファイルをまだ記録していないもの
+# tests/csv/<area>.csv を追加したらここから外す
+ENABLED_WITHOUT_SAMPLE = {Area.hokkaido}
+TARGET_DATE = date(2023, 10, 21)
+# 取得元の形式が変わった (当日のブロックのヘッダーが定義と合わない) 場合
+MISMATCHED = "2023/10/20 18:15 UPDATE\nDATE,TIME,需要(万kW)\n2023/10/20,0:00,2300\n"
+
+
+def test_missing_today_section_is_an_error():
+    with pytest.raises(ValueError, match="kansai: today section is not found: DATE,TIME,当日実績"):
+        compile_spec(Area.kansai).parse(MISMATCHED, TARGET_DATE)
+
+
+def test_mismatched_source_is_reported_and_not_cached(tmp_path):
+    reset_circuit_breakers()
+    cache = SourceCache(str(tmp_path))
+    with StubHTTPServer(MISMATCHED.encode("cp932")) as server:
+        compiled = CompiledSpec(load_spec(Area.kansai).model_copy(update={"url": server.url}))
+
+        def collect(session, cache):
+            downloader = SpecDataDownloader(compiled).with_session(session).with_cache(cache)
+            return Collector(downloader, SpecDataTransformer(compiled).with_target_date(TARGET_DATE)).run()
+
+        result = ConcurrentCollector({Area.kansai: collect}).with_cache(cache).run()
+    assert result.forecasts == []
+    assert isinstance(result.errors[Area.kansai], ValueError)
+    # 次回も取得・解析し直す
+    assert cache.get(server.url) is None
+
+
+def load_sample(area: Area) -> str:
+    with (SAMPLE_DIR / f"{area.value}.csv").open(encoding=load_spec(area).encoding, newline="") as f:
+        return f.read()
+
+
+def sample_areas():
+    return [area for area in spec_areas() if (SAMPLE_DIR / f"{area.value}.csv").exists()]
+
+
+@pytest.mark.parametrize("area", spec_areas(), ids=lambda area: area.value)
+def test_spec_compiles(area):
+    compiled = compile_spec(area)
+    assert compiled.area == area
+
+
+def test_enabled_areas_have_a_recorded_sample():
+    # 取得元のファイルで解析を確認していないエリアは定期実行で取得しない
+    assert set(enabled_areas()) - ENABLED_WITHOUT_SAMPLE <= set(sample_areas())
+
+
+@pytest.mark.parametrize("area", sample_areas(), ids=lambda area: area.value)
+def test_recorded_sample_parses_to_data(area):
+    forecast = compile_spec(area).parse(load_sample(area), TARGET_DATE)
+    assert forecast.area == area
+    assert len(forecast.today_frame) > 0
+    assert forecast.updated_at is not None
+
+
+def test_tokyo_sample():
+    forecast = compile_spec(Area.tokyo).parse(load_sample(Area.tokyo), TARGET_DATE)
+    assert len(forecast.today_frame) == 24
+    assert forecast.today_frame.dt[0] == datetime(2023, 10, 21, 0, 0)
+    assert forecast.tomorrow_forecast is not None
+    assert forecast.tomorrow_forecast.date == date(2023, 10, 22)
+    assert len(forecast.actual_results) == 288
+
+
+def test_malformed_actual_results_are_skipped():
+    lines = load_sample(Area.tokyo).split("\r\n")
+    header = load_spec(Area.tokyo).actual_results.header
+    last = lines.index(header) + 288
+    lines[last] = "2023/10/21,xx:yy,1"
+    forecast = compile_spec(Area.tokyo).parse("\r\n".join(lines), TARGET_DATE)
+    # 当日実績がなくても当日・翌日の予測は残る
+    assert forecast.actual_results is None
+    assert len(forecast.today_frame) == 24
+    assert forecast.tomorrow_forecast is not None
+
+
+def tokyo_lines():
+    lines = load_sample(Area.tokyo).split("\r\n")
+    first = lines.index(load_spec(Area.tokyo).actual_results.header) + 1
+    return lines, first
+
+
+def test_blank_actual_results_are_missing():
+    lines, first = tokyo_lines()
+    observed = compile_spec(Area.tokyo).parse(load_sample(Area.tokyo), TARGET_DATE).actual_results.observed_count()
+    for idx in range(first + 12, first + 24):
+        date_value, time_value = lines[idx].split(",")[:2]
+        lines[idx] = f"{date_value},{time_value},"
+    forecast = compile_spec(Area.tokyo).parse("\r\n".join(lines), TARGET_DATE)
+    assert forecast.actual_results.values[12:24].tolist() == [ActualResultSeries.MISSING] * 12
+    assert forecast.actual_results.hourly().values[1] == ActualResultSeries.MISSING
+    assert forecast.actual_results.observed_count() == observed - 12
+
+
+def test_actual_results_out_of_interval_are_skipped():
+    lines, first = tokyo_lines()
+    # 1 行欠けていると先頭と末尾の間隔が合わない
+    del lines[first + 10]
+    forecast = compile_spec(Area.tokyo).parse("\r\n".join(lines), TARGET_DATE)
+    assert forecast.actual_results is None
+    assert len(forecast.today_frame) == 24